@@ -82,6 +82,7 @@ stalker_dummy_user_login = 'anima'
 stalker_dummy_user_pass = 'anima'
 local_cache_folder = '~/.cache/anima/'
 recent_file_name = 'recent_files'
+video_info_cache_file_name = 'video_info_cache'
 avid_media_file_path_storage = 'avid_media_file_path'
 
 normal_users_group_names = ['Normal Users']
@@ -98,6 +99,7 @@ ffmpeg_command_path = 'ffmpeg'
 ffprobe_command_path = 'ffprobe'
 
 max_recent_files = 50
+max_video_info_cache_size = 500
 
 status_colors = {
     'wfd': [171, 186, 195],
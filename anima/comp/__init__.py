@@ -83,8 +83,12 @@ def convert_to_animated_gif(input_path, output_path):
     })
 
 
-def ffmpeg(**kwargs):
+def ffmpeg(progress_callback=None, process_timeout=None, **kwargs):
     """a simple python wrapper for ffmpeg command
+
+    It is run with :class:`anima.utils.ffmpeg_runner.FFmpegProcess`, see
+    :meth:`anima.utils.MediaManager.ffmpeg` for the progress_callback and
+    process_timeout arguments.
     """
 
     # there is only one special keyword called 'o'
@@ -95,7 +99,7 @@ def ffmpeg(**kwargs):
     kwargs.pop('o')
 
     # generate args
-    args = ['ffmpeg']
+    args = []
     for key in kwargs:
         # append the flag
         args.append('-' + key)
@@ -106,27 +110,13 @@ def ffmpeg(**kwargs):
     # append the output
     args.append(output)
 
-    logger.debug('calling real ffmpeg with args: %s' % args)
-
-    process = subprocess.Popen(args, stderr=subprocess.PIPE)
-
-    # loop until process finishes and capture stderr output
-    stderr_buffer = []
-    while True:
-        stderr = process.stderr.readline()
-
-        if stderr == '' and process.poll() is not None:
-            break
-
-        if stderr != '':
-            stderr_buffer.append(stderr)
-
-    if process.returncode:
-        # there is an error
-        raise RuntimeError(stderr_buffer)
-
-    logger.debug(stderr_buffer)
-    logger.debug('process completed!')
+    # raises an FFmpegError, which is a RuntimeError, if ffmpeg fails
+    from anima.utils.ffmpeg_runner import FFmpegProcess
+    FFmpegProcess(
+        args,
+        progress_callback=progress_callback,
+        timeout=process_timeout
+    ).run()
 
 
 def open_in_file_browser(path):
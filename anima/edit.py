@@ -7,10 +7,26 @@
 import os
 
 
+class XMLBuffer(list):
+    """A minimal file like object to collect the data written by the
+    ``to_xml_stream`` methods, the data is joined only once in
+    :meth:`.getvalue`
+    """
+
+    write = list.append
+
+    def getvalue(self):
+        """returns the written data as a string
+        """
+        return ''.join(self)
+
+
 class EditBase(object):
     """The base for other Edit classes
     """
 
+    __slots__ = ()
+
     def from_xml(self, xml_node):
         """Fills attributes with the given XML node
 
@@ -21,6 +37,18 @@ class EditBase(object):
     def to_xml(self, indentation=2, pre_indent=0):
         """returns an xml version of this PrevisBase object
         """
+        buffer_ = XMLBuffer()
+        self.to_xml_stream(buffer_, indentation, pre_indent)
+        return buffer_.getvalue()
+
+    def to_xml_stream(self, fp, indentation=2, pre_indent=0):
+        """writes an xml version of this PrevisBase object to the given file
+        like object
+
+        :param fp: A file like object with a write method
+        :param int indentation: The number of spaces per indentation level
+        :param int pre_indent: The number of spaces to indent this object
+        """
         raise NotImplementedError
 
     def from_edl(self, edl_list):
@@ -36,10 +64,13 @@ class EditBase(object):
         raise NotImplementedError
 
 
-class NameMixin(object):
-    """A mixin for name attribute
+class SlottedNameMixin(object):
+    """A mixin for name attribute which does not add an instance dictionary,
+    the class using it should have a ``_name`` slot
     """
 
+    __slots__ = ()
+
     def __init__(self, name=''):
         self._name = self._validate_name(name)
 
@@ -69,9 +100,18 @@ class NameMixin(object):
         self._name = self._validate_name(name)
 
 
-class DurationMixin(object):
-    """A mixin for duration attribute
+class NameMixin(SlottedNameMixin):
+    """A mixin for name attribute
     """
+    pass
+
+
+class SlottedDurationMixin(object):
+    """A mixin for duration attribute which does not add an instance
+    dictionary, the class using it should have a ``_duration`` slot
+    """
+
+    __slots__ = ()
 
     def __init__(self, duration=0.0):
         self._duration = self._validate_duration(duration)
@@ -114,6 +154,12 @@ class DurationMixin(object):
         self._duration = self._validate_duration(duration)
 
 
+class DurationMixin(SlottedDurationMixin):
+    """A mixin for duration attribute
+    """
+    pass
+
+
 class Sequence(EditBase, NameMixin, DurationMixin):
     """XML compatibility class for Sequence
 
@@ -135,6 +181,56 @@ class Sequence(EditBase, NameMixin, DurationMixin):
       to a timecode by using this parameter as the base.
     """
 
+    metafuze_xml_template = """<?xml version='1.0' encoding='UTF-8'?>
+<MetaFuze_BatchTranscode xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:noNamespaceSchemaLocation="MetaFuzeBatchTranscode.xsd">
+   <Configuration>
+      <Local>8</Local>
+      <Remote>8</Remote>
+   </Configuration>
+   <Group>
+      <FileList>
+         <File>%(file_pathurl)s</File>
+      </FileList>
+      <Transcode>
+         <Version>1.0</Version>
+         <File>%(mxf_pathurl)s</File>
+         <ClipName>%(clip_name)s</ClipName>
+         <ProjectName>%(sequence_name)s</ProjectName>
+         <TapeName>%(clip_name)s</TapeName>
+         <TC_Start>%(sequence_timecode)s</TC_Start>
+         <DropFrame>false</DropFrame>
+         <EdgeTC>** TimeCode N/A **</EdgeTC>
+         <FilmType>35.4</FilmType>
+         <KN_Start>AAAAAAAA-0000+00</KN_Start>
+         <Frames>%(clip_duration)i</Frames>
+         <Width>%(width)i</Width>
+         <Height>%(height)i</Height>
+         <PixelRatio>1.0000</PixelRatio>
+         <UseFilmInfo>false</UseFilmInfo>
+         <UseTapeInfo>true</UseTapeInfo>
+         <AudioChannelCount>0</AudioChannelCount>
+         <UseMXFAudio>false</UseMXFAudio>
+         <UseWAVAudio>false</UseWAVAudio>
+         <SrcBitsPerChannel>8</SrcBitsPerChannel>
+         <OutputPreset>DNxHD 36</OutputPreset>
+         <OutputPreset>
+            <Version>2.0</Version>
+            <Name>DNxHD 36</Name>
+            <ColorModel>YCC 709</ColorModel>
+            <BitDepth>8</BitDepth>
+            <Format>1080 24p</Format>
+            <Compression>DNxHD 36</Compression>
+            <Conversion>Letterbox (center)</Conversion>
+            <VideoFileType>.mxf</VideoFileType>
+            <IsDefault>false</IsDefault>
+         </OutputPreset>
+         <Eye></Eye>
+         <Scene></Scene>
+         <Comment></Comment>
+      </Transcode>
+   </Group>
+</MetaFuze_BatchTranscode>"""
+
     def __init__(self, name='', duration=0.0, rate=None,
                  timecode='00:00:00:00'):
         NameMixin.__init__(self, name=name)
@@ -158,7 +254,7 @@ class Sequence(EditBase, NameMixin, DurationMixin):
         self.name = xml_node.find('name').text
         rate_tag = xml_node.find('rate')
         if rate_tag is not None:
-            rate = Rate()
+            rate = Rate._create()
             rate.from_xml(rate_tag)
             self.rate = rate
 
@@ -170,39 +266,93 @@ class Sequence(EditBase, NameMixin, DurationMixin):
 
         self.media = media
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this Sequence object
-        """
-        template = """<?xml version="1.0" encoding="UTF-8"?>
-<!DOCTYPE xmeml>
-<xmeml version="5">
-%(pre_indent)s<sequence>
-%(pre_indent)s%(indentation)s<duration>%(duration)s</duration>
-%(pre_indent)s%(indentation)s<name>%(name)s</name>
-%(rate)s
-%(pre_indent)s%(indentation)s<timecode>
-%(pre_indent)s%(indentation)s%(indentation)s<string>%(timecode)s</string>
-%(pre_indent)s%(indentation)s</timecode>
-%(media)s
-%(pre_indent)s</sequence>
-</xmeml>"""
-
-        return template % {
-            'duration': self.duration,
-            'name': self.name,
-            'ntsc': str(self.ntsc).upper(),
-            'rate': self.rate.to_xml(
-                indentation=indentation,
-                pre_indent=indentation + pre_indent
-            ),
-            'timecode': self.timecode,
-            'media': self.media.to_xml(
-                indentation=indentation,
-                pre_indent=indentation + pre_indent
-            ),
-            'indentation': ' ' * indentation,
-            'pre_indent': ' ' * pre_indent
-        }
+    def from_xml_file(self, path):
+        """Fills attributes from the given XML file by streaming it.
+
+        The file is read with ``iterparse``, so the whole document is never
+        held in memory. Every clipitem is discarded as soon as it is parsed,
+        the ones in the tracks of the first video node are converted to a
+        :class:`.Clip` before that, then the rest of the document is read
+        with :meth:`.from_xml`. The result is the same with parsing the whole
+        file and calling :meth:`.from_xml` with the first child of the root
+        node.
+
+        :param str path: The path of the XML file
+        """
+        try:
+            from xml.etree import cElementTree as ElementTree
+        except ImportError:
+            from xml.etree import ElementTree
+
+        stack = []
+        sequence_node = None
+        first_video_node = None
+        track_clips = []
+        files = {}
+
+        for event, node in ElementTree.iterparse(path, ('start', 'end')):
+            if event == 'start':
+                depth = len(stack)
+                if depth == 1 and sequence_node is None:
+                    sequence_node = node
+                elif depth == 3 and node.tag == 'video' \
+                        and stack[1] is sequence_node \
+                        and stack[2].tag == 'media' \
+                        and first_video_node is None:
+                    first_video_node = node
+                elif depth == 4 and node.tag == 'track' \
+                        and stack[3] is first_video_node:
+                    track_clips.append([])
+                stack.append(node)
+                continue
+
+            stack.pop()
+            if node.tag != 'clipitem' or not stack:
+                continue
+
+            if len(stack) == 5 and stack[4].tag == 'track' \
+                    and stack[3] is first_video_node:
+                track_clips[-1].append(Track._clip_from_xml(node, files))
+
+            # discard the processed clipitem, the clipitems out of the first
+            # video node are not a part of the model
+            parent = stack[-1]
+            if parent[-1] is node:
+                del parent[-1]
+            else:
+                parent.remove(node)
+            node.clear()
+
+        self.from_xml(sequence_node)
+
+        if self.media.video is not None:
+            for track, clips in zip(self.media.video.tracks, track_clips):
+                track.clips.extend(clips)
+
+    def to_xml_stream(self, fp, indentation=2, pre_indent=0):
+        """writes an xml version of this Sequence object to the given file
+        like object
+        """
+        write = fp.write
+        pre = ' ' * pre_indent
+        ind = ' ' * indentation
+
+        write('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<!DOCTYPE xmeml>\n'
+              '<xmeml version="5">\n')
+        write('%s<sequence>\n' % pre)
+        write('%s%s<duration>%s</duration>\n' % (pre, ind, self.duration))
+        write('%s%s<name>%s</name>\n' % (pre, ind, self.name))
+        self.rate.to_xml_stream(
+            fp, indentation=indentation, pre_indent=indentation + pre_indent
+        )
+        write('\n%s%s<timecode>\n' % (pre, ind))
+        write('%s%s%s<string>%s</string>\n' % (pre, ind, ind, self.timecode))
+        write('%s%s</timecode>\n' % (pre, ind))
+        self.media.to_xml_stream(
+            fp, indentation=indentation, pre_indent=indentation + pre_indent
+        )
+        write('\n%s</sequence>\n</xmeml>' % pre)
 
     def from_edl(self, edl_list):
         """Fills attributes with the given edl.List instance
@@ -210,6 +360,7 @@ class Sequence(EditBase, NameMixin, DurationMixin):
         :param edl_list: an edl.List instance
         """
         import edl
+        from anima.utils import timecodes
         assert isinstance(edl_list, edl.List)
 
         self.name = edl_list.title
@@ -227,50 +378,49 @@ class Sequence(EditBase, NameMixin, DurationMixin):
         # read Events in to Clips
         sequence_start = 1e20
         sequence_end = -1
+        tc_24_hours_frame_number = None
         for e in edl_list.events:
             assert isinstance(e, edl.Event)
-            clip = Clip()
-
-            clip.name = e.reel
-            clip.id = e.clip_name
-            clip.type = 'Video' if e.track == 'V' else 'Audio'
-
-            clip.in_ = e.src_start_tc.frame_number
-            clip.out = e.src_end_tc.frame_number
-
-            clip.duration = clip.out - clip.in_
-
-            clip.start = e.rec_start_tc.frame_number
-            clip.end = e.rec_end_tc.frame_number
+            in_ = e.src_start_tc.frame_number
+            out = e.src_end_tc.frame_number
+            clip = Clip._create(
+                id=Clip._validate_id(e.clip_name),
+                name=Clip._validate_name(e.reel),
+                type_='Video' if e.track == 'V' else 'Audio',
+                in_=in_,
+                out=out,
+                duration=Clip._validate_duration(out - in_),
+                start=e.rec_start_tc.frame_number,
+                end=e.rec_end_tc.frame_number
+            )
 
             # check in and out points relative to each other
             if clip.start > clip.end:
                 # a possible negative number
-                from timecode import Timecode
-                # get the last timecode like 23:59:59:xx
-                tc_24_hours = Timecode(
-                    edl_list.fps,
-                    '23:59:59:%s' % edl_list.fps
-                )
-                clip.start -= tc_24_hours.frame_number  # + 1
+                if tc_24_hours_frame_number is None:
+                    # get the last timecode like 23:59:59:xx
+                    tc_24_hours_frame_number = timecodes.timecode_to_frames(
+                        edl_list.fps,
+                        '23:59:59:%s' % edl_list.fps
+                    ) - 1
+                clip.start -= tc_24_hours_frame_number  # + 1
 
             if clip.start < sequence_start:
                 sequence_start = clip.start
             if clip.end > sequence_end:
                 sequence_end = clip.end
 
-            f = File()
-            f.name = clip.name
-
             # include the handle at start,
             # but we can not have any idea about the
             # handle at end
             #
             # a possible solution is to look to the original media
             # but we may not be able to reach the media itself
-            f.duration = e.src_end_tc.frame_number
-
-            f.pathurl = 'file://%s' % e.source_file
+            f = File._create(
+                duration=out,
+                name=clip.name,
+                pathurl=File._validate_pathurl('file://%s' % e.source_file)
+            )
 
             clip.file = f
 
@@ -286,7 +436,7 @@ class Sequence(EditBase, NameMixin, DurationMixin):
         """Returns an edl.List instance equivalent of this Sequence instance
         """
         from edl import List, Event
-        from timecode import Timecode
+        from anima.utils import timecodes
 
         l = List(self.rate.timebase)
         l.title = self.name
@@ -302,6 +452,7 @@ class Sequence(EditBase, NameMixin, DurationMixin):
 
         video = self.media.video
         if video is not None:
+            timebase = self.rate.timebase
             i = 0
             for track in video.tracks:
                 for clip in track.clips:
@@ -314,23 +465,21 @@ class Sequence(EditBase, NameMixin, DurationMixin):
                     e.tr_code = 'C'  # TODO: for now use C (Cut) later on
                     # expand it to add other transition codes
 
-                    src_start_tc = Timecode(self.rate.timebase,
-                                            frames=clip.in_ + 1)
+                    e.src_start_tc = timecodes.frames_to_timecode(
+                        timebase, clip.in_ + 1
+                    )
                     # 1 frame after last frame shown
-                    src_end_tc = Timecode(self.rate.timebase,
-                                          frames=clip.out + 1)
-
-                    e.src_start_tc = str(src_start_tc)
-                    e.src_end_tc = str(src_end_tc)
+                    e.src_end_tc = timecodes.frames_to_timecode(
+                        timebase, clip.out + 1
+                    )
 
-                    rec_start_tc = Timecode(self.rate.timebase,
-                                            frames=clip.start + 1)
+                    e.rec_start_tc = timecodes.frames_to_timecode(
+                        timebase, clip.start + 1
+                    )
                     # 1 frame after last frame shown
-                    rec_end_tc = Timecode(self.rate.timebase,
-                                          frames=clip.end + 1)
-
-                    e.rec_start_tc = str(rec_start_tc)
-                    e.rec_end_tc = str(rec_end_tc)
+                    e.rec_end_tc = timecodes.frames_to_timecode(
+                        timebase, clip.end + 1
+                    )
 
                     source_file = \
                         clip.file.pathurl.replace('file://localhost', '')
@@ -348,93 +497,136 @@ class Sequence(EditBase, NameMixin, DurationMixin):
                     l.append(e)
         return l
 
+    def _get_metafuze_kwargs(self, clip, width, height, duration):
+        """returns the values of the MetaFuze XML template for the given clip
+
+        :param clip: A :class:`.Clip` instance
+        :param int width: The width of the media
+        :param int height: The height of the media
+        :param int duration: The duration of the media in frames
+        """
+        raw_file_path = clip.file.pathurl.replace('file://localhost', '')
+        raw_mxf_path = '%s%s' % (
+            os.path.splitext(raw_file_path)[0],
+            '.mxf'
+        )
+
+        return {
+            'file_pathurl': os.path.normpath(
+                os.path.expandvars(raw_file_path)
+            ),
+            'mxf_pathurl': os.path.normpath(
+                os.path.expandvars(raw_mxf_path)
+            ),
+            'sequence_name': self.name,
+            'sequence_timecode': self.timecode,
+            'clip_id': clip.id,
+            'clip_name': clip.name,
+            # metafuze likes frame number
+            'clip_duration': duration - 1,
+            'width': width,
+            'height': height
+        }
+
     def to_metafuze_xml(self):
         """Generates a MetaFuze compatible XML content per clip.
 
         :returns: list of strings
         """
-        metafuze_xml_template = """<?xml version='1.0' encoding='UTF-8'?>
-<MetaFuze_BatchTranscode xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:noNamespaceSchemaLocation="MetaFuzeBatchTranscode.xsd">
-   <Configuration>
-      <Local>8</Local>
-      <Remote>8</Remote>
-   </Configuration>
-   <Group>
-      <FileList>
-         <File>%(file_pathurl)s</File>
-      </FileList>
-      <Transcode>
-         <Version>1.0</Version>
-         <File>%(mxf_pathurl)s</File>
-         <ClipName>%(clip_name)s</ClipName>
-         <ProjectName>%(sequence_name)s</ProjectName>
-         <TapeName>%(clip_name)s</TapeName>
-         <TC_Start>%(sequence_timecode)s</TC_Start>
-         <DropFrame>false</DropFrame>
-         <EdgeTC>** TimeCode N/A **</EdgeTC>
-         <FilmType>35.4</FilmType>
-         <KN_Start>AAAAAAAA-0000+00</KN_Start>
-         <Frames>%(clip_duration)i</Frames>
-         <Width>%(width)i</Width>
-         <Height>%(height)i</Height>
-         <PixelRatio>1.0000</PixelRatio>
-         <UseFilmInfo>false</UseFilmInfo>
-         <UseTapeInfo>true</UseTapeInfo>
-         <AudioChannelCount>0</AudioChannelCount>
-         <UseMXFAudio>false</UseMXFAudio>
-         <UseWAVAudio>false</UseWAVAudio>
-         <SrcBitsPerChannel>8</SrcBitsPerChannel>
-         <OutputPreset>DNxHD 36</OutputPreset>
-         <OutputPreset>
-            <Version>2.0</Version>
-            <Name>DNxHD 36</Name>
-            <ColorModel>YCC 709</ColorModel>
-            <BitDepth>8</BitDepth>
-            <Format>1080 24p</Format>
-            <Compression>DNxHD 36</Compression>
-            <Conversion>Letterbox (center)</Conversion>
-            <VideoFileType>.mxf</VideoFileType>
-            <IsDefault>false</IsDefault>
-         </OutputPreset>
-         <Eye></Eye>
-         <Scene></Scene>
-         <Comment></Comment>
-      </Transcode>
-   </Group>
-</MetaFuze_BatchTranscode>"""
         rendered_xmls = []
         video = self.media.video
         if video is not None:
             for track in video.tracks:
                 for clip in track.clips:
-                    raw_file_path = \
-                        clip.file.pathurl.replace('file://localhost', '')
-                    raw_mxf_path = '%s%s' % (
-                        os.path.splitext(raw_file_path)[0],
-                        '.mxf'
+                    kwargs = self._get_metafuze_kwargs(
+                        clip, video.width, video.height, clip.duration
                     )
-
-                    kwargs = {
-                        'file_pathurl': os.path.normpath(
-                            os.path.expandvars(raw_file_path)
-                        ),
-                        'mxf_pathurl': os.path.normpath(
-                            os.path.expandvars(raw_mxf_path)
-                        ),
-                        'sequence_name': self.name,
-                        'sequence_timecode': self.timecode,
-                        'clip_id': clip.id,
-                        'clip_name': clip.name,
-                        # metafuze likes frame number
-                        'clip_duration': clip.duration - 1,
-                        'width': video.width,
-                        'height': video.height
-                    }
-
-                    rendered_xmls.append(metafuze_xml_template % kwargs)
+                    rendered_xmls.append(self.metafuze_xml_template % kwargs)
 
         return rendered_xmls
 
+    def to_metafuze_xml_files(self, output_path, probe=True,
+                              max_workers=None):
+        """Generates MetaFuze compatible XML files in to the given folder, one
+        per media file.
+
+        Unlike :meth:`.to_metafuze_xml` the clips using the same media file
+        are converted only once. The size and the frame count of each media
+        file are probed with ``ffprobe`` in parallel (see
+        :meth:`anima.utils.MediaManager.probe_videos`), so the media files
+        with different resolutions are converted correctly. The sequence
+        size and the clip duration are used for the files that can not be
+        probed.
+
+        :param str output_path: The folder to write the XML files to, it is
+          created if it doesn't exist.
+        :param bool probe: Probe the media files. If False the sequence size
+          and the clip durations are used as in :meth:`.to_metafuze_xml`.
+        :param int max_workers: The maximum number of parallel probes,
+          defaults to the number of CPUs.
+        :returns: list of XML file paths in clip order
+        """
+        video = self.media.video
+        if video is None:
+            return []
+
+        # use the first clip of each media file
+        clips = []
+        seen_paths = set()
+        for track in video.tracks:
+            for clip in track.clips:
+                if clip.file is None or clip.file.pathurl in seen_paths:
+                    continue
+                seen_paths.add(clip.file.pathurl)
+                clips.append(clip)
+
+        clip_kwargs = [
+            self._get_metafuze_kwargs(
+                clip, video.width, video.height, clip.duration
+            )
+            for clip in clips
+        ]
+
+        probe_results = {}
+        if probe and clip_kwargs:
+            from anima.utils import MediaManager
+            probe_results = MediaManager().probe_videos(
+                [kwargs['file_pathurl'] for kwargs in clip_kwargs],
+                max_workers=max_workers
+            )
+
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+
+        xml_paths = []
+        used_file_names = set()
+        for kwargs in clip_kwargs:
+            info = probe_results.get(kwargs['file_pathurl'])
+            if info:
+                if info['width'] and info['height']:
+                    kwargs['width'] = info['width']
+                    kwargs['height'] = info['height']
+                if info['nb_frames']:
+                    kwargs['clip_duration'] = info['nb_frames'] - 1
+
+            # use the media file name for the xml file
+            file_name = os.path.splitext(
+                os.path.basename(kwargs['mxf_pathurl'])
+            )[0]
+            xml_file_name = '%s.xml' % file_name
+            i = 1
+            while xml_file_name in used_file_names:
+                xml_file_name = '%s_%i.xml' % (file_name, i)
+                i += 1
+            used_file_names.add(xml_file_name)
+
+            xml_path = os.path.join(output_path, xml_file_name)
+            with open(xml_path, 'w') as f:
+                f.write(self.metafuze_xml_template % kwargs)
+            xml_paths.append(xml_path)
+
+        return xml_paths
+
 
 class Media(EditBase):
     """XML compatibility class for Sequencer
@@ -454,23 +646,16 @@ class Media(EditBase):
         video.from_xml(xml_video_tag)
         self.video = video
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this Media object
+    def to_xml_stream(self, fp, indentation=2, pre_indent=0):
+        """writes an xml version of this Media object to the given file like
+        object
         """
-        template = """%(pre_indent)s<media>
-%(video)s
-%(pre_indent)s</media>"""
-
-        video_data = self.video.to_xml(
-            indentation=indentation,
-            pre_indent=indentation + pre_indent
+        pre = ' ' * pre_indent
+        fp.write('%s<media>\n' % pre)
+        self.video.to_xml_stream(
+            fp, indentation=indentation, pre_indent=indentation + pre_indent
         )
-
-        return template % {
-            'video': video_data,
-            'pre_indent': ' ' * pre_indent,
-            'indentation': ' ' * indentation
-        }
+        fp.write('\n%s</media>' % pre)
 
 
 class Video(EditBase):
@@ -495,41 +680,40 @@ class Video(EditBase):
             format_node.find('samplecharacteristics').find('height').text
         )
 
-        # create tracks
+        # create tracks, the file references may point to the files of the
+        # earlier tracks
+        files = {}
         for track_tag in xml_node.findall('track'):
             track = Track()
-            track.from_xml(track_tag)
+            track.from_xml(track_tag, files=files)
 
             self.tracks.append(track)
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this Video object
-        """
-        template = """%(pre_indent)s<video>
-%(pre_indent)s%(indentation)s<format>
-%(pre_indent)s%(indentation)s%(indentation)s<samplecharacteristics>
-%(pre_indent)s%(indentation)s%(indentation)s%(indentation)s<width>%(width)s</width>
-%(pre_indent)s%(indentation)s%(indentation)s%(indentation)s<height>%(height)s</height>
-%(pre_indent)s%(indentation)s%(indentation)s</samplecharacteristics>
-%(pre_indent)s%(indentation)s</format>
-%(tracks)s
-%(pre_indent)s</video>"""
-
-        track_data = []
-        for track in self.tracks:
-            track_data.append(
-                track.to_xml(indentation=indentation,
-                             pre_indent=indentation + pre_indent)
+    def to_xml_stream(self, fp, indentation=2, pre_indent=0):
+        """writes an xml version of this Video object to the given file like
+        object
+        """
+        write = fp.write
+        pre = ' ' * pre_indent
+        ind = ' ' * indentation
+
+        write('%s<video>\n' % pre)
+        write('%s%s<format>\n' % (pre, ind))
+        write('%s%s%s<samplecharacteristics>\n' % (pre, ind, ind))
+        write('%s%s%s%s<width>%s</width>\n' % (pre, ind, ind, ind, self.width))
+        write(
+            '%s%s%s%s<height>%s</height>\n' % (pre, ind, ind, ind, self.height)
+        )
+        write('%s%s%s</samplecharacteristics>\n' % (pre, ind, ind))
+        write('%s%s</format>\n' % (pre, ind))
+        for i, track in enumerate(self.tracks):
+            if i:
+                write('\n')
+            track.to_xml_stream(
+                fp, indentation=indentation,
+                pre_indent=indentation + pre_indent
             )
-        track_data_as_str = '\n'.join(track_data)
-
-        return template % {
-            'width': self.width,
-            'height': self.height,
-            'tracks': track_data_as_str,
-            'pre_indent': ' ' * pre_indent,
-            'indentation': ' ' * indentation
-        }
+        write('\n%s</video>' % pre)
 
 
 class Track(EditBase):
@@ -544,79 +728,113 @@ class Track(EditBase):
     def optimize_clips(self):
         """optimizes files across all clips to use the same file node if two or
         more clips are using the same files
-        """
-        # check all clip files and set to the same file node if the path is
-        # the same
-        for i in range(len(self.clips)):
-            clip = self.clips[i]
-            # go over the rest of the clips
-            for j in range(i + 1, len(self.clips)):
-                compare_clip = self.clips[j]
-                if clip.file.pathurl == compare_clip.file.pathurl:
-                    compare_clip.file = clip.file
-
-                # also check the ids
-                if clip.id == compare_clip.id:
-                    # get the id randomized part
-                    random_part = clip.id.split(' ')[-1]
-                    if random_part != clip.id:
-                        random_id = int(random_part) + 1
-                        compare_clip.id = '%s %s' % (
-                            clip.id.split(' ')[0],
-                            random_id
-                        )
-                    else:
-                        random_id = 2
-                        compare_clip.id = '%s %s' % (clip.id, random_id)
 
-    def from_xml(self, xml_node):
+        It also renames the clips having the same id with an earlier clip by
+        adding or increasing a number suffix (ex: "shot1", "shot1 2",
+        "shot1 3"), so every clip in this track has a unique id.
+        """
+        files = {}
+        used_ids = set()
+        # the next number to try per id base and starting number
+        next_numbers = {}
+        for clip in self.clips:
+            # set to the same file node if the path is the same
+            if clip.file is not None:
+                clip.file = files.setdefault(clip.file.pathurl, clip.file)
+
+            # also check the ids
+            clip_id = clip.id
+            if clip_id in used_ids:
+                # get the id randomized part
+                base, number = clip_id, 1
+                parts = clip_id.rsplit(' ', 1)
+                if len(parts) == 2 and parts[1].isdigit():
+                    base, number = parts[0], int(parts[1])
+
+                key = (base, number)
+                number = next_numbers.get(key, number + 1)
+                clip_id = '%s %s' % (base, number)
+                # skip the ids that are created by renaming
+                while clip_id in used_ids:
+                    number += 1
+                    clip_id = '%s %s' % (base, number)
+                next_numbers[key] = number + 1
+                clip.id = clip_id
+            used_ids.add(clip_id)
+
+    def from_xml(self, xml_node, files=None):
         """Fills attributes with the given XML node
 
         :param xml_node: an xml.etree.ElementTree.Element instance
+        :param dict files: The :class:`.File` instances of the earlier clips
+          by their file ids, to resolve the ``<file id="..."/>`` references.
+          The files of this track are added to it.
         """
+        if files is None:
+            files = {}
+
         self.locked = xml_node.find('locked').text.title() == 'True'
         self.enabled = xml_node.find('enabled').text.title() == 'True'
 
         # find clips
         for clip_tag in xml_node.findall('clipitem'):
-            clip = Clip()
-            clip.from_xml(clip_tag)
-            self.clips.append(clip)
+            self.clips.append(self._clip_from_xml(clip_tag, files))
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this Track object
+    @classmethod
+    def _clip_from_xml(cls, clip_tag, files):
+        """Creates a Clip from the given clipitem node and resolves its
+        ``<file id="..."/>`` reference with the given files dictionary
+
+        :param clip_tag: an xml.etree.ElementTree.Element instance
+        :param dict files: The :class:`.File` instances by their file ids
         """
-        template = """%(pre_indent)s<track>
-%(pre_indent)s%(indentation)s<locked>%(locked)s</locked>
-%(pre_indent)s%(indentation)s<enabled>%(enabled)s</enabled>
-%(clips)s
-%(pre_indent)s</track>"""
+        clip = Clip._create()
+        clip.from_xml(clip_tag)
+
+        file_tag = clip_tag.find('file')
+        if file_tag is not None:
+            file_id = file_tag.get('id')
+            if clip.file is None:
+                # a reference to an already defined file
+                clip.file = files.get(file_id)
+            else:
+                files.setdefault(file_id, clip.file)
+        return clip
 
-        clip_data = []
-        for clip in self.clips:
-            clip_data.append(
-                clip.to_xml(indentation=indentation,
-                            pre_indent=indentation + pre_indent)
+    def to_xml_stream(self, fp, indentation=2, pre_indent=0):
+        """writes an xml version of this Track object to the given file like
+        object
+        """
+        write = fp.write
+        pre = ' ' * pre_indent
+        ind = ' ' * indentation
+
+        write('%s<track>\n' % pre)
+        write('%s%s<locked>%s</locked>\n' %
+              (pre, ind, str(self.locked).upper()))
+        write('%s%s<enabled>%s</enabled>\n' %
+              (pre, ind, str(self.enabled).upper()))
+        for i, clip in enumerate(self.clips):
+            if i:
+                write('\n')
+            clip.to_xml_stream(
+                fp, indentation=indentation,
+                pre_indent=indentation + pre_indent
             )
-        clip_data_as_str = '\n'.join(clip_data)
-
-        return template % {
-            'locked': str(self.locked).upper(),
-            'enabled': str(self.enabled).upper(),
-            'clips': clip_data_as_str,
-            'pre_indent': ' ' * pre_indent,
-            'indentation': ' ' * indentation
-        }
+        write('\n%s</track>' % pre)
 
 
-class Clip(EditBase, NameMixin, DurationMixin):
+class Clip(EditBase, SlottedNameMixin, SlottedDurationMixin):
     """XML compatibility class for Clip
     """
 
+    __slots__ = ('_name', '_duration', '_id', 'start', 'end', 'enabled',
+                 'in_', 'out', 'file', 'type', '_rate')
+
     def __init__(self, id=None, name='', start=0.0, end=0.0, duration=0.0,
                  enabled=True, in_=0, out=0, type_='Video', rate=None):
-        NameMixin.__init__(self, name=name)
-        DurationMixin.__init__(self, duration=duration)
+        SlottedNameMixin.__init__(self, name=name)
+        SlottedDurationMixin.__init__(self, duration=duration)
         self._id = self._validate_id(id)
         self.start = start
         self.end = end
@@ -628,6 +846,29 @@ class Clip(EditBase, NameMixin, DurationMixin):
         self._rate = None
         self.rate = rate
 
+    @classmethod
+    def _create(cls, id='', name='', start=0, end=0, duration=0,
+                enabled=True, in_=0, out=0, type_='Video', rate=None,
+                file=None):
+        """Creates a Clip instance without validating the given values.
+
+        It is the fast construction path for the parsers, the values should
+        already be valid, use the Clip class itself for any other input.
+        """
+        clip = cls.__new__(cls)
+        clip._id = id
+        clip._name = name
+        clip._duration = duration
+        clip.start = start
+        clip.end = end
+        clip.enabled = enabled
+        clip.in_ = in_
+        clip.out = out
+        clip.file = file
+        clip.type = type_
+        clip._rate = rate
+        return clip
+
     @classmethod
     def _validate_rate(cls, rate):
         """validates the rate value
@@ -681,72 +922,81 @@ class Clip(EditBase, NameMixin, DurationMixin):
 
         :param xml_node: an xml.etree.ElementTree.Element instance
         """
-        self.id = xml_node.attrib['id']
+        # the parsed values are already converted to the correct types, so
+        # only the name, which can be None, is validated
+        self._id = xml_node.attrib['id']
         self.start = int(xml_node.find('start').text)
         self.end = int(xml_node.find('end').text)
-        self.name = xml_node.find('name').text
+        self._name = self._validate_name(xml_node.find('name').text)
         self.enabled = xml_node.find('enabled').text == 'True'
-        self.duration = int(xml_node.find('duration').text)
+        self._duration = int(xml_node.find('duration').text)
         self.in_ = int(xml_node.find('in').text)
         self.out = int(xml_node.find('out').text)
 
         file_tag = xml_node.find('file')
         if file_tag:
-            f = File()
+            f = File._create()
             f.from_xml(file_tag)
 
             self.file = f
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this Clip object
-        """
-        template = """%(pre_indent)s<clipitem id="%(id)s">
-%(pre_indent)s%(indentation)s<end>%(end)i</end>
-%(pre_indent)s%(indentation)s<name>%(name)s</name>
-%(pre_indent)s%(indentation)s<enabled>%(enabled)s</enabled>
-%(pre_indent)s%(indentation)s<start>%(start)i</start>
-%(pre_indent)s%(indentation)s<in>%(in)i</in>
-%(pre_indent)s%(indentation)s<duration>%(duration)i</duration>%(rate)s
-%(pre_indent)s%(indentation)s<out>%(out)i</out>
-%(file)s
-%(pre_indent)s</clipitem>"""
-
-        rate_xml = ''
+    def to_xml_stream(self, fp, indentation=2, pre_indent=0):
+        """writes an xml version of this Clip object to the given file like
+        object
+        """
+        write = fp.write
+        pre = ' ' * pre_indent
+        ind = ' ' * indentation
+
+        write('%s<clipitem id="%s">\n' % (pre, self.id))
+        write('%s%s<end>%i</end>\n' % (pre, ind, self.end))
+        write('%s%s<name>%s</name>\n' % (pre, ind, self.name))
+        write('%s%s<enabled>%s</enabled>\n' % (pre, ind, self.enabled))
+        write('%s%s<start>%i</start>\n' % (pre, ind, self.start))
+        write('%s%s<in>%i</in>\n' % (pre, ind, self.in_))
+        write('%s%s<duration>%i</duration>' % (pre, ind, self.duration))
         if self.rate:
-            rate_xml = '\n%s' % self.rate.to_xml(
-                indentation=indentation,
+            write('\n')
+            self.rate.to_xml_stream(
+                fp, indentation=indentation,
                 pre_indent=pre_indent + indentation
             )
-
-        return template % {
-            'id': self.id,
-            'start': self.start,
-            'end': self.end,
-            'name': self.name,
-            'enabled': self.enabled,
-            'duration': self.duration,
-            'in': self.in_,
-            'out': self.out,
-            'file': self.file.to_xml(indentation=indentation,
-                                     pre_indent=pre_indent + indentation),
-            'pre_indent': ' ' * pre_indent,
-            'indentation': ' ' * indentation,
-            'rate': rate_xml
-        }
+        write('\n%s%s<out>%i</out>\n' % (pre, ind, self.out))
+        self.file.to_xml_stream(
+            fp, indentation=indentation, pre_indent=pre_indent + indentation
+        )
+        write('\n%s</clipitem>' % pre)
 
 
-class File(EditBase, NameMixin, DurationMixin):
+class File(EditBase, SlottedNameMixin, SlottedDurationMixin):
     """XML compatibility class for Sequencer
     """
 
+    __slots__ = ('_name', '_duration', '_pathurl', '_id', 'exported_once')
+
     def __init__(self, duration=0, name='', pathurl=''):
-        NameMixin.__init__(self, name=name)
-        DurationMixin.__init__(self, duration=duration)
+        SlottedNameMixin.__init__(self, name=name)
+        SlottedDurationMixin.__init__(self, duration=duration)
         self._pathurl = self._validate_pathurl(pathurl)
         self._id = None
         self.id = self._pathurl
         self.exported_once = False
 
+    @classmethod
+    def _create(cls, duration=0, name='', pathurl=''):
+        """Creates a File instance without validating the given values.
+
+        It is the fast construction path for the parsers, the pathurl should
+        already be normalized with :meth:`._validate_pathurl`.
+        """
+        f = cls.__new__(cls)
+        f._duration = duration
+        f._name = name
+        f._pathurl = pathurl
+        f._id = cls._validate_id(pathurl)
+        f.exported_once = False
+        return f
+
     @property
     def id(self):
         """the getter for the _id attribute
@@ -818,37 +1068,42 @@ class File(EditBase, NameMixin, DurationMixin):
         """
         duration_node = xml_node.find('duration')
         if duration_node is not None:
-            self.duration = int(duration_node.text)
+            self._duration = int(duration_node.text)
 
         name_node = xml_node.find('name')
         if name_node is not None:
-            self.name = name_node.text
+            self._name = self._validate_name(name_node.text)
 
         pathurl_node = xml_node.find('pathurl')
         if pathurl_node is not None:
+            # the pathurl is normalized by the validation, so it can not be
+            # skipped
             self.pathurl = pathurl_node.text
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this File object
+    def to_xml_stream(self, fp, indentation=2, pre_indent=0):
+        """writes an xml version of this File object to the given file like
+        object
         """
+        pre = ' ' * pre_indent
         if self.exported_once:
-            template = """%(pre_indent)s<file id="%(id)s"/>"""
-        else:
-            template = """%(pre_indent)s<file id="%(id)s">
-%(pre_indent)s%(indentation)s<duration>%(duration)i</duration>
-%(pre_indent)s%(indentation)s<name>%(name)s</name>
-%(pre_indent)s%(indentation)s<pathurl>%(pathurl)s</pathurl>
-%(pre_indent)s</file>"""
-            self.exported_once = True
-
-        return template % {
-            'id': self.id,
-            'duration': self.duration,
-            'name': self.name,
-            'pathurl': self.pathurl,
-            'pre_indent': ' ' * pre_indent,
-            'indentation': ' ' * indentation
-        }
+            fp.write('%s<file id="%s"/>' % (pre, self.id))
+            return
+
+        ind = ' ' * indentation
+        fp.write(
+            '%s<file id="%s">\n'
+            '%s%s<duration>%i</duration>\n'
+            '%s%s<name>%s</name>\n'
+            '%s%s<pathurl>%s</pathurl>\n'
+            '%s</file>' % (
+                pre, self.id,
+                pre, ind, self.duration,
+                pre, ind, self.name,
+                pre, ind, self.pathurl,
+                pre
+            )
+        )
+        self.exported_once = True
 
 
 class Rate(EditBase):
@@ -862,6 +1117,8 @@ class Rate(EditBase):
     :param bool ntsc: A bool value showing if this is a dropframe rate. Default
       value is False.
     """
+    __slots__ = ('_timebase', '_ntsc')
+
     __timebase_default_value = '25'
 
     def __init__(self, timebase=None, ntsc=False):
@@ -870,6 +1127,17 @@ class Rate(EditBase):
         self.timebase = self._validate_timebase(timebase)
         self.ntsc = self._validate_ntsc(ntsc)
 
+    @classmethod
+    def _create(cls, timebase='25', ntsc=False):
+        """Creates a Rate instance without validating the given values.
+
+        It is the fast construction path for the parsers.
+        """
+        rate = cls.__new__(cls)
+        rate._timebase = timebase
+        rate._ntsc = ntsc
+        return rate
+
     @classmethod
     def _validate_timebase(cls, timebase):
         """validates the given timebase value
@@ -934,18 +1202,22 @@ class Rate(EditBase):
         rate_tag = xml_node
         if rate_tag is not None:
             self.timebase = rate_tag.find('timebase').text
-            self.ntsc = rate_tag.find('ntsc').text.title() == 'True'
+            self._ntsc = rate_tag.find('ntsc').text.title() == 'True'
 
-    def to_xml(self, indentation=2, pre_indent=0):
-        """returns an xml version of this Media object
-        """
-        template = """%(pre_indent)s<rate>
-%(pre_indent)s%(indentation)s<timebase>%(timebase)s</timebase>
-%(pre_indent)s%(indentation)s<ntsc>%(ntsc)s</ntsc>
-%(pre_indent)s</rate>"""
-        return template % {
-            'timebase': self.timebase,
-            'ntsc': 'TRUE' if self.ntsc else 'FALSE',
-            'pre_indent': ' ' * pre_indent,
-            'indentation': ' ' * indentation
-        }
+    def to_xml_stream(self, fp, indentation=2, pre_indent=0):
+        """writes an xml version of this Rate object to the given file like
+        object
+        """
+        pre = ' ' * pre_indent
+        ind = ' ' * indentation
+        fp.write(
+            '%s<rate>\n'
+            '%s%s<timebase>%s</timebase>\n'
+            '%s%s<ntsc>%s</ntsc>\n'
+            '%s</rate>' % (
+                pre,
+                pre, ind, self.timebase,
+                pre, ind, 'TRUE' if self.ntsc else 'FALSE',
+                pre
+            )
+        )
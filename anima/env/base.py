@@ -5,7 +5,7 @@
 # License: http://www.opensource.org/licenses/BSD-2-Clause
 import os
 
-from anima import logger, log_file_handler
+from anima import logger, log_file_handler, perf
 from anima.recent import RecentFileManager
 
 
@@ -214,6 +214,7 @@ class EnvironmentBase(object):
         return versions
 
     @classmethod
+    @perf.profile('env.get_version_from_full_path')
     def get_version_from_full_path(cls, full_path):
         """Finds the Version instance from the given full_path value.
 
@@ -1627,12 +1627,23 @@ class Playblaster(object):
         return temp_video_file_full_paths
 
     @classmethod
-    def upload_outputs(cls, version, video_file_full_paths):
+    def upload_outputs(cls, version, video_file_full_paths, max_workers=None):
         """Bulk upload outputs to given version
 
+        The hires copies, web versions and thumbnails of all the files are
+        generated in parallel on the worker pool returned by
+        :func:`anima.utils.get_executor`. The same file is uploaded only once
+        and all the :class:`stalker.Link` instances are committed in one
+        transaction. Links are only created for the files that are
+        generated successfully.
+
         :param version: Stalker Version instance
         :param list video_file_full_paths: List of file paths
-        :return:
+        :param int max_workers: The size of the worker pool, defaults to the
+          number of CPUs.
+        :return: A list of the uploaded file paths in the same order with the
+          given file paths.
+        :raises RuntimeError: If none of the files can be uploaded.
         """
         from anima.ui.progress_dialog import ProgressDialogManager
         from anima.env.mayaEnv import MayaMainProgressBarWrapper
@@ -1640,36 +1651,113 @@ class Playblaster(object):
         pdm = ProgressDialogManager(dialog=wrp)
         pdm.close()
 
-        outputs = []
-        # register a new caller
-        caller = pdm.register(
-            len(video_file_full_paths),
-            'Uploading Playblasts...'
-        )
+        cls.check_version(version)
+
+        # skip the duplicate inputs and inputs uploaded to the same path
+        output_paths_by_file = {}
+        unique_output_paths = []
+        uploaded_paths = {}
         for output_file_full_path in video_file_full_paths:
-            # upload output to server
-            output_path = cls.upload_output(
-                version=version,
-                output_file_full_path=output_file_full_path,
+            key = os.path.normcase(os.path.abspath(output_file_full_path))
+            if key in output_paths_by_file:
+                continue
+
+            output_paths = \
+                cls.get_output_paths(version, output_file_full_path)
+            hires_path = output_paths['hires_path']
+            if hires_path in uploaded_paths:
+                output_paths = uploaded_paths[hires_path]
+            else:
+                uploaded_paths[hires_path] = output_paths
+                unique_output_paths.append(output_paths)
+            output_paths_by_file[key] = output_paths
+
+        from anima.utils import MediaManager, get_executor
+        from anima.utils import run_as_pool_worker
+        m = MediaManager()
+        jobs = []
+        for output_paths in unique_output_paths:
+            cls.create_output_folders(output_paths)
+            jobs.extend(cls.get_output_jobs(m, output_paths))
+
+        # register a new caller
+        caller = pdm.register(len(jobs), 'Uploading Playblasts...')
+
+        # the target paths of the succeeded jobs
+        created_paths = set()
+
+        executor = None
+        if max_workers != 1 and len(jobs) > 1:
+            executor = get_executor(max_workers)
+
+        if executor is None:
+            for job in jobs:
+                if cls.run_output_job(*job):
+                    created_paths.add(job[2])
+                caller.step()
+        else:
+            from concurrent import futures
+            target_paths_by_future = {}
+            for job in jobs:
+                future = executor.submit(
+                    run_as_pool_worker, max_workers, cls.run_output_job, *job
+                )
+                target_paths_by_future[future] = job[2]
+            # step in this thread, the progress bar is not thread safe
+            for future in futures.as_completed(target_paths_by_future):
+                if future.result():
+                    created_paths.add(target_paths_by_future[future])
+                caller.step()
+
+        if jobs and not created_paths:
+            raise RuntimeError(
+                'can not upload any of the outputs:\n%s' %
+                '\n'.join(video_file_full_paths)
             )
 
-            outputs.append(output_path)
-            caller.step()
+        from stalker import db
+        links = []
+        for output_paths in unique_output_paths:
+            links.extend(
+                cls.create_output_links(version, output_paths, created_paths)
+            )
 
-        return outputs
+        if links:
+            db.DBSession.add_all(links)
+            try:
+                db.DBSession.commit()
+            except Exception:
+                db.DBSession.rollback()
+                raise
+
+        return [
+            output_paths_by_file[
+                os.path.normcase(os.path.abspath(output_file_full_path))
+            ]['hires_path']
+            for output_file_full_path in video_file_full_paths
+        ]
 
     @classmethod
-    def upload_output(cls, version, output_file_full_path):
-        """sets the given file as the output of the given version, also
-        generates a thumbnail and a web version if it is a movie file
+    def check_version(cls, version):
+        """raises a RuntimeError if the given version is not a Stalker
+        Version instance
 
         :param version: The stalker version instance
-        :param output_file_full_path: the path of the media file
         """
         from stalker import Version
         if not isinstance(version, Version):
             raise RuntimeError('version should be a stalker version instance!')
 
+    @classmethod
+    def get_output_paths(cls, version, output_file_full_path):
+        """returns the paths of the hires, web and thumbnail versions of the
+        given output file
+
+        :param version: The stalker version instance
+        :param output_file_full_path: the path of the media file
+        :return: A dictionary with "source_path", "hires_path",
+          "hires_file_name", "webres_path" and "thumbnail_path" keys.
+        """
         hires_extension = '.mov'
         webres_extension = '.webm'
         thumbnail_extension = '.png'
@@ -1706,83 +1794,151 @@ class Playblaster(object):
             thumbnail_output_file_name
         )
 
-        # create folders
-        try:
-            os.makedirs(os.path.dirname(hires_path))
-        except OSError:
-            pass
-
-        try:
-            os.makedirs(os.path.dirname(webres_path))
-        except OSError:
-            pass
+        return {
+            'source_path': output_file_full_path,
+            'hires_path': hires_path,
+            'hires_file_name': hires_output_file_name,
+            'webres_path': webres_path,
+            'thumbnail_path': thumbnail_path
+        }
 
-        try:
-            os.makedirs(os.path.dirname(thumbnail_path))
-        except OSError:
-            pass
+    @classmethod
+    def create_output_folders(cls, output_paths):
+        """creates the folders of the given output paths
 
-        shutil.copy(output_file_full_path, hires_path)
+        :param dict output_paths: The paths returned by
+          :meth:`.get_output_paths`
+        """
+        for key in ['hires_path', 'webres_path', 'thumbnail_path']:
+            try:
+                os.makedirs(os.path.dirname(output_paths[key]))
+            except OSError:
+                pass
 
-        # generate the web version
-        from anima.utils import MediaManager
-        m = MediaManager()
-        temp_web_version_full_path = \
-            m.generate_media_for_web(output_file_full_path)
+    @classmethod
+    def get_output_jobs(cls, media_manager, output_paths):
+        """returns the jobs that copy the given output to the hires path and
+        generate its web version and thumbnail, the jobs do not depend on
+        each other, so they can run in parallel with :meth:`.run_output_job`
+
+        :param media_manager: A :class:`anima.utils.MediaManager` instance
+        :param dict output_paths: The paths returned by
+          :meth:`.get_output_paths`
+        :return: A list of (function, source path, target path) tuples, the
+          function returns the path of the file to be moved to the target, if
+          it is None the source is copied as it is.
+        """
+        source_path = output_paths['source_path']
+        return [
+            (None, source_path, output_paths['hires_path']),
+            (media_manager.generate_media_for_web, source_path,
+             output_paths['webres_path']),
+            (media_manager.generate_thumbnail, source_path,
+             output_paths['thumbnail_path']),
+        ]
 
+    @classmethod
+    def run_output_job(cls, function, source_path, target_path):
+        """runs a job returned by :meth:`.get_output_jobs`, the errors are
+        logged and not raised so the other uploads are not affected
+
+        :param function: The function generating the file or None to copy
+          the source
+        :param source_path: The path of the original output
+        :param target_path: The path to copy the generated file to
+        :return: True if the file is created, False otherwise.
+        """
+        from anima import logger
         try:
-            shutil.copy(temp_web_version_full_path, webres_path)
-        except IOError:
-            pass
+            if function is None:
+                shutil.copy(source_path, target_path)
+            else:
+                shutil.move(function(source_path), target_path)
+        except (IOError, OSError, RuntimeError) as e:
+            logger.error(
+                'can not generate %s from %s: %s' %
+                (target_path, source_path, e)
+            )
+            return False
+        return True
 
-        temp_thumbnail_full_path = \
-            m.generate_thumbnail(output_file_full_path)
-        try:
-            # also upload thumbnail
-            shutil.copy(temp_thumbnail_full_path, thumbnail_path)
-        except IOError:
-            pass
+    @classmethod
+    def create_output_links(cls, version, output_paths, created_paths):
+        """creates the stalker Link instances of the given output, if there
+        is not already an output with the same path
 
-        project = task.project
-        repo = project.repository
+        :param version: The stalker version instance
+        :param dict output_paths: The paths returned by
+          :meth:`.get_output_paths`
+        :param created_paths: The paths of the files created by
+          :meth:`.run_output_job`, no Link is created for the others.
+        :return: A list of the created Link instances, the caller should add
+          them to the session and commit.
+        """
+        if output_paths['hires_path'] not in created_paths:
+            # nothing to link to
+            return []
+
+        repo = version.task.project.repository
 
-        from stalker import db, Link
+        from stalker import Link
 
         # try to find a file with the same name assigned to the version as
         # output
-        found = None
-        hires_os_independent_path = repo.to_os_independent_path(hires_path)
+        hires_os_independent_path = \
+            repo.to_os_independent_path(output_paths['hires_path'])
         for output in version.outputs:
             if output.full_path == hires_os_independent_path:
-                found = True
-                break
+                # if we found a file with the same name as the output, it
+                # is already overwritten
+                return []
 
-        # if we found a file with the same name as the output, just overwrite
-        # it
-        if not found:
-            l_hires = Link(
-                full_path=repo.to_os_independent_path(hires_path),
-                original_filename=hires_output_file_name
-            )
+        hires_output_file_name = output_paths['hires_file_name']
+        l_hires = Link(
+            full_path=hires_os_independent_path,
+            original_filename=hires_output_file_name
+        )
 
+        version.outputs.append(l_hires)
+        links = [l_hires]
+
+        l_for_web = None
+        if output_paths['webres_path'] in created_paths:
             l_for_web = Link(
-                full_path=repo.to_os_independent_path(webres_path),
+                full_path=repo.to_os_independent_path(
+                    output_paths['webres_path']
+                ),
                 original_filename=hires_output_file_name
             )
-
             l_hires.thumbnail = l_for_web
-            version.outputs.append(l_hires)
+            links.append(l_for_web)
 
+        if output_paths['thumbnail_path'] in created_paths:
             l_thumb = Link(
-                full_path=repo.to_os_independent_path(thumbnail_path),
+                full_path=repo.to_os_independent_path(
+                    output_paths['thumbnail_path']
+                ),
                 original_filename=hires_output_file_name
             )
-            l_for_web.thumbnail = l_thumb
+            # the thumbnail is reached through the web version or directly
+            # if there is no web version
+            if l_for_web is not None:
+                l_for_web.thumbnail = l_thumb
+            else:
+                l_hires.thumbnail = l_thumb
+            links.append(l_thumb)
 
-            db.DBSession.add_all([l_hires, l_for_web, l_thumb])
-            db.DBSession.commit()
+        return links
 
-        return hires_path
+    @classmethod
+    def upload_output(cls, version, output_file_full_path):
+        """sets the given file as the output of the given version, also
+        generates a thumbnail and a web version if it is a movie file
+
+        :param version: The stalker version instance
+        :param output_file_full_path: the path of the media file
+        """
+        return cls.upload_outputs(version, [output_file_full_path])[0]
 
 
 def get_cacheable_nodes():
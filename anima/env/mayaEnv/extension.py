@@ -5,6 +5,7 @@
 # License: http://www.opensource.org/licenses/BSD-2-Clause
 
 import os
+import shutil
 import subprocess
 import tempfile
 import platform
@@ -432,19 +433,12 @@ class SequenceManagerExtension(object):
                 (self.__class__.__name__, path.__class__.__name__)
             )
 
-        from xml.etree import ElementTree
-
+        seq = Sequence()
         try:
-            tree = ElementTree.parse(path)
+            seq.from_xml_file(path)
         except IOError:
             raise IOError('Please supply a valid path to an XML file!')
 
-        root = tree.getroot()
-        seq = Sequence()
-        xml_seq = root.getchildren()[0]
-
-        seq.from_xml(xml_seq)
-
         self.from_seq(seq)
 
     @extends(pm.nodetypes.SequenceManager)
@@ -739,35 +733,41 @@ class SequencerExtension(object):
         return seq.to_edl()
 
     @extends(pm.nodetypes.Sequencer)
-    def metafuze(self):
+    def metafuze(self, output_path=None):
         """Calls "Avid Metafuze" with the given xml content to convert media
         files to MXF format.
 
+        :param str output_path: The folder to keep the generated MetaFuze
+          XML files in. If it is None (the default) they are written to a
+          temp folder which is removed after the conversion.
         :return: list of file path
         """
 
         sm = pm.PyNode('sequenceManager1')
         seq = sm.generate_sequence_structure()
-        xmls = seq.to_metafuze_xml()
-
-        # write the given content to tmp
-        for i, xml in enumerate(xmls):
-            temp_file_path = tempfile.mktemp(suffix='.xml')
-            yield i
-            with open(temp_file_path, 'w') as f:
-                f.write(xml)
-
-            subprocess.call(
-                ['metafuze',
-                 '-debug',
-                 temp_file_path],
-                #stderr=subprocess.PIPE,
-                shell=True
-            )
 
-            # remove the temp file
-            #os.remove(temp_file_path)
-            #print 'xml path: %s' % temp_file_path
+        # write one xml per media file
+        remove_output_path = output_path is None
+        if remove_output_path:
+            output_path = tempfile.mkdtemp()
+
+        try:
+            xml_file_paths = seq.to_metafuze_xml_files(output_path)
+
+            for i, xml_file_path in enumerate(xml_file_paths):
+                yield i
+
+                subprocess.call(
+                    ['metafuze',
+                     '-debug',
+                     xml_file_path],
+                    #stderr=subprocess.PIPE,
+                    shell=True
+                )
+        finally:
+            # metafuze is finished with the xml files
+            if remove_output_path:
+                shutil.rmtree(output_path, ignore_errors=True)
 
         #if return_code:
         #    # there is an error
@@ -3,13 +3,342 @@
 #
 # This module is part of anima-tools and is released under the BSD 2
 # License: http://www.opensource.org/licenses/BSD-2-Clause
+"""Profiling tools.
 
+Functions are profiled with the :func:`.profile` decorator and code blocks
+with the :func:`.span` context manager. The timings are aggregated per name in
+the module level :class:`.Registry` (``perf.registry``), which can be dumped
+as JSON or CSV::
+
+  from anima import perf
+
+  @perf.profile('env.get_version_from_full_path')
+  def get_version_from_full_path(full_path):
+      ...
+
+  with perf.span('publish.checks'):
+      ...
+
+  perf.enable()
+  ...
+  perf.registry.dump_json('/tmp/anima_perf.json')
+
+Profiling is disabled by default, then the decorated functions only do an
+extra function call and a global lookup and :func:`.span` returns a shared
+do nothing context manager, so they can be left on hot paths. Set the
+``ANIMA_PERF`` environment variable to 1 or call :func:`.enable` to enable
+it.
+
+The decorated functions can also be run under ``cProfile`` with
+:func:`.capture_cprofile`.
+"""
+
+import os
+import sys
+import csv
+import json
+import math
 import time
+import logging
+import cProfile
+import functools
+import threading
+import contextlib
+import collections
+
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+if hasattr(time, 'perf_counter'):
+    perf_counter = time.perf_counter
+elif sys.platform == 'win32':
+    # time.clock is the high resolution wall clock on windows
+    perf_counter = time.clock
+else:
+    perf_counter = time.time
+
+# profiling is enabled if this is True, use enable() and disable()
+enabled = os.environ.get('ANIMA_PERF', '0') not in ('', '0')
+
+# the maximum number of the latest durations kept per name for percentiles
+sample_size = 1000
+
+# the names of the profiled functions to run under cProfile and the folder
+# to write the cProfile stats to, see capture_cprofile()
+cprofile_captures = {}
+
+
+def enable():
+    """enables profiling
+    """
+    global enabled
+    enabled = True
+
+
+def disable():
+    """disables profiling
+    """
+    global enabled
+    enabled = False
+
+
+class Timing(object):
+    """Aggregates the durations of a named function or span.
+
+    :param str name: The name of the function or span
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.samples = collections.deque(maxlen=sample_size)
+
+    def add(self, duration):
+        """adds the given duration
+
+        :param float duration: The duration in seconds
+        """
+        self.count += 1
+        self.total += duration
+        if self.min is None or duration < self.min:
+            self.min = duration
+        if self.max is None or duration > self.max:
+            self.max = duration
+        self.samples.append(duration)
+
+    @property
+    def mean(self):
+        """returns the mean duration
+        """
+        if not self.count:
+            return 0.0
+        return self.total / self.count
+
+    def percentile(self, percent):
+        """returns the given percentile of the latest durations
+
+        :param float percent: The percentile between 0 and 100
+        """
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        index = int(math.ceil(percent / 100.0 * len(samples))) - 1
+        return samples[max(index, 0)]
+
+    def to_dict(self):
+        """returns the aggregated values as a dictionary
+        """
+        return {
+            'name': self.name,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'p95': self.percentile(95)
+        }
+
+
+class Registry(object):
+    """Stores the :class:`.Timing` of every profiled name
+    """
+
+    csv_columns = ['name', 'count', 'total', 'min', 'max', 'mean', 'p95']
+
+    def __init__(self):
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, duration):
+        """adds the given duration to the timing with the given name
+
+        :param str name: The name of the function or span
+        :param float duration: The duration in seconds
+        """
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = Timing(name)
+                self.timings[name] = timing
+            timing.add(duration)
+
+    def get(self, name):
+        """returns the :class:`.Timing` with the given name or None
+
+        :param str name: The name of the function or span
+        """
+        return self.timings.get(name)
+
+    def clear(self):
+        """removes all the timings
+        """
+        with self._lock:
+            self.timings.clear()
+
+    def to_list(self):
+        """returns the aggregated values of all the timings as a list of
+        dictionaries sorted by the total duration
+        """
+        with self._lock:
+            timings = list(self.timings.values())
+        return sorted(
+            [timing.to_dict() for timing in timings],
+            key=lambda x: x['total'],
+            reverse=True
+        )
+
+    def dump_json(self, path):
+        """writes the timings to the given path as JSON
+
+        :param str path: The path of the JSON file
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_list(), f, indent=2, sort_keys=True)
+
+    def dump_csv(self, path):
+        """writes the timings to the given path as CSV
+
+        :param str path: The path of the CSV file
+        """
+        with open(path, 'wb') as f:
+            writer = csv.DictWriter(f, self.csv_columns)
+            writer.writerow(dict(zip(self.csv_columns, self.csv_columns)))
+            writer.writerows(self.to_list())
+
+
+registry = Registry()
+
+
+class Span(object):
+    """A context manager which adds the duration of the code in it to the
+    registry with the given name.
+
+    :param str name: The name of the span
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        registry.add(self.name, perf_counter() - self.start)
+
+
+class NullSpan(object):
+    """A context manager which does nothing, it is used when profiling is
+    disabled
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+null_span = NullSpan()
+
+
+def span(name):
+    """returns a context manager which measures the duration of the code in
+    it with the given name
+
+    :param str name: The name of the span
+    """
+    if not enabled:
+        return null_span
+    return Span(name)
+
+
+def capture_cprofile(name, output_path=None):
+    """Runs every call of the profiled function with the given name under
+    ``cProfile`` and writes the stats to the given folder as
+    ``<name>_<timestamp>.prof`` files, which can be viewed with ``pstats``.
+    Profiling should also be enabled.
+
+    :param str name: The name given to the :func:`.profile` decorator
+    :param str output_path: The folder to write the stats to, defaults to the
+      temp folder.
+    """
+    if output_path is None:
+        import tempfile
+        output_path = tempfile.gettempdir()
+    cprofile_captures[name] = output_path
+
+
+def stop_cprofile_capture(name):
+    """stops running the profiled function with the given name under
+    ``cProfile``
+
+    :param str name: The name given to the :func:`.profile` decorator
+    """
+    cprofile_captures.pop(name, None)
+
+
+def _run_with_cprofile(name, output_path, f, args, kwargs):
+    """runs the given function under cProfile and writes the stats to the
+    given folder
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(f, *args, **kwargs)
+    finally:
+        stats_path = os.path.join(
+            output_path,
+            '%s_%s.prof' % (name, int(time.time() * 1000))
+        )
+        profiler.dump_stats(stats_path)
+
+
+def profile(name=None):
+    """A decorator which adds the duration of every call of the decorated
+    function to the registry.
+
+    :param str name: The name of the timing, defaults to the module and name
+      of the function.
+    """
+
+    def wrapper(f):
+        timing_name = name
+        if timing_name is None:
+            timing_name = '%s.%s' % (f.__module__, f.__name__)
+
+        @functools.wraps(f)
+        def wrapped_f(*args, **kwargs):
+            if not enabled:
+                return f(*args, **kwargs)
+
+            start = perf_counter()
+            try:
+                output_path = cprofile_captures.get(timing_name)
+                if output_path is not None:
+                    return _run_with_cprofile(
+                        timing_name, output_path, f, args, kwargs
+                    )
+                return f(*args, **kwargs)
+            finally:
+                registry.add(timing_name, perf_counter() - start)
+
+        return wrapped_f
+    return wrapper
 
 
 def measure_time(f_name):
     """This is a decorator that measures performance of the decorated function
 
+    The duration is also added to the registry if profiling is enabled.
+
     :param function_name: The name of the decorated function
     """
 
@@ -19,11 +348,178 @@ def measure_time(f_name):
             f_inner_name = f.__name__
 
         def wrapped_f(*args, **kwargs):
-            start = time.time()
+            start = perf_counter()
             return_data = f(*args, **kwargs)
-            end = time.time()
+            end = perf_counter()
             print('%11s: %0.3f sec' % (f_inner_name, (end - start)))
+            if enabled:
+                registry.add(f_inner_name, end - start)
             return return_data
 
         return wrapped_f
     return wrapper
+
+
+def get_cpu_time():
+    """Returns the user + system CPU time of the current process in seconds
+    """
+    times = os.times()
+    return times[0] + times[1]
+
+
+def get_peak_rss():
+    """Returns the peak resident set size of the current process in bytes or
+    None if it is not available on the current platform
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        # linux reports kilobytes
+        peak_rss *= 1024
+    return peak_rss
+
+
+class Stage(object):
+    """Holds the stats of a named stage.
+
+    :param str name: The name of the stage
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_rss_delta = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.children = []
+
+    def to_dict(self):
+        """returns the stats of this stage and its children as a dictionary
+        """
+        return {
+            'name': self.name,
+            'wall_time': self.wall_time,
+            'cpu_time': self.cpu_time,
+            'peak_rss_delta': self.peak_rss_delta,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'children': [child.to_dict() for child in self.children]
+        }
+
+
+class StageRecorder(object):
+    """Records the wall time, CPU time, peak RSS delta and bytes in/out of
+    nested named stages.
+
+    Usage::
+
+      recorder = StageRecorder('export', byte_counter=lambda: f.tell())
+      with recorder.stage('Encoding Point Position') as stage:
+          data = geo.pointFloatAttribValuesAsString('P')
+          stage.bytes_in += len(data)
+          ...
+      recorder.log(logger)
+      json_data = recorder.to_json()
+
+    A disabled recorder does not measure anything, so the stages can be left
+    in the code.
+
+    :param str name: The name of the root stage
+    :param byte_counter: A callable returning the number of bytes written so
+      far, it is used to calculate the bytes_out of each stage.
+    :param bool enabled: If False nothing is recorded.
+    """
+
+    def __init__(self, name, byte_counter=None, enabled=True):
+        self.root = Stage(name)
+        self.byte_counter = byte_counter
+        self.enabled = enabled
+        self._stack = [self.root]
+        self._start = self._measure()
+
+    def _measure(self):
+        """returns the current wall time, cpu time, peak rss and written bytes
+        """
+        bytes_out = 0
+        if self.byte_counter is not None:
+            bytes_out = self.byte_counter()
+        return perf_counter(), get_cpu_time(), get_peak_rss(), bytes_out
+
+    def _update(self, stage_, start):
+        """updates the stats of the given stage from the given start
+        measurements
+        """
+        end = self._measure()
+        stage_.wall_time += end[0] - start[0]
+        stage_.cpu_time += end[1] - start[1]
+        if start[2] is not None:
+            stage_.peak_rss_delta = \
+                (stage_.peak_rss_delta or 0) + end[2] - start[2]
+        stage_.bytes_out += end[3] - start[3]
+
+    @contextlib.contextmanager
+    def stage(self, name, bytes_in=0):
+        """A context manager which records the stats of the code in it as a
+        child of the current stage.
+
+        :param str name: The name of the stage
+        :param int bytes_in: The number of bytes read by this stage, it can
+          also be increased through the yielded :class:`.Stage` instance.
+        """
+        stage_ = Stage(name)
+        stage_.bytes_in = bytes_in
+        if not self.enabled:
+            yield stage_
+            return
+
+        self._stack[-1].children.append(stage_)
+        self._stack.append(stage_)
+        start = self._measure()
+        try:
+            yield stage_
+        finally:
+            self._update(stage_, start)
+            self._stack.pop()
+
+    def finish(self):
+        """updates the stats of the root stage
+        """
+        if self.enabled:
+            self.root.bytes_in = \
+                sum(child.bytes_in for child in self.root.children)
+            self._update(self.root, self._start)
+            self._start = self._measure()
+
+    def to_dict(self):
+        """returns the recorded stats as a dictionary
+        """
+        return self.root.to_dict()
+
+    def to_json(self, indent=2):
+        """returns the recorded stats as a JSON string
+        """
+        return json.dumps(self.to_dict(), indent=indent, sort_keys=True)
+
+    def log(self, logger, level=logging.DEBUG):
+        """logs the recorded stats as an indented tree
+
+        :param logger: A ``logging.Logger`` instance
+        :param int level: The logging level
+        """
+        def log_stage(stage_, depth):
+            rss = '-'
+            if stage_.peak_rss_delta is not None:
+                rss = '%0.1f MB' % (stage_.peak_rss_delta / 1048576.0)
+            logger.log(
+                level,
+                '%-32s: %3.3f sec (cpu %3.3f sec) rss +%s in %s out %s' % (
+                    '  ' * depth + stage_.name, stage_.wall_time,
+                    stage_.cpu_time, rss, stage_.bytes_in, stage_.bytes_out
+                )
+            )
+            for child in stage_.children:
+                log_stage(child, depth + 1)
+
+        log_stage(self.root, 0)
@@ -5,6 +5,15 @@
 # License: http://www.opensource.org/licenses/BSD-2-Clause
 
 import struct
+import multiprocessing
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# the executors are shared with the other modules of anima
+from anima.utils.executors import get_executor, is_pool_worker
 
 
 LUTS = {
@@ -94,19 +103,50 @@ LUTS = {
 }
 
 
-def __b85_encode(data, lut, byte_order, special_values=None):
-    """Encodes the given string data in to Base85 using the given LUT
+def __numpy_byte_order(byte_order):
+    """Converts the given struct byte order character to its NumPy
+    correspondence.
 
-    :param str data: A string which contains a string to be encoded in Base85
-    :param dict lut: The lut to be used in encoding
     :param str byte_order: The byte order character for struct.unpack
-    :param dict special_values: If given, pre defined special values are going
-      to be replaced with corresponding special characters
     :returns: str
     """
-    # pad data
-    padding = (4 - len(data) % 4) % 4
-    data = ''.join([data, '\0' * padding])
+    return {'!': '>', '@': '='}.get(byte_order, byte_order)
+
+
+def __special_words(special_values, char_to_int):
+    """Converts the given special values to a dictionary where the keys are
+    the 32-bit integers that the 5 character groups are representing and the
+    values are the special characters.
+
+    :param dict special_values: A dict where the keys are the 5 character
+      groups and the values are the special characters to be used instead.
+    :param dict char_to_int: The char to int lut of the encoding
+    :returns: dict
+    """
+    special_words = {}
+    for key, special_char in special_values.items():
+        word = 0
+        for char in key:
+            word = word * 85 + char_to_int[char]
+        special_words[word] = special_char
+    return special_words
+
+
+def __b85_encode_python(data, lut, byte_order, special_words=None):
+    """Encodes the given string data in to Base85 by iterating over every
+    32-bit word in pure Python.
+
+    :param str data: A string which contains a string to be encoded in Base85,
+      the length of the data should be a multiple of 4
+    :param list lut: The lut to be used in encoding
+    :param str byte_order: The byte order character for struct.unpack
+    :param dict special_words: If given, the words in this dictionary are
+      encoded as the single special character they map to instead of a 5
+      character group.
+    :returns: str
+    """
+    if special_words is None:
+        special_words = {}
     parts = []
     parts_append = parts.append
     number_of_chunks = len(data) // 4
@@ -115,49 +155,191 @@ def __b85_encode(data, lut, byte_order, special_values=None):
     for x in unpack(byte_format, data):
         # network order (big endian), 32-bit unsigned integer
         # note: x86 is little endian
+        if x in special_words:
+            parts_append(special_words[x])
+            continue
         parts_append(lut[(x // 52200625)])
         parts_append(lut[(x // 614125) % 85])
         parts_append(lut[(x // 7225) % 85])
         parts_append(lut[(x // 85) % 85])
         parts_append(lut[x % 85])
-    return_val = ''.join(parts)
-    if special_values:
-        for key in special_values.keys():
-            return_val = return_val.replace(key, special_values[key])
-            #return_val = special_values[key].join(return_val.split(key))
-    return return_val
+    return ''.join(parts)
+
+
+def __b85_encode_numpy(data, lut, byte_order, special_words=None):
+    """Encodes the given string data in to Base85 by using NumPy arrays.
+
+    The whole buffer is reinterpreted as an array of 32-bit unsigned integers,
+    all the five digit planes are calculated at once and then they are mapped
+    to characters with a single look up in to the given lut.
+
+    :param str data: A string which contains a string to be encoded in Base85,
+      the length of the data should be a multiple of 4
+    :param list lut: The lut to be used in encoding
+    :param str byte_order: The byte order character for struct.unpack
+    :param dict special_words: If given, the words in this dictionary are
+      encoded as the single special character they map to instead of a 5
+      character group.
+    :returns: str
+    """
+    words = numpy.frombuffer(
+        data,
+        dtype=numpy.dtype('%su4' % __numpy_byte_order(byte_order))
+    )
+    digits = numpy.empty((len(words), 5), dtype=numpy.uint8)
+    digits[:, 0] = words // 52200625
+    digits[:, 1] = (words // 614125) % 85
+    digits[:, 2] = (words // 7225) % 85
+    digits[:, 3] = (words // 85) % 85
+    digits[:, 4] = words % 85
+    char_table = numpy.frombuffer(''.join(lut), dtype=numpy.uint8)
+    chars = char_table[digits]
+
+    if special_words:
+        keep = None
+        for word, special_char in special_words.items():
+            is_special = words == word
+            if not is_special.any():
+                continue
+            if keep is None:
+                keep = numpy.ones(chars.shape, dtype=numpy.bool_)
+            # store the special char in the first column and drop the rest
+            chars[is_special, 0] = ord(special_char)
+            keep[is_special, 1:] = False
+        if keep is not None:
+            return chars[keep].tobytes()
+
+    return chars.tobytes()
 
 
-def __encode_multithreaded(f, data):
-    """The base function that runs the given function f in multithreaded
-    fashion.
+def __b85_encode(data, lut, byte_order, special_values=None):
+    """Encodes the given string data in to Base85 using the given LUT
+
+    Uses NumPy when it is available and falls back to pure Python otherwise.
 
-    :param f: The function
-    :param data: The data
-    :return:
+    :param str data: A string which contains a string to be encoded in Base85
+    :param dict lut: The lut to be used in encoding
+    :param str byte_order: The byte order character for struct.unpack
+    :param dict special_values: If given, the 5 character groups that are
+      equal to the keys of this dict are encoded as the corresponding special
+      characters.
+    :returns: str
     """
-    import multiprocessing
-    import platform
-    number_of_threads = multiprocessing.cpu_count() / 2
+    # pad data
+    padding = (4 - len(data) % 4) % 4
+    data = ''.join([data, '\0' * padding])
 
-    if platform.system() == 'Windows':
-        multiprocessing.set_executable('C:/Python27/pythonw.exe')
-    elif platform.system() == 'Linux':
-        multiprocessing.set_executable('/usr/bin/python')
+    special_words = None
+    if special_values:
+        special_words = __special_words(
+            special_values, dict(zip(lut, range(len(lut))))
+        )
+
+    if numpy is not None:
+        return __b85_encode_numpy(data, lut, byte_order, special_words)
+    return __b85_encode_python(data, lut, byte_order, special_words)
+
+
+def __b85_encode_to(stream, data, lut, byte_order, special_values=None,
+                    line_width=500, block_size=1048576):
+    """Encodes the given string data in to Base85 block by block and writes
+    the line wrapped result directly to the given stream.
+
+    Only one block of raw data and its encoded correspondence is kept in
+    memory at a time, so the peak memory usage does not depend on the size of
+    the data.
+
+    :param stream: A file like object with a ``write()`` method, it can be a
+      regular file, a ``gzip.open`` handle or a StringIO instance.
+    :param data: A string which contains a string to be encoded in Base85, or
+      a list of strings which are going to be encoded as if they were joined
+      together (ex: ``[P, pprime]``). The length of every part except the last
+      one should be a multiple of 4.
+    :param list lut: The lut to be used in encoding
+    :param str byte_order: The byte order character for struct.unpack
+    :param dict special_values: If given, the 5 character groups that are
+      equal to the keys of this dict are encoded as the corresponding special
+      characters.
+    :param int line_width: The number of characters in each line. Lines are
+      separated with a new line character and there is no trailing new line,
+      so the output is identical to ``h2a.split_data(encoded, line_width)``.
+    :param int block_size: The number of bytes to be encoded at once. It is
+      aligned down to a multiple of 4 bytes.
+    """
+    if not isinstance(data, (list, tuple)):
+        data = [data]
+
+    block_size = max(block_size - block_size % 4, 4)
+    write = stream.write
+    separator = ''
+    remainder = ''
+    for part in data:
+        for i in xrange(0, len(part), block_size):
+            encoded_data = __b85_encode(
+                part[i:i + block_size], lut, byte_order, special_values
+            )
+            if remainder:
+                encoded_data = ''.join([remainder, encoded_data])
+
+            full_lines_length = \
+                len(encoded_data) - len(encoded_data) % line_width
+            if full_lines_length:
+                write(separator)
+                write(
+                    '\n'.join([
+                        encoded_data[j:j + line_width]
+                        for j in xrange(0, full_lines_length, line_width)
+                    ])
+                )
+                separator = '\n'
+            remainder = encoded_data[full_lines_length:]
+
+    if remainder:
+        write(separator)
+        write(remainder)
+
+
+# the minimum number of bytes that each worker is going to encode, smaller
+# data is not worth the overhead of distributing it to the workers
+parallel_min_chunk_size = 262144
+
+
+def __encode_parallel(f, data, use_processes=False, max_workers=None):
+    """The base function that runs the given encode function f in parallel.
+
+    The data is split in to one chunk per worker, where every chunk except the
+    last one is aligned to 4 bytes, so the concatenated result is identical
+    to the serial encoding of the data.
+
+    :param f: The encode function, it should be a module level function to
+      be picklable for process pools.
+    :param str data: The data
+    :param bool use_processes: Use a process pool instead of a thread pool.
+    :param int max_workers: The number of workers, defaults to the number of
+      cores.
+    :returns: str
+    """
+    if max_workers is None:
+        max_workers = multiprocessing.cpu_count()
 
-    p = multiprocessing.Pool(number_of_threads)
+    # waiting for the shared pool from one of its own workers may deadlock
+    if is_pool_worker():
+        return f(data)
 
-    number_of_chunks = len(data) // 4
-    chunk_per_thread = number_of_chunks / number_of_threads
-    split_per_char = chunk_per_thread * 4
+    executor = get_executor(max_workers, use_processes=use_processes)
+    if executor is None:
+        return f(data)
 
-    thread_data = []
-    for i in range(0, len(data), split_per_char):
-        thread_data.append(data[i:i + split_per_char])
+    number_of_words = (len(data) + 3) // 4
+    words_per_worker = (number_of_words + max_workers - 1) // max_workers
+    chunk_size = max(words_per_worker * 4, parallel_min_chunk_size)
+    if chunk_size >= len(data):
+        return f(data)
 
-    data = ''.join(p.map(f, thread_data))
-    p.close()
-    return data
+    chunks = [
+        data[i:i + chunk_size] for i in xrange(0, len(data), chunk_size)
+    ]
+    return ''.join(executor.map(f, chunks))
 
 
 def rfc1924_b85_encode(data):
@@ -171,13 +353,20 @@ def rfc1924_b85_encode(data):
     return __b85_encode(data, lut, byte_order)
 
 
-def rfc1924_b85_encode_multithreaded(data):
-    """Encodes the given string data in to Base85 using the RFC1924 LUT
+def rfc1924_b85_encode_multithreaded(data, use_processes=False,
+                                     max_workers=None):
+    """Encodes the given string data in to Base85 using the RFC1924 LUT in
+    parallel.
 
     :param str data: A string which contains a string to be encoded in Base85
+    :param bool use_processes: Use a process pool instead of a thread pool.
+    :param int max_workers: The number of workers, defaults to the number of
+      cores.
     :returns: str
     """
-    return __encode_multithreaded(rfc1924_b85_encode, data)
+    return __encode_parallel(
+        rfc1924_b85_encode, data, use_processes, max_workers
+    )
 
 
 def arnold_b85_encode(data):
@@ -189,51 +378,184 @@ def arnold_b85_encode(data):
     lut = LUTS['arnold']['int_to_char']
     byte_order = LUTS['arnold']['byte_order']
     special_values = LUTS['arnold']['special_values']
-    #return __b85_encode(data, lut, byte_order, special_values)
-    return __b85_encode(data, lut, byte_order)
+    return __b85_encode(data, lut, byte_order, special_values)
 
 
-def arnold_b85_encode_multithreaded(data):
-    """Encodes the given string data in to Base85 using arnold LUT.
+def rfc1924_b85_encode_to(stream, data, line_width=500):
+    """Encodes the given string data in to Base85 using the RFC1924 LUT and
+    writes the line wrapped result to the given stream.
+
+    :param stream: A file like object to write the encoded data to
+    :param data: A string which contains a string to be encoded in Base85 or a
+      list of strings to be encoded as if they were joined together
+    :param int line_width: The number of characters in each line
+    """
+    lut = LUTS['rfc1924']['int_to_char']
+    byte_order = LUTS['rfc1924']['byte_order']
+    __b85_encode_to(stream, data, lut, byte_order, line_width=line_width)
+
+
+def arnold_b85_encode_to(stream, data, line_width=500):
+    """Encodes the given string data in to Base85 using the arnold LUT and
+    writes the line wrapped result to the given stream.
+
+    :param stream: A file like object to write the encoded data to
+    :param data: String to be encoded in Base85 or a list of strings to be
+      encoded as if they were joined together
+    :param int line_width: The number of characters in each line
+    """
+    lut = LUTS['arnold']['int_to_char']
+    byte_order = LUTS['arnold']['byte_order']
+    special_values = LUTS['arnold']['special_values']
+    __b85_encode_to(
+        stream, data, lut, byte_order, special_values, line_width=line_width
+    )
+
+
+def arnold_b85_encode_multithreaded(data, use_processes=False,
+                                    max_workers=None):
+    """Encodes the given string data in to Base85 using arnold LUT in
+    parallel.
 
     :param str data: String to be encoded in Base85
+    :param bool use_processes: Use a process pool instead of a thread pool.
+    :param int max_workers: The number of workers, defaults to the number of
+      cores.
     :return: str
     """
-    return __encode_multithreaded(arnold_b85_encode, data)
+    return __encode_parallel(
+        arnold_b85_encode, data, use_processes, max_workers
+    )
 
 
-def __b85_decode(data, lut, byte_order, special_values=None):
-    """Decodes the given string data by using the given LUT and byte order
+def __b85_decode_python(data, lut, byte_order, special_chars=None):
+    """Decodes the given string data by iterating over every 5 character group
+    in pure Python.
 
     :param str data: A string which contains the encoded data
     :param dict lut: A dict where the keys are encoded characters and the
-      values are the integer correspondence of those characters and will be
-      used to generate an integer number.
+      values are the integer correspondence of those characters
     :param str byte_order: The byte order character for struct.pack
-    :param bool unpack_z: replaces character "z" with appropriate characters
-      for the "0 special case" (where it is not converted to a 5 character
-      string but "z")
+    :param dict special_chars: If given, the characters in this dictionary are
+      decoded as the 32-bit integers they map to.
+    :returns: str
     """
-    if special_values:
-        for key in special_values.keys():
-            # if the data is massive, then we are using twice the memory
-            # use key.join(data.split(special_values[key]))
-            data = data.replace(special_values[key], key)
-            #data = key.join(data.split(special_values[key]))
-
     parts = []
     parts_append = parts.append
     pack = struct.pack
     byte_format = '%sI' % byte_order
-    for i in xrange(0, len(data), 5):
-        int_sum = 52200625 * lut[data[i]] + \
+
+    if not special_chars:
+        for i in xrange(0, len(data), 5):
+            int_sum = 52200625 * lut[data[i]] + \
+                614125 * lut[data[i + 1]] + \
+                7225 * lut[data[i + 2]] + \
+                85 * lut[data[i + 3]] + \
+                lut[data[i + 4]]
+            parts_append(pack(byte_format, int_sum))
+        return ''.join(parts)
+
+    i = 0
+    data_length = len(data)
+    while i < data_length:
+        char = data[i]
+        if char in special_chars:
+            parts_append(pack(byte_format, special_chars[char]))
+            i += 1
+            continue
+        int_sum = 52200625 * lut[char] + \
             614125 * lut[data[i + 1]] + \
             7225 * lut[data[i + 2]] + \
             85 * lut[data[i + 3]] + \
             lut[data[i + 4]]
         parts_append(pack(byte_format, int_sum))
+        i += 5
     return ''.join(parts)
 
+
+def __b85_decode_numpy(data, lut, byte_order, special_chars=None):
+    """Decodes the given string data by using NumPy arrays.
+
+    :param str data: A string which contains the encoded data
+    :param dict lut: A dict where the keys are encoded characters and the
+      values are the integer correspondence of those characters
+    :param str byte_order: The byte order character for struct.pack
+    :param dict special_chars: If given, the characters in this dictionary are
+      decoded as the 32-bit integers they map to.
+    :returns: str
+    """
+    int_table = numpy.zeros(256, dtype=numpy.uint32)
+    for char, value in lut.items():
+        int_table[ord(char)] = value
+    codes = numpy.frombuffer(data, dtype=numpy.uint8)
+
+    is_special = None
+    if special_chars:
+        is_special = numpy.zeros(len(codes), dtype=numpy.bool_)
+        for char in special_chars:
+            is_special |= codes == ord(char)
+        if not is_special.any():
+            is_special = None
+
+    if is_special is not None:
+        # every special char is a whole word where the other chars are the
+        # fifth of a word, so the index of the word each char belongs to is
+        # the number of fifths before it divided by five
+        fifths = numpy.where(is_special, 5, 1)
+        word_indices = (numpy.cumsum(fifths) - fifths) // 5
+        words = numpy.zeros(word_indices[-1] + 1, dtype=numpy.uint32)
+        for char, word in special_chars.items():
+            words[word_indices[codes == ord(char)]] = word
+        is_normal = ~is_special
+        normal_word_indices = word_indices[is_normal][::5]
+        codes = codes[is_normal]
+
+    digits = int_table[codes]
+    digits = digits.reshape(-1, 5)
+    normal_words = digits[:, 0] * 52200625
+    normal_words += digits[:, 1] * 614125
+    normal_words += digits[:, 2] * 7225
+    normal_words += digits[:, 3] * 85
+    normal_words += digits[:, 4]
+
+    if is_special is not None:
+        words[normal_word_indices] = normal_words
+    else:
+        words = normal_words
+
+    return words.astype(
+        numpy.dtype('%su4' % __numpy_byte_order(byte_order))
+    ).tobytes()
+
+
+def __b85_decode(data, lut, byte_order, special_values=None):
+    """Decodes the given string data by using the given LUT and byte order
+
+    Uses NumPy when it is available and falls back to pure Python otherwise.
+
+    :param str data: A string which contains the encoded data
+    :param dict lut: A dict where the keys are encoded characters and the
+      values are the integer correspondence of those characters and will be
+      used to generate an integer number.
+    :param str byte_order: The byte order character for struct.pack
+    :param dict special_values: If given, the special characters which are
+      the values of this dict are expanded to the 5 character groups which are
+      the keys of it (ex: "z" is the "0 special case" where it is not
+      converted to a 5 character string but "z").
+    """
+    special_chars = None
+    if special_values:
+        special_chars = dict(
+            (special_char, word)
+            for word, special_char in
+            __special_words(special_values, lut).items()
+        )
+
+    if numpy is not None:
+        return __b85_decode_numpy(data, lut, byte_order, special_chars)
+    return __b85_decode_python(data, lut, byte_order, special_chars)
+
+
 def b85_decode(data):
     """Decodes the given string data by using the standard LUT and network (=
     big endian) byte order.
@@ -263,8 +585,7 @@ def arnold_b85_decode(data):
     lut = LUTS['arnold']['char_to_int']
     byte_order = LUTS['arnold']['byte_order']
     special_values = LUTS['arnold']['special_values']
-    #return __b85_decode(data, lut, byte_order, special_values)
-    return __b85_decode(data, lut, byte_order)
+    return __b85_decode(data, lut, byte_order, special_values)
 
 def mapper(encoded_data, raw_data, special_values=None):
     """A simple utility to create a lut for known Base85 encoding
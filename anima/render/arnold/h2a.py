@@ -5,12 +5,13 @@
 # License: http://www.opensource.org/licenses/BSD-2-Clause
 
 import os
-import gzip
-import struct
-import time
+import sys
+import array
 
 
+from anima import logger, perf
 from anima.render.arnold import base85
+from anima.utils import parallel_gzip
 reload(base85)
 
 try:
@@ -18,9 +19,32 @@ try:
 except ImportError:
     hou = None
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from cStringIO import StringIO
 
 
+# the names of the attributes that polygon2ass reads the polygon indices from
+# in bulk. If they do not exist they are created on a copy of the geometry
+# with the Attribute Wrangle SOP verb running the snippets below, and if SOP
+# verbs are not available the indices are collected by iterating over the
+# primitives.
+nsides_attribute_name = 'nsides'
+vidxs_attribute_name = 'vidxs'
+
+# the "Run Over" values of the Attribute Wrangle SOP and the snippets that
+# create the index attributes
+polygon_index_snippets = [
+    (1, 'i@%s = primvertexcount(0, @primnum);' % nsides_attribute_name),
+    (3, 'i@%s = vertexpoint(0, @vtxnum);' % vidxs_attribute_name),
+]
+
+# stores topology dependent data per geometry, see get_topology_cache()
+topology_cache = {}
+
 class Buffer(object):
     """Buffer class for efficient string concatenation.
 
@@ -62,14 +86,516 @@ class Buffer(object):
         return self.file_str.getvalue()
 
 
+class ByteCountingFile(object):
+    """Wraps a file like object and counts the bytes written to it.
+
+    :param file_: A file like object
+    """
+
+    def __init__(self, file_):
+        self.file = file_
+        self.bytes_written = 0
+
+    def write(self, data):
+        """writes the given data to the wrapped file
+
+        :param str data: The data to write
+        """
+        self.bytes_written += len(data)
+        self.file.write(data)
+
+    def close(self):
+        """closes the wrapped file
+        """
+        self.file.close()
+
+
+class ASSWriter(object):
+    """Writes ASS nodes incrementally to the given file handler.
+
+    Every node parameter is written to the file handler as soon as it is
+    produced, so there is no need to render the whole node in to a string
+    before writing it to the disk. Base85 arrays are encoded and line wrapped
+    block by block while they are written.
+
+    If a cache dictionary is given (see :func:`get_topology_cache`), the
+    output of :meth:`.write_cached` calls is stored in it and reused on the
+    following frames with the same topology.
+
+    The export stages are recorded with the given
+    :class:`anima.perf.StageRecorder`, if it is None nothing is recorded.
+    """
+
+    def __init__(self, ass_file, line_width=500, cache=None, stats=None):
+        self.ass_file = ass_file
+        self.write = ass_file.write
+        self.line_width = line_width
+        self.cache = cache
+        if stats is None:
+            stats = perf.StageRecorder('h2a', enabled=False)
+        self.stats = stats
+
+    def write_cached(self, key, write_function, *args):
+        """Calls ``write_function(*args)`` which should write to this writer.
+        If there is a cache, the written text is stored with the given key and
+        the function is not called again as long as the key is in the cache.
+
+        :param str key: The key to store the written text with
+        :param write_function: A callable writing to this writer
+        :param args: The arguments of the write_function
+        """
+        if self.cache is None:
+            write_function(*args)
+            return
+
+        cache_key = ('ass', key)
+        if cache_key not in self.cache:
+            ass_file = self.ass_file
+            self.ass_file = StringIO()
+            self.write = self.ass_file.write
+            try:
+                write_function(*args)
+                self.cache[cache_key] = self.ass_file.getvalue()
+            finally:
+                self.ass_file = ass_file
+                self.write = ass_file.write
+        self.write(self.cache[cache_key])
+
+    def begin_node(self, node_type):
+        """starts a new node with the given type
+
+        :param str node_type: The node type (ex: polymesh, curves, points)
+        """
+        self.write('\n%s\n{\n' % node_type)
+
+    def end_node(self):
+        """closes the current node
+        """
+        self.write('}\n')
+
+    def write_parameter(self, name, value):
+        """writes a single valued parameter
+
+        :param str name: The parameter name
+        :param value: The parameter value
+        """
+        self.write(' %s %s\n' % (name, value))
+
+    def write_declare(self, name, scope, data_type):
+        """declares a user data
+
+        :param str name: The user data name
+        :param str scope: The scope of the data (constant, uniform, varying)
+        :param str data_type: The data type (FLOAT, RGBA etc.)
+        """
+        self.write(' declare %s %s %s\n' % (name, scope, data_type))
+
+    def write_array(self, name, count, sample_count, data_type, data):
+        """writes an array parameter with the data given as text
+
+        :param str name: The parameter name
+        :param int count: The number of elements per motion key
+        :param int sample_count: The number of motion keys
+        :param str data_type: The data type (ex: UINT)
+        :param data: The text of the data or a list of texts which are going
+          to be written one after another
+        """
+        self.write(
+            ' %s %s %s %s\n' % (name, count, sample_count, data_type)
+        )
+        if not isinstance(data, (list, tuple)):
+            data = [data]
+        for part in data:
+            self.write(part)
+        self.write('\n')
+
+    def write_b85_array(self, name, count, sample_count, data_type, data,
+                        line_width=None):
+        """writes a Base85 encoded array parameter with the given raw data
+
+        :param str name: The parameter name
+        :param int count: The number of elements per motion key
+        :param int sample_count: The number of motion keys
+        :param str data_type: The data type without the b85 prefix
+          (ex: POINT, FLOAT)
+        :param data: The raw data as a string or a list of strings which
+          are going to be encoded as if they were joined together (ex:
+          ``[P, pprime]``)
+        :param int line_width: The number of characters in each line,
+          defaults to the line_width of the writer
+        """
+        if line_width is None:
+            line_width = self.line_width
+        self.write(
+            ' %s %s %s b85%s\n' % (name, count, sample_count, data_type)
+        )
+        base85.arnold_b85_encode_to(self.ass_file, data, line_width)
+        self.write('\n')
+
+
+def create_polygon_index_attributes(geo):
+    """Returns a copy of the given geometry with the ``nsides_attribute_name``
+    primitive attribute and the ``vidxs_attribute_name`` vertex attribute.
+
+    The attributes are created by the Attribute Wrangle SOP verb, so the
+    vertex and primitive data Houdini provides is read in compiled and
+    multithreaded VEX instead of iterating over the primitives in Python.
+
+    :param geo: A ``hou.Geometry`` instance
+    :returns: A ``hou.Geometry`` instance or None if the SOP verbs are not
+      available (Houdini versions older than 16) or can not be run.
+    """
+    try:
+        verb = hou.sopNodeTypeCategory().nodeVerb('attribwrangle')
+    except AttributeError:
+        return None
+
+    if verb is None:
+        return None
+
+    indexed_geo = geo
+    try:
+        for run_over, snippet in polygon_index_snippets:
+            verb.setParms({'class': run_over, 'snippet': snippet})
+            output_geo = hou.Geometry()
+            verb.execute(output_geo, [indexed_geo])
+            indexed_geo = output_geo
+    except hou.OperationFailed as e:
+        logger.debug('can not create the polygon index attributes: %s' % e)
+        return None
+
+    return indexed_geo
+
+
+def get_polygon_indices(geo):
+    """Returns the number of vertices of each primitive and the point index of
+    each vertex of the given geometry as two ``array.array('i')`` instances.
+
+    The values are read in bulk from the ``nsides_attribute_name`` primitive
+    attribute and the ``vidxs_attribute_name`` vertex attribute. If they do
+    not exist they are created with :func:`create_polygon_index_attributes`,
+    and as the last resort they are collected by iterating over the
+    primitives.
+
+    :param geo: A ``hou.Geometry`` instance
+    :returns: (array.array, array.array)
+    """
+    nsides = array.array('i')
+    vidxs = array.array('i')
+
+    indexed_geo = geo
+    if not geo.findPrimAttrib(nsides_attribute_name) \
+       or not geo.findVertexAttrib(vidxs_attribute_name):
+        indexed_geo = create_polygon_index_attributes(geo)
+
+    if indexed_geo is not None:
+        nsides.fromstring(
+            indexed_geo.primIntAttribValuesAsString(nsides_attribute_name)
+        )
+        vidxs.fromstring(
+            indexed_geo.vertexIntAttribValuesAsString(vidxs_attribute_name)
+        )
+    else:
+        nsides_append = nsides.append
+        vidxs_extend = vidxs.extend
+        for prim in geo.iterPrims():
+            vertices = prim.vertices()
+            nsides_append(len(vertices))
+            vidxs_extend([vertex.point().number() for vertex in vertices])
+    return nsides, vidxs
+
+
+def pack_indices(indices):
+    """Packs the given integers in to the smallest Arnold array type that can
+    hold them.
+
+    :param indices: An ``array.array`` or a list of non negative integers
+    :returns: A tuple of the Arnold data type ("BYTE" or "UINT") and the
+      little endian packed data as a string
+    """
+    if len(indices) and max(indices) > 255:
+        data_type = 'UINT'
+        packed_indices = array.array('I', indices)
+        if sys.byteorder == 'big':
+            packed_indices.byteswap()
+    else:
+        data_type = 'BYTE'
+        packed_indices = array.array('B', indices)
+    return data_type, packed_indices.tostring()
+
+
+def get_curve_point_counts(geo):
+    """Returns the number of points of each curve in the given geometry as an
+    ``array.array('i')``.
+
+    The values are read in bulk from the ``nsides_attribute_name`` primitive
+    attribute if it exists, otherwise the primitives are iterated.
+
+    :param geo: A ``hou.Geometry`` instance
+    :returns: array.array
+    """
+    point_counts = array.array('i')
+    if geo.findPrimAttrib(nsides_attribute_name):
+        point_counts.fromstring(
+            geo.primIntAttribValuesAsString(nsides_attribute_name)
+        )
+    else:
+        point_counts.extend(
+            [prim.numVertices() for prim in geo.iterPrims()]
+        )
+    return point_counts
+
+
+def duplicate_curve_end_points(point_positions, point_counts):
+    """Repeats the first and the last point of every curve in the given point
+    positions, which is needed for the start and end tangents of catmull-rom
+    curves.
+
+    The points of every curve should be stored one after another in the point
+    positions. The curves may have different number of points.
+
+    :param str point_positions: The float32 xyz values of all the points as a
+      string
+    :param point_counts: An ``array.array`` or a list of integers showing the
+      number of points of each curve
+    :returns: str
+    """
+    if not point_counts:
+        return ''
+
+    if numpy is not None:
+        positions = numpy.frombuffer(point_positions, dtype=numpy.float32)\
+            .reshape(-1, 3)
+        counts = numpy.array(point_counts, dtype=numpy.int32)
+        number_of_curves = len(counts)
+
+        first_count = counts[0]
+        if (counts == first_count).all():
+            # all curves have the same number of points
+            positions = positions.reshape(number_of_curves, first_count, 3)
+            return numpy.concatenate(
+                [positions[:, :1], positions, positions[:, -1:]], axis=1
+            ).tobytes()
+
+        ends = numpy.cumsum(counts)
+        starts = ends - counts
+        new_counts = counts + 2
+        new_ends = numpy.cumsum(new_counts)
+        new_starts = new_ends - new_counts
+
+        result = numpy.empty((len(positions) + 2 * number_of_curves, 3),
+                             dtype=numpy.float32)
+        # every original point moves 2 places per curve before it plus 1 for
+        # the duplicated first point of its own curve
+        curve_indices = numpy.repeat(
+            numpy.arange(number_of_curves), counts
+        )
+        result[numpy.arange(len(positions)) + 2 * curve_indices + 1] = \
+            positions
+        result[new_starts] = positions[starts]
+        result[new_ends - 1] = positions[ends - 1]
+        return result.tobytes()
+
+    # repeat every first and last point coordinates
+    # (3 value each 3 * 4 = 12 characters) of every curve
+    parts = []
+    parts_extend = parts.extend
+    start = 0
+    for count in point_counts:
+        end = start + count * 12
+        curve_data = point_positions[start:end]
+        parts_extend((curve_data[:12], curve_data, curve_data[-12:]))
+        start = end
+    return ''.join(parts)
+
+
+def get_topology_cache(geo, name):
+    """Returns a dictionary to store topology dependent data of the given
+    geometry in.
+
+    The same dictionary is returned as long as the geometry with the given
+    name has the same number of primitives, points and vertices, which is the
+    case for the frames of a cached simulation or a groom. Only the data of
+    the last topology is kept per name.
+
+    :param geo: A ``hou.Geometry`` instance
+    :param str name: A name to identify the geometry, like the node path
+    :returns: dict
+    """
+    intrinsic_values = geo.intrinsicValueDict()
+    topology_key = (
+        intrinsic_values['primitivecount'],
+        intrinsic_values['pointcount'],
+        intrinsic_values['vertexcount'],
+    )
+    cached_key, cache = topology_cache.get(name, (None, None))
+    if cached_key != topology_key:
+        cache = {}
+        topology_cache[name] = (topology_key, cache)
+    return cache
+
+
+def clear_topology_cache():
+    """Clears the topology cache
+    """
+    topology_cache.clear()
+
+
+def promote_vertex_values_to_points(values, vertex_points, point_count):
+    """Promotes the given per vertex float values to per point values.
+
+    :param str values: The float32 values of every vertex as a string
+    :param vertex_points: An ``array.array`` holding the point index of every
+      vertex or None if every vertex has the same index with its point.
+    :param int point_count: The number of points
+    :returns: The float32 values of every point as a string
+    """
+    if vertex_points is None:
+        return values
+
+    if numpy is not None:
+        point_values = numpy.zeros(point_count, dtype=numpy.float32)
+        point_values[numpy.array(vertex_points, dtype=numpy.int32)] = \
+            numpy.frombuffer(values, dtype=numpy.float32)
+        return point_values.tobytes()
+
+    vertex_values = array.array('f')
+    vertex_values.fromstring(values)
+    point_values = array.array('f', [0.0]) * point_count
+    for vertex_value, point_index in zip(vertex_values, vertex_points):
+        point_values[point_index] = vertex_value
+    return point_values.tostring()
+
+
+def expand_prim_values_to_points(values, point_counts):
+    """Repeats the given per primitive float values for every point of the
+    primitive.
+
+    :param str values: The float32 values of every primitive as a string
+    :param point_counts: An ``array.array`` or a list of integers showing the
+      number of points of each primitive
+    :returns: The float32 values of every point as a string
+    """
+    if numpy is not None:
+        return numpy.repeat(
+            numpy.frombuffer(values, dtype=numpy.float32),
+            numpy.array(point_counts, dtype=numpy.int32)
+        ).tobytes()
+
+    return ''.join([
+        values[i * 4:i * 4 + 4] * count
+        for i, count in enumerate(point_counts)
+    ])
+
+
+def get_curve_radius(geo, point_counts, cache=None):
+    """Returns the per point width values of the given curves geometry.
+
+    The width is read in bulk from the point, primitive or vertex ``width``
+    attribute in that order. Vertex values are promoted to points with the
+    vertex to point mapping. If a topology cache is given (see
+    :func:`get_topology_cache`) the mapping is stored in it, so it is
+    calculated only once for a sequence of frames with the same topology,
+    otherwise it is calculated every time.
+
+    :param geo: A ``hou.Geometry`` instance
+    :param point_counts: The number of points of each curve
+    :param dict cache: The topology cache of the geometry or None
+    :returns: The float32 width of every point as a string, it is an empty
+      string if there is no width attribute
+    """
+    if geo.findPointAttrib('width'):
+        return geo.pointFloatAttribValuesAsString('width')
+
+    if geo.findPrimAttrib('width'):
+        return expand_prim_values_to_points(
+            geo.primFloatAttribValuesAsString('width'), point_counts
+        )
+
+    if geo.findVertexAttrib('width'):
+        if cache is None:
+            cache = {}
+        if 'vertex_points' not in cache:
+            vertex_points = get_polygon_indices(geo)[1]
+            if vertex_points == array.array('i', xrange(len(vertex_points))):
+                # the vertices are in the same order with the points
+                vertex_points = None
+            cache['vertex_points'] = vertex_points
+        return promote_vertex_values_to_points(
+            geo.vertexFloatAttribValuesAsString('width'),
+            cache['vertex_points'],
+            geo.intrinsicValue('pointcount')
+        )
+
+    return ''
+
+
+def get_float_attrib_values(geo, name, component_count):
+    """Reads the float values of the given vertex or point attribute in bulk.
+
+    Vertex attributes have precedence over point attributes. Attributes with
+    more components than ``component_count`` are truncated (ex: Houdini
+    stores uvs as 3 floats where Arnold needs 2).
+
+    :param geo: A ``hou.Geometry`` instance
+    :param str name: The attribute name
+    :param int component_count: The number of components per element
+    :returns: A tuple of the attribute level ("vertex", "point" or None if
+      there is no such attribute) and the float32 values as a string
+    """
+    attrib = geo.findVertexAttrib(name)
+    if attrib:
+        level = 'vertex'
+        data = geo.vertexFloatAttribValuesAsString(name)
+    else:
+        attrib = geo.findPointAttrib(name)
+        if not attrib:
+            return None, ''
+        level = 'point'
+        data = geo.pointFloatAttribValuesAsString(name)
+
+    size = attrib.size()
+    if size > component_count:
+        if numpy is not None:
+            data = numpy.frombuffer(data, dtype=numpy.float32)\
+                .reshape(-1, size)[:, :component_count].tobytes()
+        else:
+            values = array.array('f')
+            values.fromstring(data)
+            # remove the last component of each element until the elements
+            # have the desired size
+            for i in range(size, component_count, -1):
+                del values[i - 1::i]
+            data = values.tostring()
+    return level, data
+
+
+@perf.profile('h2a.geometry2ass')
 def geometry2ass(
         path, name, min_pixel_width, mode, export_type, export_motion,
-        export_color, render_type, double_sided=True, invert_normals=False, **kwargs
+        export_color, render_type, double_sided=True, invert_normals=False,
+        binary_indices=True, export_uvs=False, export_normals=False,
+        use_topology_cache=False, compression_level=9, write_stats=False,
+        **kwargs
 ):
     """exports geometry to ass format
+
+    :param bool binary_indices: Write the polygon indices as Base85 encoded
+      BYTE/UINT arrays instead of decimal text, see :func:`polygon2ass`.
+    :param bool export_uvs: Export the ``uv`` attribute of polygons.
+    :param bool export_normals: Export the ``N`` attribute of polygons.
+    :param bool use_topology_cache: Reuse the topology dependent data of the
+      previous export of the same node if it has the same topology, see
+      :func:`geometry2ass_sequence`.
+    :param int compression_level: The gzip compression level from 0 to 9 for
+      ".gz" files. The file is compressed in parallel, see
+      :mod:`anima.utils.parallel_gzip`.
+    :param bool write_stats: If True the stats of the export are written as
+      JSON next to the asstoc file (``<basename>.stats.json``).
+    :returns: A dictionary with the wall time, CPU time, peak RSS delta and
+      bytes in/out of every export stage, see :class:`anima.perf.Stage`.
     """
     ass_path = path
-    start_time = time.time()
 
     parts = os.path.splitext(ass_path)
     extension = parts[1]
@@ -84,10 +610,6 @@ def geometry2ass(
 
     node = hou.pwd()
 
-    file_handler = open
-    if use_gzip:
-        file_handler = gzip.open
-
     # normalize path
     ass_path = os.path.normpath(ass_path)
     try:
@@ -95,53 +617,280 @@ def geometry2ass(
     except OSError:  # path exists
         pass
 
-    data = ''
-    if export_type == 0:
-        data = curves2ass(node, name, min_pixel_width, mode, export_motion)
-    elif export_type == 1:
-        data = polygon2ass(
-            node,
-            name,
-            export_motion,
-            export_color,
-            double_sided,
-            invert_normals,
+    # every node writes its data directly to the file while it is produced
+    if use_gzip:
+        ass_file = parallel_gzip.open(
+            ass_path, 'wb', compresslevel=compression_level
         )
-    elif export_type == 2:
-        data = particle2ass(node, name, export_motion, export_color, render_type)
+    else:
+        ass_file = open(ass_path, 'w')
+    ass_file = ByteCountingFile(ass_file)
 
-    write_start = time.time()
-    ass_file = file_handler(ass_path, 'w')
-    ass_file.write(data)
-    ass_file.close()
-    write_end = time.time()
+    stats = perf.StageRecorder(
+        node.path(), byte_counter=lambda: ass_file.bytes_written
+    )
+    try:
+        if export_type == 0:
+            with stats.stage('curves2ass'):
+                curves2ass(
+                    node, name, min_pixel_width, mode, export_motion,
+                    use_topology_cache=use_topology_cache,
+                    ass_file=ass_file, stats=stats
+                )
+        elif export_type == 1:
+            with stats.stage('polygon2ass'):
+                polygon2ass(
+                    node,
+                    name,
+                    export_motion,
+                    export_color,
+                    double_sided,
+                    invert_normals,
+                    binary_indices=binary_indices,
+                    export_uvs=export_uvs,
+                    export_normals=export_normals,
+                    use_topology_cache=use_topology_cache,
+                    ass_file=ass_file,
+                    stats=stats
+                )
+        elif export_type == 2:
+            with stats.stage('particle2ass'):
+                particle2ass(
+                    node, name, export_motion, export_color, render_type,
+                    ass_file=ass_file, stats=stats
+                )
+    finally:
+        with stats.stage('Closing File'):
+            ass_file.close()
+
+    with stats.stage('Writing asstoc'):
+        bounding_min = node.geometry().attribValue("bound_min")
+        bounding_max = node.geometry().attribValue("bound_max")
+
+        bounding_box_info = 'bounds %s %s %s %s %s %s' % (
+            bounding_min[0], bounding_min[1], bounding_min[2],
+            bounding_max[0], bounding_max[1], bounding_max[2]
+        )
 
-    print('Writing to file              : %3.3f' % (write_end - write_start))
+        with open(asstoc_path, 'w') as asstoc_file:
+            asstoc_file.write(bounding_box_info)
+
+    stats.finish()
+    stats.log(logger)
+    stats_data = stats.to_dict()
+    stats_data['path'] = ass_path
+    if write_stats:
+        with open('%s.stats.json' % basename, 'w') as stats_file:
+            stats_file.write(stats.to_json())
+
+    return stats_data
+
+
+def geometry2ass_sequence(path, frames, *args, **kwargs):
+    """exports the geometry of the current node for every given frame.
+
+    The topology dependent data (polygon indices, curve point counts,
+    curve ids, uparamcoord/vparamcoord, polygon uvs etc.) is calculated and
+    encoded for the first frame only and reused for the following frames as
+    long as the topology stays the same, so mostly the point positions are
+    encoded per frame. Every frame is written to its own ass (or ass.gz) file
+    and asstoc file.
+
+    :param str path: The path of the ass file containing frame variables like
+      ``$F4``, which are expanded for every frame.
+    :param frames: An iterable of frame numbers
+    :param args: The rest of the arguments of :func:`geometry2ass`
+    :param kwargs: The keyword arguments of :func:`geometry2ass`
+    :returns: A list of the stats of every frame, see :func:`geometry2ass`,
+      the written ass file path is stored with the "path" key.
+    """
+    kwargs['use_topology_cache'] = True
+    frame_stats = []
+    try:
+        for frame in frames:
+            hou.setFrame(frame)
+            ass_path = hou.expandStringAtFrame(path, frame)
+            frame_stats.append(geometry2ass(ass_path, *args, **kwargs))
+    finally:
+        clear_topology_cache()
+    return frame_stats
+
+
+def write_polygon_indices_as_text(writer, geo, primitive_count,
+                                  vertex_count):
+    """writes the nsides and vidxs arrays of the given geometry as decimal
+    text by iterating over the primitives
+
+    :param writer: An :class:`.ASSWriter` instance
+    :param geo: A ``hou.Geometry`` instance
+    :param int primitive_count: The number of primitives
+    :param int vertex_count: The number of vertices
+    """
+    stats = writer.stats
+    with stats.stage('Getting Indices'):
+        number_of_points_per_primitive = []
+        vertex_ids = []
+
+        i = 0
+        j = 0
+        combined_vertex_ids = []
+        combined_number_of_points_per_primitive = []
+
+        for prim in geo.iterPrims():
+            number_of_points_per_primitive.append(`prim.numVertices()`)
+            i += 1
+            if i > 500:
+                i = 0
+                combined_number_of_points_per_primitive.append(' '.join(number_of_points_per_primitive))
+                number_of_points_per_primitive = []
+            for vertex in prim.vertices():
+                point = vertex.point()
+                point_id = point.number()
+                vertex_ids.append(`point_id`)
+                j += 1
+                if j > 500:
+                    j = 0
+                    combined_vertex_ids.append(' '.join(vertex_ids))
+                    vertex_ids = []
 
-    bounding_min = node.geometry().attribValue("bound_min")
-    bounding_max = node.geometry().attribValue("bound_max")
+    # join for a last time
+    if number_of_points_per_primitive:
+        combined_number_of_points_per_primitive.append(' '.join(number_of_points_per_primitive))
 
-    bounding_box_info = 'bounds %s %s %s %s %s %s' % (
-        bounding_min[0], bounding_min[1], bounding_min[2],
-        bounding_max[0], bounding_max[1], bounding_max[2]
-    )
+    if vertex_ids:
+        combined_vertex_ids.append(' '.join(vertex_ids))
 
-    with open(asstoc_path, 'w') as asstoc_file:
-        asstoc_file.write(bounding_box_info)
+    #
+    # Number Of Points Per Primitive
+    #
+    with stats.stage('Writing Number of Points'):
+        writer.write_array(
+            'nsides', primitive_count, 1, 'UINT',
+            '\n'.join(combined_number_of_points_per_primitive)
+        )
+        del combined_number_of_points_per_primitive
+
+    #
+    # Vertex Ids
+    #
+    with stats.stage('Writing Vertex Ids'):
+        writer.write_array(
+            'vidxs', vertex_count, 1, 'UINT', '\n'.join(combined_vertex_ids)
+        )
+        del combined_vertex_ids
+
+
+def write_polygon_indices_as_binary(writer, geo, primitive_count,
+                                    vertex_count, topology_data):
+    """writes the nsides and vidxs arrays of the given geometry as Base85
+    encoded BYTE or UINT arrays
 
-    end_time = time.time()
-    print('All Conversion took          : %3.3f sec' % (end_time - start_time))
-    print('******************************************************************')
+    :param writer: An :class:`.ASSWriter` instance
+    :param geo: A ``hou.Geometry`` instance
+    :param int primitive_count: The number of primitives
+    :param int vertex_count: The number of vertices
+    :param dict topology_data: The packed vertex indices are stored in this
+      dictionary with the "packed_vidxs" key, to be reused by the point level
+      uvs and normals.
+    """
+    stats = writer.stats
+    with stats.stage('Getting Indices') as stage:
+        nsides, vidxs = get_polygon_indices(geo)
+        stage.bytes_in += (len(nsides) + len(vidxs)) * nsides.itemsize
+
+    with stats.stage('Writing Number of Points'):
+        data_type, packed_nsides = pack_indices(nsides)
+        del nsides
+        writer.write_b85_array(
+            'nsides', primitive_count, 1, data_type, packed_nsides
+        )
+        del packed_nsides
+
+    with stats.stage('Writing Vertex Ids'):
+        topology_data['packed_vidxs'] = pack_indices(vidxs)
+        del vidxs
+        vidxs_type, packed_vidxs = topology_data['packed_vidxs']
+        writer.write_b85_array(
+            'vidxs', vertex_count, 1, vidxs_type, packed_vidxs
+        )
+
+
+def write_polygon_vertex_attribute(writer, geo, attr_name, component_count,
+                                   list_name, idxs_name, data_type,
+                                   point_count, vertex_count, topology_data):
+    """writes the given vertex or point attribute of the given geometry and
+    its indices as Base85 encoded arrays (ex: uvlist/uvidxs)
+
+    :param writer: An :class:`.ASSWriter` instance
+    :param geo: A ``hou.Geometry`` instance
+    :param str attr_name: The attribute name (ex: uv, N)
+    :param int component_count: The number of components per element
+    :param str list_name: The name of the values parameter (ex: uvlist)
+    :param str idxs_name: The name of the indices parameter (ex: uvidxs)
+    :param str data_type: The Arnold data type of the values (ex: POINT2)
+    :param int point_count: The number of points
+    :param int vertex_count: The number of vertices
+    :param dict topology_data: A dictionary to get the packed vertex indices
+      from, it is filled if it doesn't have them.
+    """
+    stats = writer.stats
+    with stats.stage('Writing %s' % list_name) as stage:
+        level, values = \
+            get_float_attrib_values(geo, attr_name, component_count)
+        if level is None:
+            return
+        stage.bytes_in += len(values)
+
+        if level == 'vertex':
+            # every vertex has its own value
+            value_count = vertex_count
+            idxs_type, packed_idxs = pack_indices(xrange(vertex_count))
+        else:
+            # point values are indexed in the same way with the positions
+            value_count = point_count
+            if 'packed_vidxs' not in topology_data:
+                topology_data['packed_vidxs'] = \
+                    pack_indices(get_polygon_indices(geo)[1])
+            idxs_type, packed_idxs = topology_data['packed_vidxs']
+
+        writer.write_b85_array(list_name, value_count, 1, data_type, values)
+        del values
+        writer.write_b85_array(
+            idxs_name, vertex_count, 1, idxs_type, packed_idxs
+        )
+        del packed_idxs
 
 
+@perf.profile('h2a.polygon2ass')
 def polygon2ass(
         node, name, export_motion=False, export_color=False, double_sided=True,
-        invert_normals=False
+        invert_normals=False, binary_indices=True, export_uvs=False,
+        export_normals=False, use_topology_cache=False, ass_file=None,
+        stats=None
 ):
     """exports polygon geometry to ass format
+
+    :param bool binary_indices: If True the ``nsides`` and ``vidxs`` arrays
+      are read in bulk with :func:`get_polygon_indices` and written as Base85
+      encoded BYTE or UINT arrays, depending on the maximum value. Otherwise
+      they are written as decimal text.
+    :param bool export_uvs: If True the ``uv`` vertex or point attribute is
+      exported as ``uvlist`` and ``uvidxs``.
+    :param bool export_normals: If True the ``N`` vertex or point attribute is
+      exported as ``nlist`` and ``nidxs``.
+    :param bool use_topology_cache: If True the indices and uvs written for
+      the previous frame with the same topology are reused.
+    :param ass_file: A file like object to write the node to. If it is None,
+      the node is rendered in to a string and returned.
+    :param stats: An :class:`anima.perf.StageRecorder` to record the export
+      stages with, nothing is recorded if it is None.
     """
     sample_count = 2 if export_motion else 1
 
+    return_string = ass_file is None
+    if return_string:
+        ass_file = StringIO()
+
     # visibility flags
     # a binary value of
     # 00000000
@@ -156,36 +905,13 @@ def polygon2ass(
     # +--------> (unknown)
 
     geo = node.geometry()
-    base_template = """
-polymesh
-{
- name %(name)s
- nsides %(primitive_count)i 1 UINT
-%(number_of_points_per_primitive)s
- vidxs %(vertex_count)s 1 UINT
-%(vertex_ids)s
- vlist %(point_count)s %(sample_count)s b85POINT
-%(point_positions)s
- smoothing on
- visibility 255
- sidedness %(sidedness)s
- invert_normals %(invert_normals)s
- receive_shadows on
- self_shadows on
- opaque on
- matrix
-%(matrix)s
- id 683108022
-%(color_template)s
-}"""
-    #  uvidxs %(vertex_count)s 1 UINT
-    #%(uv_ids)s
-    # uvlist %(vertex_count)s 1 b85POINT2
-    #%(vertex_uvs)s
-
-    skip_normals = False
-    skip_uvs = False
-    skip_colors = False
+
+    cache = None
+    if use_topology_cache:
+        cache = get_topology_cache(geo, node.path())
+    writer = ASSWriter(ass_file, cache=cache, stats=stats)
+    stats = writer.stats
+    topology_data = cache if cache is not None else {}
 
     intrinsic_values = geo.intrinsicValueDict()
 
@@ -193,207 +919,61 @@ polymesh
     point_count = intrinsic_values['pointcount']
     vertex_count = intrinsic_values['vertexcount']
 
-    number_of_points_per_primitive = []
-    vertex_ids = []
-    # vertex_normals = []
-    # vertex_uvs = []
-    # uv_ids = []
-    # combined_uv_ids = []
-    ## uv_ids = split_data(' '.join(map(str, range(vertex_count))), 500)
-    # j = 0
-    # for i in range(vertex_count):
-    #     uv_ids.append(str(i))
-    #     j += 1
-    #     if j > 500:
-    #         j = 0
-    #         combined_uv_ids.append(' '.join(uv_ids))
-    #         uv_ids = []
-    vertex_colors = []
-
-    ## join for a last time
-    # if uv_ids:
-    #     combined_uv_ids.append(' '.join(uv_ids))
-    #
-    # uv_ids = combined_uv_ids
-
-    # just for the first vertex try to read the uv to determine if we should
-    # skip the uvs or not
-    # skip_uvs = True
-
-    i = 0
-    j = 0
-    combined_vertex_ids = []
-    # combined_vertex_normals = []
-    combined_number_of_points_per_primitive = []
-
-    for prim in geo.iterPrims():
-        number_of_points_per_primitive.append(`prim.numVertices()`)
-        i += 1
-        if i > 500:
-            i = 0
-            combined_number_of_points_per_primitive.append(' '.join(number_of_points_per_primitive))
-            number_of_points_per_primitive = []
-        for vertex in prim.vertices():
-            point = vertex.point()
-            point_id = point.number()
-            vertex_ids.append(`point_id`)
-            # vertex_normals.extend(point.floatListAttribValue('N'))
-            # vertex_uv = vertex.floatListAttribValue('uv')
-            # vertex_uvs.append(vertex_uv[0])
-            # vertex_uvs.append(vertex_uv[1])
-            j += 1
-            if j > 500:
-                j = 0
-                combined_vertex_ids.append(' '.join(vertex_ids))
-                vertex_ids = []
-                # combined_vertex_normals.append(' '.join(map(str, vertex_normals)))
-                # vertex_normals = []
-                vertex_colors = []
-
-    # join for a last time
-    if number_of_points_per_primitive:
-        combined_number_of_points_per_primitive.append(' '.join(number_of_points_per_primitive))
-
-    if vertex_ids:
-        combined_vertex_ids.append(' '.join(vertex_ids))
-
-    # if vertex_normals:
-    #     combined_vertex_normals.append(' '.join(map(str, vertex_normals)))
-
-    ## encode uvs
-    # encoded_vertex_uvs = '%s' % base85.arnold_b85_encode(
-    #     struct.pack(
-    #         '<%sd' % len(vertex_uvs),
-    #         *vertex_uvs
-    #     )
-    # )
-    # splitted_vertex_uvs = split_data(encoded_vertex_uvs, 500)
-
-    point_positions = geo.pointFloatAttribValuesAsString('P')
+    writer.begin_node('polymesh')
+    writer.write_parameter('name', name)
 
-    if export_motion:
-        point_prime_positions = geo.pointFloatAttribValuesAsString('pprime')
-        point_positions = '%s%s' % (point_positions, point_prime_positions)
-
-    try:
-        point_colors = geo.pointFloatAttribValuesAsString('color')
-    except hou.OperationFailed:
-       # no color attribute skip it
-        skip_colors = True
-        point_colors = ''
-
-    # try:
-    #    point_normals = geo.pointFloatAttribValuesAsString('N')
-    #    # point_normals = geo.pointFloatAttribValues('N')
-    # except hou.OperationFailed:
-    #    # no normal attribute skip it
-    #    skip_normals = True
-    #    point_normals = ''
+    if binary_indices:
+        writer.write_cached(
+            'binary_polygon_indices', write_polygon_indices_as_binary,
+            writer, geo, primitive_count, vertex_count, topology_data
+        )
+    else:
+        writer.write_cached(
+            'text_polygon_indices', write_polygon_indices_as_text,
+            writer, geo, primitive_count, vertex_count
+        )
 
     #
-    # Number Of Points Per Primitive
+    # UVs and Normals
     #
-    encode_start = time.time()
-    #encoded_number_of_points_per_primitive = 'B%s' % base85.arnold_b85_encode(
-    #    struct.pack(
-    #        '>%sB' % len(number_of_points_per_primitive),
-    #        *number_of_points_per_primitive
-    #    )
-    #)
-    encoded_number_of_points_per_primitive = '\n'.join(combined_number_of_points_per_primitive)
-    encode_end = time.time()
-    print('Encoding Number of Points  : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    #splitted_number_of_points_per_primitive = \
-    #    re.sub(
-    #        "(.{500})", "\\1\n",
-    #        #' '.join(number_of_points_per_primitive),
-    #        encoded_number_of_points_per_primitive,
-    #        0
-    #    )
-    #splitted_number_of_points_per_primitive = ' '.join(encoded_number_of_points_per_primitive)
-    splitted_number_of_points_per_primitive = encoded_number_of_points_per_primitive
-    split_end = time.time()
-    print('Splitting Number of Points : %3.3f' % (split_end - split_start))
+    if export_uvs:
+        writer.write_cached(
+            'uv', write_polygon_vertex_attribute,
+            writer, geo, 'uv', 2, 'uvlist', 'uvidxs', 'POINT2',
+            point_count, vertex_count, topology_data
+        )
+    if export_normals:
+        # normals are changing with deformations, so they are not cached
+        write_polygon_vertex_attribute(
+            writer, geo, 'N', 3, 'nlist', 'nidxs', 'VECTOR',
+            point_count, vertex_count, topology_data
+        )
+    del topology_data
 
     #
     # Point Positions
     #
-    encode_start = time.time()
-    # encoded_point_positions = base85.arnold_b85_encode_multithreaded(point_positions)
-    encoded_point_positions = base85.arnold_b85_encode(point_positions)
-    encode_end = time.time()
-    print('Encoding Point Position    : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    splitted_point_positions = split_data(encoded_point_positions, 500)
-    split_end = time.time()
-    print('Splitting Point Positions : %3.3f' % (split_end - split_start))
-
-    # #
-    # # Vertex Normals
-    # #
-    # encode_start = time.time()
-    # encoded_vertex_normals = '\n'.join(combined_vertex_normals)#base85.arnold_b85_encode(point_normals)
-    # encode_end = time.time()
-    # print('Encoding Point Normals     : %3.3f' % (encode_end - encode_start))
-    #
-    # split_start = time.time()
-    # # splitted_vertex_normals = re.sub("(.{500})", "\\1\n", encoded_point_normals, 0)
-    # splitted_vertex_normals = encoded_vertex_normals
-    # # # split every n-th data
-    # # n = 100
-    # # splitted_point_normals = []
-    # # for i in range(len(point_normals) / n):
-    # #     start_index = n * i
-    # #     end_index = n * (i+1)
-    # #     splitted_point_normals.extend(point_normals[start_index:end_index])
-    # #     splitted_point_normals.append('\n')
-    # #
-    # # splitted_point_normals = ' '.join(map(str, splitted_point_normals))
-    # split_end = time.time()
-    # print('Splitting Vertex Normals    : %3.3f' % (split_end - split_start))
-
-    # #
-    # # Vertex Colors
-    # #
-
-    encode_start = time.time()
-    encoded_point_colors = base85.arnold_b85_encode(point_colors)
-    encode_end = time.time()
-    print('Encoding Point colors     : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    splitted_point_colors = split_data(encoded_point_colors, 100)
-    split_end = time.time()
-    print('Splitting Vertex Colors    : %3.3f' % (split_end - split_start))
+    with stats.stage('Getting Point Position') as stage:
+        point_positions = [geo.pointFloatAttribValuesAsString('P')]
+        if export_motion:
+            point_positions.append(
+                geo.pointFloatAttribValuesAsString('pprime')
+            )
+        stage.bytes_in += sum(map(len, point_positions))
+
+    with stats.stage('Writing Point Position'):
+        writer.write_b85_array(
+            'vlist', point_count, sample_count, 'POINT', point_positions
+        )
+        del point_positions
 
-    #
-    # Vertex Ids
-    #
-    encode_start = time.time()
-    #encoded_vertex_ids = 'B%s' % base85.arnold_b85_encode(
-    #    struct.pack(
-    #        '>%sB' % len(vertex_ids),
-    #        *vertex_ids
-    #    )
-    #)
-    encoded_vertex_ids = '\n'.join(combined_vertex_ids)
-    encode_end = time.time()
-    print('Encoding Vertex Ids        : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    #splitted_vertex_ids = re.sub(
-    #    "(.{500})", "\\1\n",
-    #    #' '.join(vertex_ids),
-    #    encoded_vertex_ids,
-    #    0
-    #)
-    #splitted_vertex_ids = ' '.join(encoded_vertex_ids)
-    splitted_vertex_ids = encoded_vertex_ids
-    split_end = time.time()
-    print('Splitting Vertex Ids       : %3.3f' % (split_end - split_start))
+    writer.write_parameter('smoothing', 'on')
+    writer.write_parameter('visibility', 255)
+    writer.write_parameter('sidedness', 255 if double_sided else 0)
+    writer.write_parameter('invert_normals', 'on' if invert_normals else 'off')
+    writer.write_parameter('receive_shadows', 'on')
+    writer.write_parameter('self_shadows', 'on')
+    writer.write_parameter('opaque', 'on')
 
     matrix = """1 0 0 0
 0 1 0 0
@@ -402,109 +982,75 @@ polymesh
 """
     if export_motion:
         matrix += matrix
+    writer.write(' matrix\n%s' % matrix)
+    writer.write_parameter('id', 683108022)
 
-    color_template = ''
+    #
+    # Vertex Colors
+    #
     if export_color:
-        color_template = """
-            declare colorSet1 varying RGBA
-            colorSet1 %(point_count)s 1 b85RGBA
-            %(splitted_point_colors)s
-        """
+        try:
+            point_colors = geo.pointFloatAttribValuesAsString('color')
+        except hou.OperationFailed:
+            # no color attribute skip it
+            point_colors = ''
 
-        color_template = color_template % {
-            'point_count': point_count,
-            'splitted_point_colors':splitted_point_colors
-        }
-
-    data = base_template % {
-        'name': name,
-        'point_count': point_count,
-        'vertex_count': vertex_count,
-        'primitive_count': primitive_count,
-        'sample_count': sample_count,
-        'number_of_points_per_primitive': splitted_number_of_points_per_primitive,
-        'vertex_ids': splitted_vertex_ids,
-        'point_positions': splitted_point_positions,
-        'matrix': matrix,
-        'color_template': color_template,
-        'sidedness': 255 if double_sided else 0,
-        'invert_normals': 'on' if invert_normals else 'off',
-        # 'uv_ids': uv_ids,
-        # 'vertex_uvs': splitted_vertex_uvs,
-        # 'normal_count': vertex_count,
-        # 'vertex_normals': splitted_vertex_normals,
-    }
-
-    return data
-
-
-def particle2ass(node, name, export_motion=False, export_color=False, render_type=0):
+        with stats.stage('Writing Point colors', len(point_colors)):
+            writer.write_declare('colorSet1', 'varying', 'RGBA')
+            writer.write_b85_array(
+                'colorSet1', point_count, 1, 'RGBA', point_colors, 100
+            )
+            del point_colors
+
+    writer.end_node()
+
+    if return_string:
+        return ass_file.getvalue()
+
+
+@perf.profile('h2a.particle2ass')
+def particle2ass(node, name, export_motion=False, export_color=False,
+                 render_type=0, ass_file=None, stats=None):
     """exports polygon geometry to ass format
+
+    :param ass_file: A file like object to write the node to. If it is None,
+      the node is rendered in to a string and returned.
+    :param stats: An :class:`anima.perf.StageRecorder` to record the export
+      stages with, nothing is recorded if it is None.
     """
     sample_count = 2 if export_motion else 1
 
+    return_string = ass_file is None
+    if return_string:
+        ass_file = StringIO()
+    writer = ASSWriter(ass_file, stats=stats)
+    stats = writer.stats
+
     geo = node.geometry()
-    base_template = """
-points
-{
- name %(name)s
- points %(point_count)s %(sample_count)s b85POINT
-%(point_positions)s
- radius %(point_count)s 1 b85FLOAT
-%(point_radius)s
- mode %(render_as)s
- min_pixel_width 0
- step_size 0
- visibility 243
- receive_shadows on
- self_shadows on
- shader "initialParticleSE"
- opaque on
- matte off
- id -838484804
-%(color_template)s
-}"""
-    #  uvidxs %(vertex_count)s 1 UINT
-    #%(uv_ids)s
-    # uvlist %(vertex_count)s 1 b85POINT2
-    #%(vertex_uvs)s
-
-    skip_normals = False
-    skip_uvs = False
-    skip_colors = False
-    skip_radius = False
 
     intrinsic_values = geo.intrinsicValueDict()
 
     point_count = intrinsic_values['pointcount']
 
-    # i = 0
-    # j = 0
-    # combined_vertex_ids = []
-    # # combined_vertex_normals = []
-    # combined_number_of_points_per_primitive = []
+    writer.begin_node('points')
+    writer.write_parameter('name', name)
 
     #
     # Point Positions
     #
-    point_positions = geo.pointFloatAttribValuesAsString('P')
-    if export_motion:
-        point_prime_positions = geo.pointFloatAttribValuesAsString('pprime')
-        point_positions = '%s%s' % (point_positions, point_prime_positions)
-        del point_prime_positions
-
-    encode_start = time.time()
-    # encoded_point_positions = base85.arnold_b85_encode_multithreaded(point_positions)
-    encoded_point_positions = base85.arnold_b85_encode(point_positions)
-    encode_end = time.time()
-    print('Encoding Point Position    : %3.3f' % (encode_end - encode_start))
-    del point_positions
-
-    split_start = time.time()
-    splitted_point_positions = split_data(encoded_point_positions, 500)
-    split_end = time.time()
-    print('Splitting Point Positions : %3.3f' % (split_end - split_start))
-    del encoded_point_positions
+    with stats.stage('Getting Point Position') as stage:
+        point_positions = [geo.pointFloatAttribValuesAsString('P')]
+        if export_motion:
+            point_positions.append(
+                geo.pointFloatAttribValuesAsString('pprime')
+            )
+        stage.bytes_in += sum(map(len, point_positions))
+
+    with stats.stage('Writing Point Position'):
+        writer.write_b85_array(
+            'points', point_count, sample_count, 'POINT', point_positions
+        )
+        del point_positions
 
     #
     # Point Radius
@@ -512,23 +1058,15 @@ points
     try:
         point_radius = geo.pointFloatAttribValuesAsString('pscale')
     except hou.OperationFailed:
-       # no radius attribute skip it
-        skip_radius = True
+        # no radius attribute skip it
         point_radius = ''
 
-    encode_start = time.time()
-    encoded_point_radius = base85.arnold_b85_encode(point_radius)
-    encode_end = time.time()
-    print('Encoding Point Radius    : %3.3f' % (encode_end - encode_start))
-    del point_radius
-
-    split_start = time.time()
-    splitted_point_radius = split_data(encoded_point_radius, 500)
-    split_end = time.time()
-    print('Splitting Point Radius : %3.3f' % (split_end - split_start))
-    del encoded_point_radius
+    with stats.stage('Writing Point Radius', len(point_radius)):
+        writer.write_b85_array(
+            'radius', point_count, 1, 'FLOAT', point_radius
+        )
+        del point_radius
 
-    render_type = render_type
     render_as = "disk"
 
     if render_type == 1:
@@ -536,94 +1074,115 @@ points
     elif render_type == 2:
         render_as = "quad"
 
-    # #
-    # # Vertex Colors
-    # #
-    color_template = ''
+    writer.write_parameter('mode', render_as)
+    writer.write_parameter('min_pixel_width', 0)
+    writer.write_parameter('step_size', 0)
+    writer.write_parameter('visibility', 243)
+    writer.write_parameter('receive_shadows', 'on')
+    writer.write_parameter('self_shadows', 'on')
+    writer.write_parameter('shader', '"initialParticleSE"')
+    writer.write_parameter('opaque', 'on')
+    writer.write_parameter('matte', 'off')
+    writer.write_parameter('id', -838484804)
+
+    #
+    # Vertex Colors
+    #
     if export_color:
         try:
             point_colors = geo.pointFloatAttribValuesAsString('particle_color')
         except hou.OperationFailed:
-           # no color attribute skip it
-            skip_colors = True
+            # no color attribute skip it
             point_colors = ''
 
-        encode_start = time.time()
-        encoded_point_colors = base85.arnold_b85_encode(point_colors)
-        encode_end = time.time()
-        print('Encoding Point colors     : %3.3f' % (encode_end - encode_start))
-        del point_colors
-
-        split_start = time.time()
-        splitted_point_colors = split_data(encoded_point_colors, 100)
-        split_end = time.time()
-        print('Splitting Point Colors : %3.3f' % (split_end - split_start))
-        del encoded_point_colors
-
-        color_template = """
-            declare rgbPP uniform RGB
-            rgbPP %(point_count)s 1 b85RGB
-            %(splitted_point_colors)s
-        """
+        with stats.stage('Writing Point colors', len(point_colors)):
+            writer.write_declare('rgbPP', 'uniform', 'RGB')
+            writer.write_b85_array(
+                'rgbPP', point_count, 1, 'RGB', point_colors, 100
+            )
+            del point_colors
+
+    writer.end_node()
+
+    if return_string:
+        return ass_file.getvalue()
+
+
+def write_curve_paramcoords(writer, geo, number_of_curves, sample_count):
+    """writes the uparamcoord and vparamcoord user data of the given curves
+    geometry from the uv_u and uv_v primitive attributes
+
+    :param writer: An :class:`.ASSWriter` instance
+    :param geo: A ``hou.Geometry`` instance
+    :param int number_of_curves: The number of curves
+    :param int sample_count: The number of motion keys
+    """
+    stats = writer.stats
+    with stats.stage('Getting uv') as stage:
+        u = geo.primFloatAttribValuesAsString('uv_u')
+        v = geo.primFloatAttribValuesAsString('uv_v')
+        stage.bytes_in += len(u) + len(v)
+
+    # extend for motion blur
+    with stats.stage('Writing UParamcoord'):
+        writer.write_declare('uparamcoord', 'uniform', 'FLOAT')
+        writer.write_b85_array(
+            'uparamcoord', number_of_curves, sample_count, 'FLOAT',
+            [u] * sample_count
+        )
+        del u
+
+    with stats.stage('Writing VParamcoord'):
+        writer.write_declare('vparamcoord', 'uniform', 'FLOAT')
+        writer.write_b85_array(
+            'vparamcoord', number_of_curves, sample_count, 'FLOAT',
+            [v] * sample_count
+        )
+        del v
 
-        color_template = color_template % {
-            'point_count': point_count,
-            'splitted_point_colors': splitted_point_colors
-        }
-
-    data = base_template % {
-        'name': name,
-        'point_count': point_count,
-        'sample_count': sample_count,
-        'render_as': render_as,
-        'point_radius': splitted_point_radius,
-        'point_positions': splitted_point_positions,
-        'color_template': color_template,
-    }
-    del splitted_point_radius
-    del splitted_point_positions
-    return data
+
+def write_curve_ids(writer, number_of_curves, sample_count):
+    """writes the curve_id user data
+
+    :param writer: An :class:`.ASSWriter` instance
+    :param int number_of_curves: The number of curves
+    :param int sample_count: The number of motion keys
+    """
+    writer.write_declare('curve_id', 'uniform', 'UINT')
+    writer.write_array(
+        'curve_id', number_of_curves, sample_count, 'UINT',
+        ' '.join(`id_` for id_ in xrange(number_of_curves))
+    )
 
 
+@perf.profile('h2a.curves2ass')
 def curves2ass(node, hair_name, min_pixel_width=0.5, mode='ribbon',
-               export_motion=False):
+               export_motion=False, use_topology_cache=False, ass_file=None,
+               stats=None):
     """exports the node content to ass file
+
+    :param bool use_topology_cache: If True the point counts, curve ids and
+      uparamcoord/vparamcoord written for the previous frame with the same
+      topology are reused.
+    :param ass_file: A file like object to write the node to. If it is None,
+      the node is rendered in to a string and returned.
+    :param stats: An :class:`anima.perf.StageRecorder` to record the export
+      stages with, nothing is recorded if it is None.
     """
     sample_count = 2 if export_motion else 1
-    template_vars = dict()
+
+    return_string = ass_file is None
+    if return_string:
+        ass_file = StringIO()
+
     geo = node.geometry()
 
-    base_template = """
-curves
-{
- name %(name)s
- num_points %(curve_count)i %(sample_count)s UINT
-  %(number_of_points_per_curve)s
- points %(point_count)s %(sample_count)s b85POINT
- %(point_positions)s
-
- radius %(radius_count)s 1 b85FLOAT
- %(radius)s
- basis "catmull-rom"
- mode "%(mode)s"
- min_pixel_width %(min_pixel_width)s
- visibility 65535
- receive_shadows on
- self_shadows on
- matrix 1 %(sample_count)s MATRIX
-  %(matrix)s
- opaque on
- declare uparamcoord uniform FLOAT
- uparamcoord %(curve_count)i %(sample_count)s b85FLOAT
- %(uparamcoord)s
- declare vparamcoord uniform FLOAT
- vparamcoord %(curve_count)i %(sample_count)s b85FLOAT
- %(vparamcoord)s
- declare curve_id uniform UINT
- curve_id %(curve_count)i %(sample_count)s UINT
-  %(curve_ids)s
-}
-"""
+    cache = None
+    if use_topology_cache:
+        cache = get_topology_cache(geo, node.path())
+    writer = ASSWriter(ass_file, cache=cache, stats=stats)
+    stats = writer.stats
+    topology_data = cache if cache is not None else {}
 
     number_of_curves = geo.intrinsicValue('primitivecount')
     real_point_count = geo.intrinsicValue('pointcount')
@@ -635,175 +1194,101 @@ curves
     # write down the radius for the tip twice
     radius_count = real_point_count
 
-    real_number_of_points_in_one_curve = real_point_count / number_of_curves
-    number_of_points_in_one_curve = real_number_of_points_in_one_curve + 2
-    number_of_points_per_curve = [`number_of_points_in_one_curve`] * number_of_curves
-
-    curve_ids = ' '.join(`id_` for id_ in xrange(number_of_curves))
+    # curves can have different number of points
+    if 'point_counts' not in topology_data:
+        point_counts = get_curve_point_counts(geo)
+        topology_data['point_counts'] = point_counts
+        topology_data['number_of_points_per_curve'] = \
+            ' '.join([`point_count_ + 2` for point_count_ in point_counts])
+    point_counts = topology_data['point_counts']
+    number_of_points_per_curve = topology_data['number_of_points_per_curve']
 
-    radius = None
+    with stats.stage('Getting Radius Info') as stage:
+        radius = get_curve_radius(geo, point_counts, cache)
+        stage.bytes_in += len(radius)
 
-    pack = struct.pack
+    writer.begin_node('curves')
+    writer.write_parameter('name', node.path().replace('/', '_'))
 
-    # try to find the width as a point attribute to speed things up
-    getting_radius_start = time.time()
-    radius_attribute = geo.findPointAttrib('width')
-    if radius_attribute:
-        # this one works 100 times faster then iterating over each vertex
-        radius = geo.pointFloatAttribValuesAsString('width')
-    else:
-        # no radius in points, so iterate over each vertex
-        radius_i = 0
-        radius_str_buffer = []
-        radius_file_str = StringIO()
-        radius_file_str_write = radius_file_str.write
-        radius_str_buffer_append = radius_str_buffer.append
-        for prim in geo.prims():
-            prim_vertices = prim.vertices()
-
-            # radius
-            radius_i += real_number_of_points_in_one_curve
-            if radius_i >= 1000:
-                radius_file_str_write(''.join(radius_str_buffer))
-                radius_str_buffer = []
-                radius_str_buffer_append = radius_str_buffer.append
-                radius_i = 0
-
-            for vertex in prim_vertices:
-                radius_str_buffer_append(pack('f', vertex.attribValue('width')))
-
-        # do flushes again before getting the values
-        radius_file_str_write(''.join(radius_str_buffer))
-        radius = radius_file_str.getvalue()
-    getting_radius_end = time.time()
-    print('Getting Radius Info          : %3.3f' %
-          (getting_radius_end - getting_radius_start))
+    # extend for motion blur
+    num_points = [number_of_points_per_curve]
+    if export_motion:
+        num_points = [number_of_points_per_curve, ' ',
+                      number_of_points_per_curve]
+    writer.write_array(
+        'num_points', number_of_curves, sample_count, 'UINT', num_points
+    )
+    del num_points
+    del number_of_points_per_curve
+    del topology_data
 
     # point positions
-    encode_start = time.time()
-
     # for motion blur use pprime
-    getting_point_positions_start = time.time()
-    point_positions = geo.pointFloatAttribValuesAsString('P')
-
-    if export_motion:
-        point_prime_positions = geo.pointFloatAttribValuesAsString('pprime')
-        point_positions = '%s%s' % (point_positions, point_prime_positions)
-
-    getting_point_positions_end = time.time()
-    print('Getting Point Position       : %3.3f' %
-          (getting_point_positions_end - getting_point_positions_start))
-
-    # repeat every first and last point coordinates
-    # (3 value each 3 * 4 = 12 characters) of every curve
-    zip_start = time.time()
-    point_positions = ''.join(
-        map(
-            lambda x: '%s%s%s' % (x[:12], x, x[-12:]),
-            map(
-                ''.join,
-                zip(*[iter(point_positions)] * (real_number_of_points_in_one_curve*4*3)))
+    with stats.stage('Getting Point Position') as stage:
+        point_positions = [geo.pointFloatAttribValuesAsString('P')]
+
+        if export_motion:
+            point_positions.append(
+                geo.pointFloatAttribValuesAsString('pprime')
+            )
+        stage.bytes_in += sum(map(len, point_positions))
+
+    # repeat every first and last point of every curve
+    with stats.stage('Zipping Point Position'):
+        point_positions = [
+            duplicate_curve_end_points(sample_point_positions, point_counts)
+            for sample_point_positions in point_positions
+        ]
+        del point_counts
+
+    with stats.stage('Writing Point Position'):
+        writer.write_b85_array(
+            'points', point_count, sample_count, 'POINT', point_positions
         )
-    )
-    zip_end = time.time()
-    print('Zipping Point Position       : %3.3f' % (zip_end - zip_start))
-
-    # encoded_point_positions = base85.arnold_b85_encode_multithreaded(point_positions)
-    encoded_point_positions = base85.arnold_b85_encode(point_positions)
-    encode_end = time.time()
-    print('Encoding Point Position      : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    splitted_point_positions = split_data(encoded_point_positions, 500)
-    split_end = time.time()
-    print('Splitting Point Positions    : %3.3f' % (split_end - split_start))
+        del point_positions
 
     # radius
-    encode_start = time.time()
-    encoded_radius = base85.arnold_b85_encode(radius)
-    encode_end = time.time()
-    print('Radius encode                : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    splitted_radius = split_data(encoded_radius, 500)
-    # extend for motion blur
-    # if export_motion:
-    #     splitted_radius = '%(data)s%(data)s' % {'data': splitted_radius}
-    split_end = time.time()
-    print('Splitting Radius             : %3.3f' % (split_end - split_start))
-
-    # uv
-    getting_uv_start = time.time()
-    u = geo.primFloatAttribValuesAsString('uv_u')
-    v = geo.primFloatAttribValuesAsString('uv_v')
-    getting_uv_end = time.time()
-    print('Getting uv                   : %3.3f' %
-          (getting_uv_end - getting_uv_start))
-
-    encode_start = time.time()
-    encoded_u = base85.arnold_b85_encode(u)
-    encode_end = time.time()
-    print('Encoding UParamcoord         : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    splitted_u = split_data(encoded_u, 500)
-    if export_motion:
-        splitted_u = '%(data)s%(data)s' % {'data': splitted_u}
-    split_end = time.time()
-    print('Splitting UParamCoord        : %3.3f' % (split_end - split_start))
-
-    encode_start = time.time()
-    encoded_v = base85.arnold_b85_encode(v)
-    encode_end = time.time()
-    print('Encoding VParamcoord         : %3.3f' % (encode_end - encode_start))
-
-    split_start = time.time()
-    splitted_v = split_data(encoded_v, 500)
-    if export_motion:
-        splitted_v = '%(data)s%(data)s' % {'data': splitted_v}
-    split_end = time.time()
-    print('Splitting VParamCoord        : %3.3f' % (split_end - split_start))
+    with stats.stage('Writing Radius'):
+        if radius:
+            writer.write_b85_array(
+                'radius', radius_count, 1, 'FLOAT', radius
+            )
+        del radius
+
+    writer.write_parameter('basis', '"catmull-rom"')
+    writer.write_parameter('mode', '"%s"' % mode)
+    writer.write_parameter('min_pixel_width', min_pixel_width)
+    writer.write_parameter('visibility', 65535)
+    writer.write_parameter('receive_shadows', 'on')
+    writer.write_parameter('self_shadows', 'on')
 
-    print('len(encoded_point_positions) : %s' % len(encoded_point_positions))
-    print('(p + 2 * c) * 5 * 3          : %s' % (point_count * 5 * 3))
-    print('len(encoded_radius)          : %s' % len(encoded_radius))
-    print('len(uv)                      : %s' % len(u))
-    print('len(encoded_u)               : %s' % len(encoded_u))
-    print('len(encoded_v)               : %s' % len(encoded_v))
-
-    # extend for motion blur
     matrix = """1 0 0 0
   0 1 0 0
   0 0 1 0
   0 0 0 1
 """
     if export_motion:
-        number_of_points_per_curve.extend(number_of_points_per_curve)
         matrix += matrix
+    writer.write_array('matrix', 1, sample_count, 'MATRIX', matrix)
+    writer.write_parameter('opaque', 'on')
+
+    # uv
+    with stats.stage('Writing Paramcoords'):
+        writer.write_cached(
+            'paramcoord_%s' % sample_count, write_curve_paramcoords,
+            writer, geo, number_of_curves, sample_count
+        )
+
+    writer.write_cached(
+        'curve_id', write_curve_ids, writer, number_of_curves, sample_count
+    )
 
-    template_vars.update({
-        'name': node.path().replace('/', '_'),
-        'curve_count': number_of_curves,
-        'real_point_count': real_point_count,
-        'number_of_points_per_curve': ' '.join(number_of_points_per_curve),
-        'point_count': point_count,
-        'point_positions': splitted_point_positions,
-        'radius': splitted_radius,
-        'radius_count': radius_count,
-        'curve_ids': curve_ids,
-        'uparamcoord': splitted_u,
-        'vparamcoord': splitted_v,
-        'min_pixel_width': min_pixel_width,
-        'mode': mode,
-        'sample_count': sample_count,
-        'matrix': matrix
-    })
-
-    rendered_curve_data = base_template % template_vars
+    writer.end_node()
 
     del geo
 
-    return rendered_curve_data
+    if return_string:
+        return ass_file.getvalue()
 
 
 def split_data(data, chunk_size):
@@ -840,10 +840,13 @@ class MainDialog(QtWidgets.QDialog, version_creator_UI.Ui_Dialog, AnimaDialogBas
                 file_path = result[0]
                 if file_path:
                     from anima.utils import MediaManager
-                    with open(file_path) as f:
-                        MediaManager.upload_version_output(
+
+                    # do not block the UI while the web version is generated
+                    with open(file_path, 'rb') as f:
+                        upload = MediaManager().start_upload_version_output(
                             version, f, os.path.basename(file_path)
                         )
+                    self.finish_upload_when_done(upload)
             elif choice == 'Change Description...':
                 if version:
                     # change the description
@@ -878,6 +881,31 @@ class MainDialog(QtWidgets.QDialog, version_creator_UI.Ui_Dialog, AnimaDialogBas
                     )
                 )
 
+    def finish_upload_when_done(self, upload):
+        """links the web version and the thumbnail of the given upload and
+        commits it when they are generated, it is checked periodically so the
+        database is only touched from the UI thread.
+
+        :param upload: An :class:`anima.utils.MediaUpload` instance.
+        """
+        if not upload.done():
+            QtCore.QTimer.singleShot(
+                500, lambda: self.finish_upload_when_done(upload)
+            )
+            return
+
+        from stalker import db
+        try:
+            link = upload.finish()
+            db.DBSession.add(link)
+            db.DBSession.commit()
+        except Exception as e:
+            db.DBSession.rollback()
+            QtWidgets.QMessageBox.critical(self, 'Error', '%s' % e)
+            return
+
+        logger.debug('uploaded output: %s' % link.full_path)
+
     def _show_tasks_treeView_context_menu(self, position):
         """the custom context menu for the tasks_treeView
         """
@@ -9,14 +9,51 @@ import platform
 import re
 import itertools
 import calendar
+import contextlib
 import datetime
 import shutil
 import tempfile
 import uuid
 import copy
+import json
 import subprocess
+import threading
+from collections import OrderedDict
 
-from anima import logger
+from anima import logger, perf
+# the shared worker pools, see anima.utils.executors
+from anima.utils.executors import futures, get_executor, shutdown_executors
+from anima.utils.executors import run_as_pool_worker, get_thread_count
+
+
+class CompletedFuture(object):
+    """A ``concurrent.futures.Future`` like object holding an already known
+    result, it is used where there is no executor to run the job in.
+
+    :param result: The result of the job.
+    :param exception: The exception raised by the job, if any.
+    """
+
+    def __init__(self, result=None, exception=None):
+        self._result = result
+        self._exception = exception
+
+    def done(self):
+        """returns True as the job is already finished
+        """
+        return True
+
+    def result(self, timeout=None):
+        """returns the result or raises the exception of the job
+        """
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """returns the exception raised by the job or None
+        """
+        return self._exception
 
 
 def all_equal(elements):
@@ -279,6 +316,264 @@ def local_to_utc(local_dt):
     return local_dt - (utc_to_local(local_dt) - local_dt)
 
 
+class VideoInfoCache(object):
+    """A persistent least recently used cache for the ``ffprobe`` results.
+
+    The results are stored per path, size and modification time of the
+    files, so a changed file is probed again. The cache is stored as JSON in
+    the given file, the least recently used results are removed when there
+    are more than max_size results.
+
+    The cache file can be shared by several processes. It is written to a
+    temp file and renamed, so it is never left half written, and the results
+    stored by the other processes are merged before writing. Use
+    :meth:`.batch` to write the file only once for several results.
+
+    :param str path: The path of the cache file
+    :param int max_size: The maximum number of cached results
+    """
+
+    def __init__(self, path, max_size=500):
+        self.path = path
+        self.max_size = max_size
+        self._data = None
+        self._lock = threading.Lock()
+        self._batch_depth = 0
+        self._dirty = False
+
+    @classmethod
+    def make_key(cls, full_path):
+        """returns the cache key of the given file or None if the file
+        doesn't exist
+
+        :param str full_path: The path of the file
+        :returns: str
+        """
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            return None
+        return '%s|%s|%r' % (
+            os.path.abspath(full_path), stat.st_size, stat.st_mtime
+        )
+
+    def _load(self):
+        """loads the cache file if it is not loaded yet
+        """
+        if self._data is not None:
+            return
+
+        self._data = self._read()
+
+    def _read(self):
+        """returns the content of the cache file as an OrderedDict
+        """
+        data = OrderedDict()
+        try:
+            with open(self.path, 'r') as f:
+                # stored as a list of [key, value] pairs from the least
+                # recently used to the most recently used
+                data.update(json.load(f))
+        except (IOError, ValueError, TypeError):
+            pass
+        return data
+
+    @contextlib.contextmanager
+    def batch(self):
+        """A context manager which defers writing the cache file to the end
+        of the block, the values can be set from any thread in the block::
+
+          with cache.batch():
+              for key, value in results:
+                  cache.set(key, value)
+        """
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and self._dirty:
+                    self._save()
+
+    def save(self):
+        """writes the cache to the cache file
+        """
+        with self._lock:
+            self._load()
+            self._save()
+
+    def _save(self, merge=True):
+        """writes the cache to the cache file, the lock should be acquired
+
+        :param bool merge: If True, the results written by the other
+          processes are kept.
+        """
+        self._dirty = False
+        if merge:
+            # the values of this process are the most recently used ones
+            data = self._read()
+            for key in self._data:
+                data.pop(key, None)
+            data.update(self._data)
+            while len(data) > self.max_size:
+                data.popitem(last=False)
+            self._data = data
+
+        cache_dir = os.path.dirname(self.path)
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            # dir exists
+            pass
+
+        try:
+            fd, temp_path = tempfile.mkstemp(
+                dir=cache_dir, prefix='%s.' % os.path.basename(self.path)
+            )
+        except OSError as e:
+            logger.debug('can not write %s: %s' % (self.path, e))
+            return
+
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(list(self._data.items()), f)
+            try:
+                os.rename(temp_path, self.path)
+            except OSError:
+                # windows can not rename over an existing file
+                os.remove(self.path)
+                os.rename(temp_path, self.path)
+        except (IOError, OSError) as e:
+            logger.debug('can not write %s: %s' % (self.path, e))
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def get(self, key):
+        """returns the cached value of the given key or None
+
+        :param str key: The cache key, see :meth:`.make_key`
+        """
+        with self._lock:
+            self._load()
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return None
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        """stores the given value and writes the cache file, the file is
+        written at the end of the block if it is called in a :meth:`.batch`
+        block
+
+        :param str key: The cache key, see :meth:`.make_key`
+        :param value: A JSON serializable value
+        """
+        with self._lock:
+            self._load()
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+            if self._batch_depth:
+                self._dirty = True
+            else:
+                self._save()
+
+    def clear(self):
+        """removes all the cached values
+        """
+        with self._lock:
+            self._data = OrderedDict()
+            self._save(merge=False)
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._data)
+
+
+video_info_cache = None
+
+
+def get_video_info_cache():
+    """returns the :class:`.VideoInfoCache` used by
+    :meth:`.MediaManager.get_video_info`, it is stored in the
+    ``anima.local_cache_folder``
+    """
+    global video_info_cache
+    if video_info_cache is None:
+        import anima
+        video_info_cache = VideoInfoCache(
+            os.path.normpath(
+                os.path.expandvars(
+                    os.path.expanduser(
+                        os.path.join(
+                            anima.local_cache_folder,
+                            anima.video_info_cache_file_name
+                        )
+                    )
+                )
+            ),
+            anima.max_video_info_cache_size
+        )
+    return video_info_cache
+
+
+class MediaUpload(object):
+    """An upload whose web version and thumbnail are being generated in the
+    background.
+
+    It is returned by :meth:`.MediaManager.start_upload_reference` and
+    :meth:`.MediaManager.start_upload_version_output`. Only the media
+    conversions are run in the worker threads, the :class:`.Link` instances
+    of the web version and the thumbnail are created by :meth:`.finish`, so
+    call it from the thread that owns the database session (ex: the UI
+    thread) and commit the session after it::
+
+      upload = MediaManager().start_upload_version_output(
+          version, file_object, filename
+      )
+      # ... do other things, check upload.done() ...
+      link = upload.finish()
+      DBSession.add(link)
+      DBSession.commit()
+
+    :param link: The :class:`.Link` instance of the uploaded file.
+    :param future: The ``concurrent.futures.Future`` like object of the
+      conversions, see :meth:`.MediaManager.submit_media_for_web_and_thumbnail`.
+    :param link_media: A callable accepting the future, which moves the
+      generated files to the repository and links them to the link.
+    """
+
+    def __init__(self, link, future, link_media):
+        self.link = link
+        self.future = future
+        self._link_media = link_media
+        self._finished = False
+
+    def done(self):
+        """returns True if the web version and the thumbnail are generated
+        """
+        return self.future.done()
+
+    def finish(self):
+        """waits for the web version and the thumbnail, creates their
+        :class:`.Link` instances and returns the link of the uploaded file.
+
+        :returns: :class:`.Link` instance.
+        """
+        if not self._finished:
+            self._finished = True
+            self._link_media(self.future)
+        return self.link
+
+
 class MediaManager(object):
     """Manages media files.
 
@@ -457,136 +752,50 @@ class MediaManager(object):
         :param str file_full_path: A string showing the full path of the video
           file.
         """
-        # TODO: split this in to two different methods, one generating
-        #       thumbnails from the video and another one accepting three
-        #       images
         media_info = self.get_video_info(file_full_path)
-        video_info = media_info['video_info']
-
-        # get the correct stream
-        video_stream = None
-        for stream in media_info['stream_info']:
-            if stream['codec_type'] == 'video':
-                video_stream = stream
-
-        nb_frames = video_stream.get('nb_frames')
-        if nb_frames is None or nb_frames == 'N/A':
-            # no nb_frames
-            # first try to use "r_frame_rate" and "duration"
-            frame_rate = video_stream.get('r_frame_rate')
-
-            if frame_rate is None:  # still no frame rate
-                # try to use the video_info and duration
-                # and try to get frame rate
-                frame_rate = float(video_info.get('TAG:framerate', 23.976))
-            else:
-                # check if it is in Number/Number format
-                if '/' in frame_rate:
-                    nominator, denominator = frame_rate.split('/')
-                    frame_rate = float(nominator)/float(denominator)
-
-            # get duration
-            duration = video_stream.get('duration')
-            if duration == 'N/A':  # no duration
-                duration = float(video_info.get('duration', 1))
-            else:
-                duration = float(duration)
-
-            # at this stage we should have enough info, may not be correct but
-            # we should have something
-            # calculate nb_frames
-            logger.debug('duration  : %s' % duration)
-            logger.debug('frame_rate: %s' % frame_rate)
-            nb_frames = int(duration * frame_rate)
-        nb_frames = int(nb_frames)
-
-        start_thumb_path = tempfile.mktemp(suffix=self.thumbnail_format)
-        mid_thumb_path = tempfile.mktemp(suffix=self.thumbnail_format)
-        end_thumb_path = tempfile.mktemp(suffix=self.thumbnail_format)
+        stream_info = self.get_video_stream_info(media_info)
+        duration = stream_info['duration']
+        frame_duration = 1.0 / stream_info['frame_rate']
 
         thumbnail_path = tempfile.mktemp(suffix=self.thumbnail_format)
 
-        # generate three thumbnails from the start, middle and end of the file
-        start_frame = int(nb_frames * 0.10)
-        mid_frame = int(nb_frames * 0.5)
-        end_frame = int(nb_frames * 0.90) - 1
-
-        # start_frame
-        self.ffmpeg(**{
-            'i': file_full_path,
-            'vf': "select='eq(n,0)'",
-            'vframes': start_frame,
-            'o': start_thumb_path
-        })
-        # mid_frame
-        self.ffmpeg(**{
-            'i': file_full_path,
-            'vf': "select='eq(n,%s)'" % mid_frame,
-            'vframes': 1,
-            'o': mid_thumb_path
-        })
-        # end_frame
-        self.ffmpeg(**{
-            'i': file_full_path,
-            'vf': "select='eq(n,%s)'" % end_frame,
-            'vframes': 1,
-            'o': end_thumb_path
-        })
-
-        # check if all of the thumbnails are present
-        if not os.path.exists(start_thumb_path):
-            if os.path.exists(mid_thumb_path):
-                start_thumb_path = mid_thumb_path
-            elif os.path.exists(end_thumb_path):
-                start_thumb_path = end_thumb_path
-                mid_thumb_path = end_thumb_path
-
-        if not os.path.exists(mid_thumb_path):
-            if os.path.exists(start_thumb_path):
-                mid_thumb_path = start_thumb_path
-            else:
-                start_thumb_path = end_thumb_path
-                mid_thumb_path = end_thumb_path
-
-        if not os.path.exists(end_thumb_path):
-            # use the mid frame if available or the start frame
-            if os.path.exists(mid_thumb_path):
-                end_thumb_path = mid_thumb_path
-            else:
-                mid_thumb_path = start_thumb_path
-                end_thumb_path = start_thumb_path
-
-        # now merge them
-        self.ffmpeg(**{
-            'i': [start_thumb_path, mid_thumb_path, end_thumb_path],
-            'filter_complex':
-                '[0:0]scale=3*%(tw)s/4:-1,pad=%(tw)s:%(th)s[s];'
-                '[1:0]scale=3*%(tw)s/4:-1,fade=out:300:30:alpha=1[m];'
-                '[2:0]scale=3*%(tw)s/4:-1,fade=out:300:30:alpha=1[e];'
-                '[s][e]overlay=%(tw)s/4:%(th)s-h[x];'
-                '[x][m]overlay=%(tw)s/8:%(th)s/2-h/2' %
-                {
-                    'tw': self.thumbnail_width,
-                    'th': self.thumbnail_height
-                },
-            'o': thumbnail_path
-        })
-
-        # remove the intermediate data
-        try:
-            os.remove(start_thumb_path)
-        except OSError:
-            pass
+        # seek to the start, middle and end of the file with "-ss" before
+        # "-i", so ffmpeg jumps to the nearest key frames instead of decoding
+        # the whole file, and merge them with a single filter graph
+        filter_complex = \
+            '[0:v]scale=3*%(tw)s/4:-1,pad=%(tw)s:%(th)s[s];' \
+            '[1:v]scale=3*%(tw)s/4:-1,fade=out:300:30:alpha=1[m];' \
+            '[2:v]scale=3*%(tw)s/4:-1,fade=out:300:30:alpha=1[e];' \
+            '[s][e]overlay=%(tw)s/4:%(th)s-h[x];' \
+            '[x][m]overlay=%(tw)s/8:%(th)s/2-h/2' % {
+                'tw': self.thumbnail_width,
+                'th': self.thumbnail_height
+            }
 
-        try:
-            os.remove(mid_thumb_path)
-        except OSError:
-            pass
+        timestamps = [
+            duration * 0.10,
+            duration * 0.50,
+            max(duration * 0.90 - frame_duration, 0)
+        ]
 
-        try:
-            os.remove(end_thumb_path)
-        except OSError:
-            pass
+        # if seeking fails (ex: the duration is not correct) use the first
+        # frame for all of them
+        from anima.utils.ffmpeg_runner import FFmpegError
+        for seek_timestamps in [timestamps, [0, 0, 0]]:
+            try:
+                self.ffmpeg(**{
+                    'inputs': [
+                        {'ss': '%.3f' % timestamp, 'i': file_full_path}
+                        for timestamp in seek_timestamps
+                    ],
+                    'filter_complex': filter_complex,
+                    'vframes': 1,
+                    'o': thumbnail_path
+                })
+            except FFmpegError as e:
+                logger.debug('can not generate thumbnail: %s' % e)
+            if os.path.exists(thumbnail_path):
+                break
 
         return thumbnail_path
 
@@ -641,6 +850,118 @@ class MediaManager(object):
         raise RuntimeError('%s is not an image nor a video file!' %
                            file_full_path)
 
+    def generate_media_for_web_and_thumbnail(self, file_full_path,
+                                             max_workers=None):
+        """Generates the web version and the thumbnail of the given file in
+        parallel.
+
+        The web version of a video is a full transcode and the thumbnail
+        decodes the same file again, so they are run at the same time on the
+        worker pool returned by :func:`.get_executor`.
+
+        :param str file_full_path: The full path of the image or video file.
+        :param int max_workers: The size of the worker pool, defaults to the
+          number of CPUs. Use 1 to run them one after another.
+        :returns: A tuple of the temp paths of the web version and the
+          thumbnail, the path is None for the one that can not be generated.
+        :raises RuntimeError: If neither of them can be generated, ex: the
+          file is not an image nor a video file.
+        """
+        return self.submit_media_for_web_and_thumbnail(
+            file_full_path, max_workers
+        ).result()
+
+    def submit_media_for_web_and_thumbnail(self, file_full_path,
+                                           max_workers=None):
+        """Starts generating the web version and the thumbnail of the given
+        file in parallel without waiting them to finish.
+
+        Only the media conversions are run in the worker threads, use the
+        result in the calling thread to create the database objects.
+
+        :param str file_full_path: The full path of the image or video file.
+        :param int max_workers: The size of the worker pool, defaults to the
+          number of CPUs. If it is 1 or ``concurrent.futures`` is not
+          available, they are generated one after another before returning.
+        :returns: A ``concurrent.futures.Future`` like object, its result is
+          the same with :meth:`.generate_media_for_web_and_thumbnail`.
+        """
+        generators = [self.generate_media_for_web, self.generate_thumbnail]
+
+        executor = None
+        if max_workers != 1:
+            executor = get_executor(max_workers)
+
+        if executor is None:
+            results = []
+            for generate in generators:
+                try:
+                    results.append((generate(file_full_path), None))
+                except Exception as e:
+                    results.append((None, e))
+            try:
+                return CompletedFuture(
+                    self._collect_media_results(file_full_path, results)
+                )
+            except Exception as e:
+                return CompletedFuture(exception=e)
+
+        generator_futures = [
+            executor.submit(
+                run_as_pool_worker, max_workers, generate, file_full_path
+            )
+            for generate in generators
+        ]
+
+        # combine the futures in to one
+        future = futures.Future()
+        lock = threading.Lock()
+
+        def set_result(_):
+            with lock:
+                if future.done() or \
+                   not all([f.done() for f in generator_futures]):
+                    return
+                results = [
+                    (None, f.exception()) if f.exception() is not None
+                    else (f.result(), None)
+                    for f in generator_futures
+                ]
+                try:
+                    future.set_result(
+                        self._collect_media_results(file_full_path, results)
+                    )
+                except Exception as e:
+                    future.set_exception(e)
+
+        for generator_future in generator_futures:
+            generator_future.add_done_callback(set_result)
+
+        return future
+
+    @classmethod
+    def _collect_media_results(cls, file_full_path, results):
+        """returns the paths of the generated media files
+
+        :param str file_full_path: The source file path
+        :param list results: A list of (path, exception) tuples
+        :returns: A tuple of paths, None for the failed ones
+        :raises: The first exception if all of them are failed
+        """
+        paths = []
+        for path, error in results:
+            if error is not None:
+                logger.debug(
+                    'can not generate media for %s: %s' %
+                    (file_full_path, error)
+                )
+            paths.append(path)
+
+        if all([path is None for path in paths]):
+            raise results[0][1]
+
+        return tuple(paths)
+
     @classmethod
     def generate_local_file_path(cls, extension=''):
         """Generates file paths in server side storage.
@@ -670,68 +991,218 @@ class MediaManager(object):
     def get_video_info(self, full_path):
         """Returns the video info like the duration  in seconds and fps.
 
-        Uses ffmpeg to extract information about the video file.
+        Uses ffprobe to extract information about the video file. The result
+        is cached in the ``anima.local_cache_folder`` per path, size and
+        modification time of the file, so ffprobe runs only once for the same
+        file.
 
         :param str full_path: The full path of the video file
-        :return: int
+        :return: A dictionary with "video_info" and "stream_info" keys which
+          are holding the format and the stream info of the file. The values
+          are in the format of the default ffprobe output, the tags are stored
+          as "TAG:name".
         """
+        cache = get_video_info_cache()
+        key = cache.make_key(full_path)
+        if key is not None:
+            media_info = cache.get(key)
+            if media_info is not None:
+                # do not let the caller change the cached data
+                return copy.deepcopy(media_info)
+
         output_buffer = self.ffprobe(**{
-            'show_streams': full_path,
+            'print_format': 'json',
+            'show_streams': None,
+            'show_format': None,
+            'i': full_path,
         })
+        data = json.loads(''.join(output_buffer))
 
         media_info = {
             'video_info': None,
-            'stream_info': []
+            'stream_info': [
+                self._flatten_ffprobe_section(stream)
+                for stream in data.get('streams', [])
+            ]
         }
-        video_info = {}
-        stream_info = {}
-
-        # get STREAM info
-        line = output_buffer.pop(0).strip()
-        while line is not None:
-            if line == '[STREAM]':
-                # pop until you find [/STREAM]
-                while line != '[/STREAM]':
-                    if '=' in line:
-                        flag, value = line.split('=')
-                        stream_info[flag] = value
-                    line = output_buffer.pop(0).strip()
-
-                copy_stream = copy.deepcopy(stream_info)
-                media_info['stream_info'].append(copy_stream)
-                stream_info = {}
-            try:
-                line = output_buffer.pop(0).strip()
-            except IndexError:
-                line = None
+        if 'format' in data:
+            media_info['video_info'] = \
+                self._flatten_ffprobe_section(data['format'])
 
-        # also get FORMAT info
-        output_buffer = self.ffprobe(**{
-            'show_format': full_path,
-        })
+        if key is not None:
+            cache.set(key, media_info)
+            media_info = copy.deepcopy(media_info)
+
+        return media_info
+
+    @classmethod
+    def _flatten_ffprobe_section(cls, section):
+        """Converts the given section of the ffprobe JSON output to the
+        format of the default ffprobe output, where all the values are strings
+        and the tags are stored as "TAG:name".
+
+        :param dict section: A stream or the format section
+        :returns: dict
+        """
+        result = {}
+        for key, value in section.items():
+            if isinstance(value, dict):
+                prefix = 'TAG' if key == 'tags' else key.upper()
+                for sub_key, sub_value in value.items():
+                    result['%s:%s' % (prefix, sub_key)] = \
+                        cls._to_ffprobe_value(sub_value)
+            else:
+                result[key] = cls._to_ffprobe_value(value)
+        return result
+
+    @classmethod
+    def _to_ffprobe_value(cls, value):
+        """returns the given JSON value as a string
+        """
+        if isinstance(value, basestring):
+            return value
+        return str(value)
+
+    @classmethod
+    def get_video_stream_info(cls, media_info):
+        """Returns the size and the frame count of the video stream in the
+        given media info.
+
+        :param dict media_info: The media info returned by
+          :meth:`.get_video_info`
+        :returns: A dictionary with "width", "height", "nb_frames",
+          "frame_rate" and "duration" keys or None if there is no video
+          stream.
+        """
+        video_info = media_info['video_info'] or {}
+
+        # get the correct stream
+        video_stream = None
+        for stream in media_info['stream_info']:
+            if stream.get('codec_type') == 'video':
+                video_stream = stream
+
+        if video_stream is None:
+            return None
+
+        # first try to use "r_frame_rate"
+        frame_rate = video_stream.get('r_frame_rate')
+        if frame_rate is not None and '/' in frame_rate:
+            # it is in Number/Number format
+            nominator, denominator = frame_rate.split('/')
+            if float(denominator):
+                frame_rate = float(nominator) / float(denominator)
+            else:  # 0/0 for still images
+                frame_rate = None
+        elif frame_rate is not None:
+            frame_rate = float(frame_rate)
+
+        if not frame_rate:  # still no frame rate
+            # try to use the video_info to get the frame rate
+            frame_rate = float(video_info.get('TAG:framerate', 23.976))
+
+        # get duration
+        duration = video_stream.get('duration')
+        if duration is None or duration == 'N/A':  # no duration
+            duration = video_info.get('duration')
+            if duration is None or duration == 'N/A':
+                duration = 1
+        duration = float(duration)
+
+        nb_frames = video_stream.get('nb_frames')
+        if nb_frames is None or nb_frames == 'N/A':
+            # no nb_frames
+            # at this stage we should have enough info, may not be correct but
+            # we should have something
+            # calculate nb_frames
+            logger.debug('duration  : %s' % duration)
+            logger.debug('frame_rate: %s' % frame_rate)
+            nb_frames = int(duration * frame_rate)
+
+        width = video_stream.get('width')
+        height = video_stream.get('height')
+        return {
+            'width': int(width) if width else None,
+            'height': int(height) if height else None,
+            'nb_frames': int(nb_frames),
+            'frame_rate': frame_rate,
+            'duration': duration
+        }
 
-        line = output_buffer.pop(0).strip()
-        while line is not None:
-            if line == '[FORMAT]':
-                # pop until you find [/FORMAT]
-                while line != '[/FORMAT]':
-                    if '=' in line:
-                        flag, value = line.split('=')
-                        video_info[flag] = value
-                    line = output_buffer.pop(0).strip()
-
-                media_info['video_info'] = video_info
+    def probe_video(self, full_path):
+        """Returns the size and the frame count of the given video file.
+
+        The ffprobe results are cached by :meth:`.get_video_info`, so the same
+        file is probed only once.
+
+        :param str full_path: The full path of the video file
+        :returns: A dictionary with "width", "height" and "nb_frames" keys,
+          see :meth:`.get_video_stream_info`
+        """
+        return self.get_video_stream_info(self.get_video_info(full_path))
+
+    def probe_videos(self, paths, max_workers=None):
+        """Probes the given video files in parallel with
+        :meth:`.probe_video`.
+
+        The same file is probed only once, and a file which can not be probed
+        does not stop the others.
+
+        :param paths: A list of video file paths
+        :param int max_workers: The maximum number of ``ffprobe`` processes
+          running at the same time, defaults to the number of CPUs.
+        :returns: A dictionary of path and probe result pairs, the result is
+          None for the files that can not be probed.
+        """
+        unique_paths = []
+        seen = set()
+        for path in paths:
+            if path not in seen:
+                seen.add(path)
+                unique_paths.append(path)
+
+        def probe(path):
             try:
-                line = output_buffer.pop(0).strip()
-            except IndexError:
-                line = None
+                return self.probe_video(path)
+            except (IndexError, KeyError, ValueError, OSError) as e:
+                logger.debug('can not probe %s: %s' % (path, e))
+                return None
+
+        executor = None
+        if max_workers != 1 and len(unique_paths) > 1:
+            executor = get_executor(max_workers)
+
+        # write the cache file once for all the files
+        with get_video_info_cache().batch():
+            if executor is None:
+                results = [probe(path) for path in unique_paths]
+            else:
+                results = list(executor.map(probe, unique_paths))
 
-        return media_info
+        return dict(zip(unique_paths, results))
 
-    def ffmpeg(self, **kwargs):
+    @perf.profile('MediaManager.ffmpeg')
+    def ffmpeg(self, progress_callback=None, process_timeout=None, **kwargs):
         """A simple python wrapper for ``ffmpeg`` command.
+
+        It is run with :class:`anima.utils.ffmpeg_runner.FFmpegProcess`.
+
+        :param progress_callback: A callable accepting an
+          :class:`anima.utils.ffmpeg_runner.FFmpegProgress` instance, it is
+          called from a background thread.
+        :param float process_timeout: The process is killed if it is not
+          finished in the given seconds. It is not named ``timeout`` to not to
+          shadow the ``-timeout`` flag of ffmpeg.
+        :returns: The last lines of the stderr output.
+        :raises anima.utils.ffmpeg_runner.FFmpegError: If ffmpeg fails.
         """
-        # there is only one special keyword called 'o'
+        # there are two special keywords called 'o' and 'inputs'
+        #
+        # 'inputs' is a list of dictionaries holding the options of each
+        # input file, they are placed in the given order and the 'i' key is
+        # placed last, so the options are applied to that input, ex:
+        #
+        #   inputs=[{'ss': 10, 'i': 'a.mov'}] -> -ss 10 -i a.mov
 
         # this will raise KeyError if there is no 'o' key which is good to
         # prevent the rest to execute
@@ -742,7 +1213,16 @@ class MediaManager(object):
             pass
 
         # generate args
-        args = [self.ffmpeg_command_path]
+        args = []
+        for input_options in kwargs.pop('inputs', []):
+            input_options = dict(input_options)
+            input_path = input_options.pop('i')
+            for key in input_options:
+                args.append('-' + key)
+                args.append(str(input_options[key]))
+            args.append('-i')
+            args.append(input_path)
+
         for key in kwargs:
             flag = '-' + key
             value = kwargs[key]
@@ -762,11 +1242,10 @@ class MediaManager(object):
 
         # if output format is not a jpg or png
         if output.split('.')[-1] not in ['jpg', 'jpeg', 'png', 'tga']:
-            # use all cpus
-            import multiprocessing
-            num_of_threads = multiprocessing.cpu_count()
+            # use all cpus, or the share of this worker when it is run in a
+            # worker pool, so the ffmpeg processes do not oversubscribe them
             args.append('-threads')
-            args.append('%s' % num_of_threads)
+            args.append('%s' % get_thread_count())
 
         # overwrite any file
         args.append('-y')
@@ -775,38 +1254,28 @@ class MediaManager(object):
         if output != '' and output is not None:  # for info only
             args.append(output)
 
-        logger.debug('calling ffmpeg with args: %s' % args)
-
-        process = subprocess.Popen(args, stderr=subprocess.PIPE)
-
-        # loop until process finishes and capture stderr output
-        stderr_buffer = []
-        while True:
-            stderr = process.stderr.readline()
-
-            if stderr == '' and process.poll() is not None:
-                break
-
-            if stderr != '':
-                stderr_buffer.append(stderr)
-
-        # if process.returncode:
-        #     # there is an error
-        #     raise RuntimeError(stderr_buffer)
-
-        logger.debug(stderr_buffer)
-        logger.debug('process completed!')
-        return stderr_buffer
+        from anima.utils.ffmpeg_runner import FFmpegProcess
+        process = FFmpegProcess(
+            args,
+            progress_callback=progress_callback,
+            timeout=process_timeout,
+            command_path=self.ffmpeg_command_path
+        )
+        return process.run()
 
     def ffprobe(self, **kwargs):
         """A simple python wrapper for ``ffprobe`` command.
+
+        The flags with None values are passed without a value.
         """
         # generate args
         args = [self.ffprobe_command_path]
         for key in kwargs:
             flag = '-' + key
             value = kwargs[key]
-            if not isinstance(value, list):
+            if value is None:
+                args.append(flag)
+            elif not isinstance(value, list):
                 # append the flag
                 args.append(flag)
                 # append the value
@@ -861,7 +1330,7 @@ class MediaManager(object):
         }
         conversion_options.update(options)
 
-        cls.ffmpeg(**conversion_options)
+        cls().ffmpeg(**conversion_options)
 
         return output_path
 
@@ -985,7 +1454,7 @@ class MediaManager(object):
         }
         conversion_options.update(options)
 
-        cls.ffmpeg(**conversion_options)
+        cls().ffmpeg(**conversion_options)
 
         return output_path
 
@@ -1146,7 +1615,8 @@ class MediaManager(object):
 
         return file_full_path
 
-    def upload_reference(self, task, file_object, filename):
+    def upload_reference(self, task, file_object, filename,
+                         max_workers=None):
         """Uploads a reference for the given task to
         Task.path/References/Stalker_Pyramid/ folder and create a Link object
         to there. Again the Link object will have a Repository root relative
@@ -1163,8 +1633,32 @@ class MediaManager(object):
         :param file_object: The file like object holding the content of the
           uploaded file.
         :param str filename: The original filename.
+        :param int max_workers: The size of the worker pool that the web
+          version and the thumbnail are generated in, defaults to the number
+          of CPUs.
         :returns: :class:`.Link` instance.
         """
+        return self.start_upload_reference(
+            task, file_object, filename, max_workers
+        ).finish()
+
+    def start_upload_reference(self, task, file_object, filename,
+                               max_workers=None):
+        """Uploads a reference like :meth:`.upload_reference` but returns
+        before the web version and the thumbnail are generated.
+
+        :param task: The task that a reference is uploaded to.
+        :type task: :class:`.Task`
+        :param file_object: The file like object holding the content of the
+          uploaded file.
+        :param str filename: The original filename.
+        :param int max_workers: The size of the worker pool that the web
+          version and the thumbnail are generated in, defaults to the number
+          of CPUs.
+        :returns: :class:`.MediaUpload` instance, call its
+          :meth:`.MediaUpload.finish` method in the thread owning the
+          database session to get the :class:`.Link`.
+        """
         ############################################################
         # ORIGINAL
         ############################################################
@@ -1194,77 +1688,99 @@ class MediaManager(object):
         # create a thumbnail for the given reference
         # don't forget that the first thumbnail is the Web viewable version
         # and the second thumbnail is the thumbnail
+        def link_media(future):
+            web_version_temp_full_path, thumbnail_temp_full_path = \
+                future.result()
+
+            ########################################################
+            # WEB VERSION
+            ########################################################
+            web_version_link = None
+            if web_version_temp_full_path is not None:
+                web_version_extension = \
+                    os.path.splitext(web_version_temp_full_path)[-1]
+
+                web_version_file_name = '%s%s' % (reference_file_base_name,
+                                                  web_version_extension)
+                web_version_full_path = \
+                    os.path.join(
+                        os.path.dirname(reference_file_full_path),
+                        'ForWeb',
+                        web_version_file_name
+                    )
+                web_version_repo_relative_full_path = \
+                    repo.make_relative(web_version_full_path)
+                web_version_link = Link(
+                    full_path=web_version_repo_relative_full_path,
+                    original_filename=web_version_file_name
+                )
 
-        ############################################################
-        # WEB VERSION
-        ############################################################
-        web_version_temp_full_path = \
-            self.generate_media_for_web(reference_file_full_path)
-        web_version_extension = \
-            os.path.splitext(web_version_temp_full_path)[-1]
-
-        web_version_file_name = '%s%s' % (reference_file_base_name,
-                                          web_version_extension)
-        web_version_full_path = \
-            os.path.join(
-                os.path.dirname(reference_file_full_path),
-                'ForWeb',
-                web_version_file_name
-            )
-        web_version_repo_relative_full_path = \
-            repo.make_relative(web_version_full_path)
-        web_version_link = Link(
-            full_path=web_version_repo_relative_full_path,
-            original_filename=web_version_file_name
-        )
+                # move it to repository
+                self.move_to_repository(web_version_temp_full_path,
+                                        web_version_full_path)
+
+            ########################################################
+            # THUMBNAIL
+            ########################################################
+            thumbnail_link = None
+            if thumbnail_temp_full_path is not None:
+                thumbnail_extension = \
+                    os.path.splitext(thumbnail_temp_full_path)[-1]
+                thumbnail_file_name = '%s%s' % (reference_file_base_name,
+                                                thumbnail_extension)
+
+                thumbnail_full_path = \
+                    os.path.join(
+                        os.path.dirname(reference_file_full_path),
+                        'Thumbnail',
+                        thumbnail_file_name
+                    )
+                thumbnail_repo_relative_full_path = \
+                    repo.make_relative(thumbnail_full_path)
+                thumbnail_link = Link(
+                    full_path=thumbnail_repo_relative_full_path,
+                    original_filename=thumbnail_file_name
+                )
 
-        # move it to repository
-        try:
-            os.makedirs(os.path.dirname(web_version_full_path))
-        except OSError:  # path exists
-            pass
-        shutil.move(web_version_temp_full_path, web_version_full_path)
+                # move it to repository
+                self.move_to_repository(thumbnail_temp_full_path,
+                                        thumbnail_full_path)
+
+            ########################################################
+            # LINK Objects
+            ########################################################
+            # link them, the thumbnail is reached through the web version
+            # or directly if there is no web version
+            if web_version_link is not None:
+                link.thumbnail = web_version_link
+                web_version_link.thumbnail = thumbnail_link
+            else:
+                link.thumbnail = thumbnail_link
 
-        ############################################################
-        # THUMBNAIL
-        ############################################################
-        # finally generate a Thumbnail
-        thumbnail_temp_full_path = \
-            self.generate_thumbnail(reference_file_full_path)
-        thumbnail_extension = os.path.splitext(thumbnail_temp_full_path)[-1]
-        thumbnail_file_name = '%s%s' % (reference_file_base_name,
-                                        thumbnail_extension)
-
-        thumbnail_full_path = \
-            os.path.join(
-                os.path.dirname(reference_file_full_path),
-                'Thumbnail',
-                thumbnail_file_name
-            )
-        thumbnail_repo_relative_full_path = \
-            repo.make_relative(thumbnail_full_path)
-        thumbnail_link = Link(
-            full_path=thumbnail_repo_relative_full_path,
-            original_filename=thumbnail_file_name
+            # assign it as a reference to the given task
+            task.references.append(link)
+
+        return MediaUpload(
+            link,
+            self.submit_media_for_web_and_thumbnail(
+                reference_file_full_path, max_workers
+            ),
+            link_media
         )
 
-        # move it to repository
+    @classmethod
+    def move_to_repository(cls, temp_full_path, full_path):
+        """moves the given generated file to the given repository path by
+        creating the missing folders
+
+        :param str temp_full_path: The path of the generated file.
+        :param str full_path: The path in the repository.
+        """
         try:
-            os.makedirs(os.path.dirname(thumbnail_full_path))
+            os.makedirs(os.path.dirname(full_path))
         except OSError:  # path exists
             pass
-        shutil.move(thumbnail_temp_full_path, thumbnail_full_path)
-
-        ############################################################
-        # LINK Objects
-        ############################################################
-        # link them
-        # assign it as a reference to the given task
-        task.references.append(link)
-        link.thumbnail = web_version_link
-        web_version_link.thumbnail = thumbnail_link
-
-        return link
+        shutil.move(temp_full_path, full_path)
 
     def upload_version(self, task, file_object, take_name=None, extension=''):
         """Uploads versions to the Task.path/ folder and creates a Version
@@ -1297,7 +1813,8 @@ class MediaManager(object):
 
         return v
 
-    def upload_version_output(self, version, file_object, filename):
+    def upload_version_output(self, version, file_object, filename,
+                              max_workers=None):
         """Uploads a file as an output for the given :class:`.Version`
         instance. Will store the file in
         {{Version.absolute_path}}/Outputs/Stalker_Pyramid/ folder.
@@ -1313,8 +1830,33 @@ class MediaManager(object):
         :param file_object: The file like object holding the content of the
           uploaded file.
         :param str filename: The original filename.
+        :param int max_workers: The size of the worker pool that the web
+          version and the thumbnail are generated in, defaults to the number
+          of CPUs.
         :returns: :class:`.Link` instance.
         """
+        return self.start_upload_version_output(
+            version, file_object, filename, max_workers
+        ).finish()
+
+    def start_upload_version_output(self, version, file_object, filename,
+                                    max_workers=None):
+        """Uploads a version output like :meth:`.upload_version_output` but
+        returns before the web version and the thumbnail are generated.
+
+        :param version: A :class:`.Version` instance that the output is
+          uploaded for.
+        :type version: :class:`.Version`
+        :param file_object: The file like object holding the content of the
+          uploaded file.
+        :param str filename: The original filename.
+        :param int max_workers: The size of the worker pool that the web
+          version and the thumbnail are generated in, defaults to the number
+          of CPUs.
+        :returns: :class:`.MediaUpload` instance, call its
+          :meth:`.MediaUpload.finish` method in the thread owning the
+          database session to get the :class:`.Link`.
+        """
         ############################################################
         # ORIGINAL
         ############################################################
@@ -1347,82 +1889,87 @@ class MediaManager(object):
         # create a thumbnail for the given version output
         # don't forget that the first thumbnail is the Web viewable version
         # and the second thumbnail is the thumbnail
-
-        ############################################################
-        # WEB VERSION
-        ############################################################
-        web_version_link = None
-        try:
-            web_version_temp_full_path = \
-                self.generate_media_for_web(version_output_file_full_path)
-            web_version_extension = \
-                os.path.splitext(web_version_temp_full_path)[-1]
-            web_version_full_path = \
-                os.path.join(
-                    os.path.dirname(version_output_file_full_path),
-                    'ForWeb',
-                    version_output_base_name + web_version_extension
-                )
-
-            web_version_link = Link(
-                full_path=repo.to_os_independent_path(web_version_full_path),
-                original_filename=filename
-            )
-
-            # move it to repository
+        def link_media(future):
             try:
-                os.makedirs(os.path.dirname(web_version_full_path))
-            except OSError:  # path exists
-                pass
-            shutil.move(web_version_temp_full_path, web_version_full_path)
-        except RuntimeError:
-            # not an image or video so skip it
-            pass
-
-        ############################################################
-        # THUMBNAIL
-        ############################################################
-        # finally generate a Thumbnail
-        thumbnail_link = None
-        try:
-            thumbnail_temp_full_path = \
-                self.generate_thumbnail(version_output_file_full_path)
-            thumbnail_extension = os.path.splitext(thumbnail_temp_full_path)[-1]
-
-            thumbnail_full_path = \
-                os.path.join(
-                    os.path.dirname(version_output_file_full_path),
-                    'Thumbnail',
-                    version_output_base_name + thumbnail_extension
+                web_version_temp_full_path, thumbnail_temp_full_path = \
+                    future.result()
+            except RuntimeError:
+                # not an image or video so skip it
+                version.outputs.append(link)
+                return
+
+            ########################################################
+            # WEB VERSION
+            ########################################################
+            web_version_link = None
+            if web_version_temp_full_path is not None:
+                web_version_extension = \
+                    os.path.splitext(web_version_temp_full_path)[-1]
+                web_version_full_path = \
+                    os.path.join(
+                        os.path.dirname(version_output_file_full_path),
+                        'ForWeb',
+                        version_output_base_name + web_version_extension
+                    )
+
+                web_version_link = Link(
+                    full_path=repo.to_os_independent_path(
+                        web_version_full_path
+                    ),
+                    original_filename=filename
                 )
 
-            thumbnail_link = Link(
-                full_path=repo.to_os_independent_path(thumbnail_full_path),
-                original_filename=filename
-            )
-
-            # move it to repository
-            try:
-                os.makedirs(os.path.dirname(thumbnail_full_path))
-            except OSError:  # path exists
-                pass
-            shutil.move(thumbnail_temp_full_path, thumbnail_full_path)
-        except RuntimeError:
-            # not an image or video so skip it
-            pass
+                # move it to repository
+                self.move_to_repository(web_version_temp_full_path,
+                                        web_version_full_path)
+
+            ########################################################
+            # THUMBNAIL
+            ########################################################
+            thumbnail_link = None
+            if thumbnail_temp_full_path is not None:
+                thumbnail_extension = \
+                    os.path.splitext(thumbnail_temp_full_path)[-1]
+
+                thumbnail_full_path = \
+                    os.path.join(
+                        os.path.dirname(version_output_file_full_path),
+                        'Thumbnail',
+                        version_output_base_name + thumbnail_extension
+                    )
+
+                thumbnail_link = Link(
+                    full_path=repo.to_os_independent_path(
+                        thumbnail_full_path
+                    ),
+                    original_filename=filename
+                )
 
-        ############################################################
-        # LINK Objects
-        ############################################################
-        # link them
-        # assign it as an output to the given version
-        version.outputs.append(link)
-        if web_version_link:
-            link.thumbnail = web_version_link
-            if thumbnail_link:
+                # move it to repository
+                self.move_to_repository(thumbnail_temp_full_path,
+                                        thumbnail_full_path)
+
+            ########################################################
+            # LINK Objects
+            ########################################################
+            # link them, the thumbnail is reached through the web version
+            # or directly if there is no web version
+            if web_version_link is not None:
+                link.thumbnail = web_version_link
                 web_version_link.thumbnail = thumbnail_link
+            else:
+                link.thumbnail = thumbnail_link
 
-        return link
+            # assign it as an output to the given version
+            version.outputs.append(link)
+
+        return MediaUpload(
+            link,
+            self.submit_media_for_web_and_thumbnail(
+                version_output_file_full_path, max_workers
+            ),
+            link_media
+        )
 
 
 class Exposure(object):
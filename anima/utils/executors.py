@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+"""The shared worker pools of anima.
+
+This module is kept small and free of the Stalker and host application code
+of :mod:`anima.utils`, so low level modules like
+``anima.render.arnold.base85`` and ``anima.utils.parallel_gzip`` can use the
+same executors with :func:`get_executor`.
+
+The executors are shared, so a job running in a worker should not submit
+new jobs to them and wait for the results, as all the workers may end up
+waiting for each other. The thread pool workers are marked, use
+:func:`is_pool_worker` to run the work in the calling thread instead.
+"""
+
+import multiprocessing
+import threading
+
+try:
+    from concurrent import futures
+except ImportError:
+    futures = None
+
+
+__executors = {}
+__executors_lock = threading.Lock()
+__pool_worker = threading.local()
+
+
+def _run_in_pool(fn, args, kwargs):
+    """runs the given function in a pool worker thread by marking the thread
+    """
+    __pool_worker.in_pool = True
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        __pool_worker.in_pool = False
+
+
+if futures is not None:
+    class _ThreadPoolExecutor(futures.ThreadPoolExecutor):
+        """A ThreadPoolExecutor marking its worker threads while they are
+        running a job, see :func:`is_pool_worker`
+        """
+
+        def submit(self, fn, *args, **kwargs):
+            return super(_ThreadPoolExecutor, self).submit(
+                _run_in_pool, fn, args, kwargs
+            )
+
+
+def get_executor(max_workers=None, use_processes=False):
+    """Returns a reusable ``concurrent.futures`` executor.
+
+    This is the only executor registry of anima, the executors are created
+    once per (kind, max_workers) pair and are shared by all the modules
+    (ex: ``anima.render.arnold.base85``, ``anima.utils.parallel_gzip`` and
+    :class:`anima.utils.MediaManager`), so they do not create a pool each.
+
+    :param int max_workers: The number of workers, defaults to the number of
+      CPUs.
+    :param bool use_processes: If True a ProcessPoolExecutor is returned,
+      otherwise a ThreadPoolExecutor. Threads are enough for running external
+      processes like ``ffmpeg`` or for code releasing the GIL like zlib and
+      NumPy, and they do not need to spawn new interpreters, which is
+      troublesome inside host applications.
+    :returns: A ``concurrent.futures.Executor`` instance or None if
+      ``concurrent.futures`` is not available.
+    """
+    if futures is None:
+        return None
+
+    if max_workers is None:
+        max_workers = multiprocessing.cpu_count()
+
+    key = (use_processes, max_workers)
+    with __executors_lock:
+        executor = __executors.get(key)
+        if executor is None:
+            if use_processes:
+                executor = futures.ProcessPoolExecutor(max_workers)
+            else:
+                executor = _ThreadPoolExecutor(max_workers)
+            __executors[key] = executor
+    return executor
+
+
+def shutdown_executors():
+    """Shuts down all the executors created by :func:`get_executor`
+    """
+    with __executors_lock:
+        for executor in __executors.values():
+            executor.shutdown()
+        __executors.clear()
+
+
+def is_pool_worker():
+    """Returns True if it is called from a job running in a thread pool of
+    :func:`get_executor`. Waiting for other jobs of the shared pools in such
+    a job may deadlock, so the work should be done in the calling thread.
+    """
+    return getattr(__pool_worker, 'in_pool', False)
+
+
+def run_as_pool_worker(max_workers, func, *args, **kwargs):
+    """Runs the given callable as one of the max_workers jobs running at the
+    same time, submit it to the executors of :func:`get_executor` like::
+
+      executor.submit(run_as_pool_worker, max_workers, func, arg1, arg2)
+
+    While the callable is running :func:`get_thread_count` returns the share
+    of the current thread from the CPUs, so the jobs running external
+    multi threaded processes like ``ffmpeg`` do not use all the CPUs each.
+
+    :param int max_workers: The number of workers of the executor, defaults
+      to the number of CPUs.
+    :param func: The callable to run, the rest of the arguments are passed to
+      it.
+    :returns: The return value of the callable.
+    """
+    if max_workers is None:
+        max_workers = multiprocessing.cpu_count()
+
+    __pool_worker.max_workers = max_workers
+    try:
+        return func(*args, **kwargs)
+    finally:
+        del __pool_worker.max_workers
+
+
+def get_thread_count():
+    """Returns the number of threads that a CPU bound job should use in the
+    current thread.
+
+    It is the number of CPUs, or the share of one worker from the CPUs (but
+    at least 1) if it is called from a job run with
+    :func:`run_as_pool_worker`.
+    """
+    cpu_count = multiprocessing.cpu_count()
+
+    max_workers = getattr(__pool_worker, 'max_workers', None)
+    if max_workers:
+        return max(1, cpu_count // max_workers)
+
+    return cpu_count
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+"""ffmpeg runner.
+
+:class:`.FFmpegProcess` runs ``ffmpeg`` with ``-progress pipe:1`` and reads
+its stdout and stderr in background threads, so the caller is not busy
+waiting on the pipes. The progress blocks written by ffmpeg are passed to a
+callback as :class:`.FFmpegProgress` instances, only the last lines of the
+stderr are kept and an :class:`.FFmpegError` is raised if ffmpeg fails, times
+out or is cancelled::
+
+  from anima.utils import ffmpeg_runner
+
+  def report(progress):
+      print('%s %s %s' % (progress.frame, progress.out_time, progress.speed))
+
+  process = ffmpeg_runner.FFmpegProcess(
+      ['-i', 'in.mov', '-vcodec', 'libvpx', '-y', 'out.webm'],
+      progress_callback=report,
+      timeout=600
+  )
+  process.run()
+
+Several conversions can be run at the same time on the shared executor of
+:func:`anima.utils.get_executor`::
+
+  from anima.utils import get_executor
+
+  executor = get_executor()
+  processes = [ffmpeg_runner.FFmpegProcess(args) for args in all_args]
+  for process in processes:
+      executor.submit(process.run)
+  for process in processes:
+      process.wait()
+"""
+
+import collections
+import subprocess
+import sys
+import threading
+
+from anima import logger
+
+
+default_command_path = 'ffmpeg'
+default_stderr_buffer_size = 100
+
+
+class FFmpegError(RuntimeError):
+    """Raised when ffmpeg exits with an error
+
+    :param str message: The error message.
+    :param list args: The command line arguments of the process.
+    :param int returncode: The exit code of the process.
+    :param list stderr: The last lines of the stderr output.
+    """
+
+    def __init__(self, message, args=None, returncode=None, stderr=None):
+        super(FFmpegError, self).__init__(message)
+        self.command = args or []
+        self.returncode = returncode
+        self.stderr = stderr or []
+
+    def __str__(self):
+        message = super(FFmpegError, self).__str__()
+        if self.stderr:
+            message = '%s\n%s' % (message, ''.join(self.stderr[-10:]))
+        return message
+
+
+class FFmpegTimeoutError(FFmpegError):
+    """Raised when ffmpeg does not finish in the given time
+    """
+    pass
+
+
+class FFmpegCancelledError(FFmpegError):
+    """Raised when the process is cancelled with :meth:`.FFmpegProcess.cancel`
+    """
+    pass
+
+
+class FFmpegProgress(object):
+    """A progress report of ffmpeg
+
+    :param dict values: The key/value pairs of a progress block written by
+      ``-progress``.
+    """
+
+    __slots__ = ('frame', 'fps', 'out_time', 'speed', 'total_size', 'done',
+                 'values')
+
+    def __init__(self, values):
+        self.values = values
+        self.frame = self._to_number(values.get('frame'), int)
+        self.fps = self._to_number(values.get('fps'), float)
+        # out_time_ms is in microseconds despite its name
+        out_time_us = self._to_number(
+            values.get('out_time_us', values.get('out_time_ms')), int
+        )
+        self.out_time = \
+            out_time_us / 1000000.0 if out_time_us is not None else None
+        self.speed = self._to_number(values.get('speed', '').rstrip('x'),
+                                     float)
+        self.total_size = self._to_number(values.get('total_size'), int)
+        self.done = values.get('progress') == 'end'
+
+    @classmethod
+    def _to_number(cls, value, type_):
+        """returns the given value converted with type_ or None if it is not
+        a valid number (ex: "N/A")
+        """
+        try:
+            return type_(value)
+        except (TypeError, ValueError):
+            return None
+
+
+class FFmpegProcess(object):
+    """Runs an ffmpeg process
+
+    :param list args: The arguments of ffmpeg without the command itself.
+    :param progress_callback: A callable accepting an :class:`.FFmpegProgress`
+      instance, it is called from a background thread.
+    :param float timeout: The process is killed and an
+      :class:`.FFmpegTimeoutError` is raised if it is not finished in the
+      given seconds. None (the default) means no timeout.
+    :param int stderr_buffer_size: The number of the last stderr lines to
+      keep.
+    :param str command_path: The path of the ffmpeg executable.
+    """
+
+    def __init__(self, args, progress_callback=None, timeout=None,
+                 stderr_buffer_size=default_stderr_buffer_size,
+                 command_path=default_command_path):
+        self.args = list(args)
+        self.progress_callback = progress_callback
+        self.timeout = timeout
+        self.command_path = command_path
+        self.stderr = collections.deque(maxlen=stderr_buffer_size)
+        self.returncode = None
+        self.error = None
+        self._exc_info = None
+
+        self._process = None
+        self._cancelled = False
+        self._timed_out = False
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    @property
+    def command(self):
+        """returns the full command line as a list
+        """
+        return [self.command_path, '-nostdin', '-nostats',
+                '-progress', 'pipe:1'] + self.args
+
+    def run(self):
+        """runs the process and waits until it is finished
+
+        :returns: The last lines of the stderr output.
+        :raises FFmpegError: If ffmpeg exits with a non-zero code, times out
+          or is cancelled.
+        """
+        try:
+            self._run()
+        except OSError as e:  # no ffmpeg
+            self.error = FFmpegError(
+                'can not run ffmpeg: %s' % e, self.command
+            )
+            self._exc_info = \
+                (FFmpegError, self.error, sys.exc_info()[2])
+        except Exception as e:
+            self.error = e
+            # keep the traceback to raise the error with it in any thread
+            self._exc_info = sys.exc_info()
+        finally:
+            self._finished.set()
+
+        return self._result()
+
+    def _result(self):
+        """returns the last lines of the stderr output or raises the error
+        with its original traceback if the process is failed
+        """
+        if self._exc_info is not None:
+            exc_type, exc_value, exc_traceback = self._exc_info
+            raise exc_type, exc_value, exc_traceback
+
+        return list(self.stderr)
+
+    def _run(self):
+        """runs the process
+        """
+        command = self.command
+        logger.debug('calling ffmpeg with args: %s' % command)
+
+        with self._lock:
+            if self._cancelled:
+                raise FFmpegCancelledError('ffmpeg is cancelled', command)
+            self._process = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+
+        readers = [
+            threading.Thread(target=self._read_progress,
+                             args=(self._process.stdout,)),
+            threading.Thread(target=self._read_stderr,
+                             args=(self._process.stderr,))
+        ]
+        for reader in readers:
+            reader.daemon = True
+            reader.start()
+
+        timer = None
+        if self.timeout is not None:
+            timer = threading.Timer(self.timeout, self._kill_on_timeout)
+            timer.daemon = True
+            timer.start()
+
+        try:
+            self.returncode = self._process.wait()
+            for reader in readers:
+                reader.join()
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+        stderr = list(self.stderr)
+        logger.debug(stderr)
+        logger.debug('process completed!')
+
+        if self._cancelled:
+            raise FFmpegCancelledError(
+                'ffmpeg is cancelled', command, self.returncode, stderr
+            )
+
+        if self._timed_out:
+            raise FFmpegTimeoutError(
+                'ffmpeg did not finish in %s seconds' % self.timeout,
+                command, self.returncode, stderr
+            )
+
+        if self.returncode:
+            raise FFmpegError(
+                'ffmpeg exited with code %s' % self.returncode,
+                command, self.returncode, stderr
+            )
+
+    def _read_progress(self, pipe):
+        """reads the progress blocks from the given pipe and calls the
+        progress callback
+        """
+        values = {}
+        for line in iter(pipe.readline, ''):
+            key, sep, value = line.strip().partition('=')
+            if not sep:
+                continue
+            values[key] = value
+            if key == 'progress':
+                # end of a block
+                if self.progress_callback is not None:
+                    try:
+                        self.progress_callback(FFmpegProgress(values))
+                    except Exception as e:
+                        logger.error('ffmpeg progress callback failed: %s' % e)
+                values = {}
+        pipe.close()
+
+    def _read_stderr(self, pipe):
+        """reads the given pipe to the stderr ring buffer
+        """
+        for line in iter(pipe.readline, ''):
+            self.stderr.append(line)
+        pipe.close()
+
+    def _kill_on_timeout(self):
+        """kills the process when the timeout is reached
+        """
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                self._timed_out = True
+                self._kill()
+
+    def _kill(self):
+        """kills the process, the lock should be acquired
+        """
+        try:
+            self._process.kill()
+        except OSError:  # already finished
+            pass
+
+    def cancel(self):
+        """cancels the process, it is safe to call it from any thread and
+        before the process is started.
+        """
+        with self._lock:
+            self._cancelled = True
+            if self._process is not None and self._process.poll() is None:
+                self._kill()
+
+    @property
+    def cancelled(self):
+        """returns True if the process is cancelled
+        """
+        return self._cancelled
+
+    def done(self):
+        """returns True if the process is finished
+        """
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """waits until the process is run and finished, use it with the
+        processes run in another thread, ex: submitted to an executor of
+        :func:`anima.utils.get_executor`
+
+        :param float timeout: The maximum number of seconds to wait, None
+          means wait forever.
+        :returns: The last lines of the stderr output.
+        :raises FFmpegError: If the process is failed.
+        """
+        if not self._finished.wait(timeout):
+            raise FFmpegTimeoutError(
+                'ffmpeg is not finished in %s seconds' % timeout,
+                self.command, None, list(self.stderr)
+            )
+
+        return self._result()
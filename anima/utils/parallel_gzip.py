@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+"""Parallel gzip writer.
+
+The data written to a :class:`.ParallelGzipFile` is split in to independent
+blocks which are compressed on a thread pool and written to the file in order
+as separate gzip members. Concatenated gzip members are a valid gzip file, so
+the result can be read with ``gzip.open``, ``zcat`` or any zlib based reader
+(ex: Arnold .ass.gz files).
+
+zlib releases the GIL while compressing, so threads are enough to use all the
+cores.
+
+Usage::
+
+  from anima.utils import parallel_gzip
+
+  with parallel_gzip.open('/tmp/test.ass.gz', 'wb', compresslevel=6) as f:
+      f.write(data)
+"""
+
+import multiprocessing
+import zlib
+
+from anima.utils.executors import get_executor, is_pool_worker
+
+
+_builtin_open = open
+
+default_block_size = 1048576
+default_compresslevel = 9
+
+# wbits value for zlib to write a gzip header and trailer
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def compress_member(data, compresslevel=default_compresslevel):
+    """Compresses the given data as a complete gzip member
+
+    :param str data: The data to compress
+    :param int compresslevel: The compression level from 0 to 9
+    :returns: str
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ParallelGzipFile(object):
+    """A write only file like object which compresses the written data as a
+    multi-member gzip file on a thread pool.
+
+    :param str filename: The path of the file. It is not used if fileobj is
+      given.
+    :param str mode: The file mode, "w", "wb", "a" or "ab".
+    :param int compresslevel: The compression level from 0 to 9.
+    :param fileobj: A file like object to write the compressed data to. It is
+      not closed when this file is closed.
+    :param int block_size: The size of the uncompressed blocks in bytes.
+    :param int max_workers: The number of compression threads, defaults to
+      the number of CPUs. If it is 1 or ``concurrent.futures`` is not
+      available the blocks are compressed in the calling thread.
+    """
+
+    def __init__(self, filename=None, mode='wb',
+                 compresslevel=default_compresslevel, fileobj=None,
+                 block_size=default_block_size, max_workers=None):
+        if mode.rstrip('b') not in ('w', 'a'):
+            raise ValueError(
+                'ParallelGzipFile only supports "w" and "a" modes, not "%s"'
+                % mode
+            )
+
+        if not 0 <= compresslevel <= 9:
+            raise ValueError(
+                'compresslevel should be between 0 and 9, not %s'
+                % compresslevel
+            )
+
+        self.name = filename
+        self.mode = mode
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+
+        self._owns_fileobj = fileobj is None
+        if fileobj is None:
+            mode = mode if 'b' in mode else '%sb' % mode
+            fileobj = _builtin_open(filename, mode)
+        self.fileobj = fileobj
+
+        if max_workers is None:
+            max_workers = multiprocessing.cpu_count()
+
+        # waiting for the shared pool from one of its own workers may
+        # deadlock, so compress in the calling thread there
+        self._executor = None
+        if max_workers > 1 and not is_pool_worker():
+            self._executor = get_executor(max_workers)
+        # keep at most this number of blocks in memory
+        self._max_pending = 2 * max_workers
+
+        self._buffer = []
+        self._buffer_size = 0
+        self._pending = []
+        self.closed = False
+
+    def write(self, data):
+        """Writes the given data
+
+        :param str data: The data to write
+        """
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+
+        if not data:
+            return
+
+        self._buffer.append(data)
+        self._buffer_size += len(data)
+        if self._buffer_size >= self.block_size:
+            self._submit_blocks()
+
+    def writelines(self, lines):
+        """Writes the given lines
+
+        :param lines: An iterable of strings
+        """
+        for line in lines:
+            self.write(line)
+
+    def _submit_blocks(self, final=False):
+        """Compresses the full blocks in the buffer. If final is True, the
+        remaining data is also compressed.
+        """
+        data = ''.join(self._buffer)
+        self._buffer = []
+        self._buffer_size = 0
+
+        start = 0
+        data_size = len(data)
+        while data_size - start >= self.block_size or \
+                (final and start < data_size):
+            self._submit(data[start:start + self.block_size])
+            start += self.block_size
+
+        if start < data_size:
+            remaining = data[start:]
+            self._buffer.append(remaining)
+            self._buffer_size = len(remaining)
+
+    def _submit(self, block):
+        """Compresses the given block in the executor and writes the finished
+        blocks to the file in order
+        """
+        if self._executor is None:
+            self.fileobj.write(compress_member(block, self.compresslevel))
+            return
+
+        self._pending.append(
+            self._executor.submit(compress_member, block, self.compresslevel)
+        )
+        while len(self._pending) > self._max_pending:
+            self.fileobj.write(self._pending.pop(0).result())
+
+    def flush(self):
+        """Compresses all the buffered data and writes it to the file
+        """
+        if self.closed:
+            return
+
+        self._submit_blocks(final=True)
+        for future in self._pending:
+            self.fileobj.write(future.result())
+        self._pending = []
+        self.fileobj.flush()
+
+    def close(self):
+        """Flushes the remaining data and closes the file
+        """
+        if self.closed:
+            return
+
+        try:
+            self.flush()
+        finally:
+            self.closed = True
+            if self._owns_fileobj:
+                self.fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def open(filename, mode='wb', compresslevel=default_compresslevel,
+         block_size=default_block_size, max_workers=None):
+    """Opens a :class:`.ParallelGzipFile` for writing, it is a drop in
+    replacement of ``gzip.open`` for writing.
+
+    :param str filename: The path of the file
+    :param str mode: The file mode, "w", "wb", "a" or "ab".
+    :param int compresslevel: The compression level from 0 to 9.
+    :param int block_size: The size of the uncompressed blocks in bytes.
+    :param int max_workers: The number of compression threads.
+    :returns: :class:`.ParallelGzipFile`
+    """
+    return ParallelGzipFile(
+        filename, mode, compresslevel, block_size=block_size,
+        max_workers=max_workers
+    )
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+"""Frame <-> timecode conversions.
+
+Creating a ``timecode.Timecode`` instance parses the frame rate and the
+timecode every time, which is slow when thousands of EDL events are
+converted. The functions in this module compute the constants of a frame rate
+only once (see :func:`.get_frame_rate`) and convert the timecodes of integer,
+non drop frame rates (24, 25, 30 etc.) in the first 24 hours with plain
+integer math.
+
+Any other conversion (drop frame or fractional rates, negative frames or
+frames after 24 hours) is done by ``timecode.Timecode`` and the result is
+stored in an LRU cache, so the results are always the same with the
+``timecode`` package. The frames are 1 based as in ``timecode.Timecode``, so
+the frame number of a timecode is ``timecode_to_frames(rate, tc) - 1``::
+
+  from anima.utils import timecodes
+
+  timecodes.frames_to_timecode('25', 26)  # '00:00:01:00'
+  timecodes.timecode_to_frames('25', '00:00:01:00')  # 26
+"""
+
+import threading
+from collections import OrderedDict
+
+
+cache_size = 100000
+
+
+class LRUCache(object):
+    """A thread safe least recently used cache
+
+    :param int max_size: The maximum number of items in the cache, the least
+      recently used items are removed when it is exceeded.
+    """
+
+    def __init__(self, max_size=cache_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """returns the cached value of the given key and marks it as the most
+        recently used one
+
+        :param key: The key
+        :param default: The value to return if the key is not in the cache
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        """stores the given value
+
+        :param key: The key
+        :param value: The value
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """removes all the cached values
+        """
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class FrameRate(object):
+    """The precomputed constants of a frame rate
+
+    :param rate: The frame rate as it is passed to ``timecode.Timecode``, ex:
+      '24', '25', '29.97'.
+    """
+
+    __slots__ = ('rate', 'fps', 'frames_per_minute', 'frames_per_hour',
+                 'frames_per_day')
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.fps = self._get_integer_fps(rate)
+        self.frames_per_minute = None
+        self.frames_per_hour = None
+        self.frames_per_day = None
+        if self.fps is not None:
+            self.frames_per_minute = self.fps * 60
+            self.frames_per_hour = self.frames_per_minute * 60
+            self.frames_per_day = self.frames_per_hour * 24
+
+    @classmethod
+    def _get_integer_fps(cls, rate):
+        """returns the integer fps value of the given rate or None if it is
+        not an integer non drop frame rate
+        """
+        # "24.0" is not accepted by all the versions of the timecode package,
+        # so only the digits are handled here
+        rate_str = str(rate)
+        if not rate_str.isdigit():
+            return None
+
+        fps = int(rate_str)
+        if fps <= 0:
+            return None
+
+        return fps
+
+
+__frame_rates = {}
+__frames_to_timecode_cache = LRUCache()
+__timecode_to_frames_cache = LRUCache()
+
+
+def get_frame_rate(rate):
+    """returns the :class:`.FrameRate` of the given rate, the instances are
+    created only once per rate
+
+    :param rate: The frame rate, ex: '24'
+    :returns: :class:`.FrameRate`
+    """
+    frame_rate = __frame_rates.get(rate)
+    if frame_rate is None:
+        frame_rate = FrameRate(rate)
+        __frame_rates[rate] = frame_rate
+    return frame_rate
+
+
+def clear_cache():
+    """clears the cached conversion results
+    """
+    __frames_to_timecode_cache.clear()
+    __timecode_to_frames_cache.clear()
+
+
+def frames_to_timecode(rate, frames):
+    """returns the timecode string of the given frames, it is the same with
+    ``str(timecode.Timecode(rate, frames=frames))``
+
+    :param rate: The frame rate, ex: '24'
+    :param int frames: The 1 based frame count
+    :returns: str
+    """
+    frame_rate = get_frame_rate(rate)
+    fps = frame_rate.fps
+    frame_number = frames - 1
+    if fps is not None and 0 <= frame_number < frame_rate.frames_per_day:
+        seconds, frs = divmod(frame_number, fps)
+        minutes, secs = divmod(seconds, 60)
+        hrs, mins = divmod(minutes, 60)
+        return '%02d:%02d:%02d:%02d' % (hrs, mins, secs, frs)
+
+    key = (rate, frames)
+    timecode_str = __frames_to_timecode_cache.get(key)
+    if timecode_str is None:
+        from timecode import Timecode
+        timecode_str = str(Timecode(rate, frames=frames))
+        __frames_to_timecode_cache.set(key, timecode_str)
+    return timecode_str
+
+
+def timecode_to_frames(rate, timecode_str):
+    """returns the 1 based frame count of the given timecode, it is the same
+    with ``timecode.Timecode(rate, timecode_str).frames``
+
+    :param rate: The frame rate, ex: '24'
+    :param str timecode_str: The timecode, ex: '01:00:00:00'
+    :returns: int
+    """
+    frame_rate = get_frame_rate(rate)
+    fps = frame_rate.fps
+    if fps is not None:
+        parts = timecode_str.split(':')
+        if len(parts) == 4:
+            try:
+                hrs, mins, secs, frs = [int(part) for part in parts]
+            except ValueError:
+                pass
+            else:
+                return hrs * frame_rate.frames_per_hour \
+                    + mins * frame_rate.frames_per_minute \
+                    + secs * fps + frs + 1
+
+    key = (rate, timecode_str)
+    frames = __timecode_to_frames_cache.get(key)
+    if frames is None:
+        from timecode import Timecode
+        frames = Timecode(rate, timecode_str).frames
+        __timecode_to_frames_cache.set(key, frames)
+    return frames
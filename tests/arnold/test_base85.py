@@ -5,8 +5,13 @@
 # License: http://www.opensource.org/licenses/BSD-2-Clause
 
 from anima.render.arnold import base85
-import unittest
+import os
+import io
+import gzip
+import shutil
 import struct
+import tempfile
+import unittest
 
 
 class Base85TestCase(unittest.TestCase):
@@ -189,3 +194,306 @@ class Base85TestCase(unittest.TestCase):
             list(struct.unpack('%sf' % len(raw_data),
                                base85.arnold_b85_decode(encoded_data)))
         )
+
+
+class Base85EngineTestCase(unittest.TestCase):
+    """tests if the NumPy and the pure Python engines of the base85 module
+    are producing identical results
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        if base85.numpy is None:
+            self.skipTest('NumPy is not available')
+
+        self.raw_data = struct.pack(
+            '%sf' % 1024, *[i * 0.37 - 100.0 for i in range(1024)]
+        ) + struct.pack('4I', 0, 1, 0xffffffff, 0x7fffffff)
+
+    def test_encode_engines_are_producing_the_same_output(self):
+        """testing if NumPy and pure Python encoders are producing byte for
+        byte the same output for every LUT
+        """
+        numpy_encode = getattr(base85, '__b85_encode_numpy')
+        python_encode = getattr(base85, '__b85_encode_python')
+        for lut_name in ['standard', 'rfc1924', 'arnold']:
+            lut = base85.LUTS[lut_name]
+            self.assertEqual(
+                python_encode(
+                    self.raw_data, lut['int_to_char'], lut['byte_order']
+                ),
+                numpy_encode(
+                    self.raw_data, lut['int_to_char'], lut['byte_order']
+                )
+            )
+
+    def test_decode_engines_are_producing_the_same_output(self):
+        """testing if NumPy and pure Python decoders are producing byte for
+        byte the same output for every LUT
+        """
+        python_encode = getattr(base85, '__b85_encode_python')
+        numpy_decode = getattr(base85, '__b85_decode_numpy')
+        python_decode = getattr(base85, '__b85_decode_python')
+        for lut_name in ['standard', 'rfc1924', 'arnold']:
+            lut = base85.LUTS[lut_name]
+            encoded_data = python_encode(
+                self.raw_data, lut['int_to_char'], lut['byte_order']
+            )
+            self.assertEqual(
+                self.raw_data,
+                python_decode(
+                    encoded_data, lut['char_to_int'], lut['byte_order']
+                )
+            )
+            self.assertEqual(
+                self.raw_data,
+                numpy_decode(
+                    encoded_data, lut['char_to_int'], lut['byte_order']
+                )
+            )
+
+
+class Base85EncodeToTestCase(unittest.TestCase):
+    """tests the streaming encoders of the base85 module
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.raw_data = struct.pack(
+            '%sf' % 1001, *[i * 0.25 for i in range(1001)]
+        )
+        encoded_data = base85.arnold_b85_encode(self.raw_data)
+        self.expected_data = '\n'.join([
+            encoded_data[i:i + 500] for i in range(0, len(encoded_data), 500)
+        ])
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """clean up the test
+        """
+        shutil.rmtree(self.temp_dir)
+
+    def test_arnold_b85_encode_to_is_working_properly(self):
+        """testing if arnold_b85_encode_to writes the line wrapped encoded data
+        to the given stream
+        """
+        stream = io.BytesIO()
+        base85.arnold_b85_encode_to(stream, self.raw_data)
+        self.assertEqual(self.expected_data, stream.getvalue())
+
+    def test_arnold_b85_encode_to_with_small_blocks(self):
+        """testing if the output does not depend on the block size
+        """
+        encode_to = getattr(base85, '__b85_encode_to')
+        lut = base85.LUTS['arnold']
+        for block_size in [4, 6, 100, 400, 1024, 4004]:
+            stream = io.BytesIO()
+            encode_to(
+                stream, self.raw_data, lut['int_to_char'], lut['byte_order'],
+                lut['special_values'], block_size=block_size
+            )
+            self.assertEqual(self.expected_data, stream.getvalue())
+
+    def test_arnold_b85_encode_to_with_multiple_parts(self):
+        """testing if a list of data is encoded as if it was joined together
+        """
+        stream = io.BytesIO()
+        base85.arnold_b85_encode_to(
+            stream, [self.raw_data[:1000], '', self.raw_data[1000:]]
+        )
+        self.assertEqual(self.expected_data, stream.getvalue())
+
+    def test_arnold_b85_encode_to_with_empty_data(self):
+        """testing if nothing is written for empty data
+        """
+        stream = io.BytesIO()
+        base85.arnold_b85_encode_to(stream, '')
+        self.assertEqual('', stream.getvalue())
+
+    def test_arnold_b85_encode_to_gzip_handle(self):
+        """testing if arnold_b85_encode_to can write to gzip file handles
+        """
+        path = os.path.join(self.temp_dir, 'test.ass.gz')
+        gzip_file = gzip.open(path, 'wb')
+        base85.arnold_b85_encode_to(gzip_file, self.raw_data, line_width=80)
+        gzip_file.close()
+
+        encoded_data = base85.arnold_b85_encode(self.raw_data)
+        expected_data = '\n'.join([
+            encoded_data[i:i + 80] for i in range(0, len(encoded_data), 80)
+        ])
+        gzip_file = gzip.open(path, 'rb')
+        self.assertEqual(expected_data, gzip_file.read())
+        gzip_file.close()
+
+
+class Base85ParallelEncodeTestCase(unittest.TestCase):
+    """tests the parallel encoders of the base85 module
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        from anima.utils import executors
+        if executors.futures is None:
+            self.skipTest('concurrent.futures is not available')
+
+        self.parallel_min_chunk_size = base85.parallel_min_chunk_size
+        base85.parallel_min_chunk_size = 4
+
+        # 4099 floats plus 3 extra bytes, which is not evenly divisible by
+        # any of the worker counts below
+        self.raw_data = struct.pack(
+            '%sf' % 4099, *[i * 0.5 for i in range(4099)]
+        ) + '\x01\x02\x03'
+
+    def tearDown(self):
+        """clean up the test
+        """
+        base85.parallel_min_chunk_size = self.parallel_min_chunk_size
+
+    def test_thread_pool_output_matches_serial_output(self):
+        """testing if encoding with a thread pool produces the same output
+        with the serial encoder
+        """
+        expected_data = base85.arnold_b85_encode(self.raw_data)
+        for max_workers in [1, 2, 3, 7, 16]:
+            self.assertEqual(
+                expected_data,
+                base85.arnold_b85_encode_multithreaded(
+                    self.raw_data, max_workers=max_workers
+                )
+            )
+
+    def test_process_pool_output_matches_serial_output(self):
+        """testing if encoding with a process pool produces the same output
+        with the serial encoder
+        """
+        expected_data = base85.rfc1924_b85_encode(self.raw_data)
+        self.assertEqual(
+            expected_data,
+            base85.rfc1924_b85_encode_multithreaded(
+                self.raw_data, use_processes=True, max_workers=3
+            )
+        )
+
+    def test_executors_are_reused(self):
+        """testing if get_executor returns the same executor for the same
+        arguments
+        """
+        self.assertIs(
+            base85.get_executor(max_workers=2),
+            base85.get_executor(max_workers=2)
+        )
+        self.assertIsNot(
+            base85.get_executor(max_workers=2),
+            base85.get_executor(use_processes=True, max_workers=2)
+        )
+
+    def test_encoding_in_a_pool_worker_is_not_deadlocking(self):
+        """testing if encoding in a job of the shared pool will be done in
+        the worker thread instead of waiting for the other workers
+        """
+        expected_data = base85.arnold_b85_encode(self.raw_data)
+        executor = base85.get_executor(max_workers=2)
+        fs = [
+            executor.submit(
+                base85.arnold_b85_encode_multithreaded, self.raw_data,
+                max_workers=2
+            )
+            for _ in range(2)
+        ]
+        for future in fs:
+            self.assertEqual(expected_data, future.result(timeout=10))
+
+    def test_executors_are_shared_with_the_other_modules(self):
+        """testing if base85 and parallel_gzip use the executors of
+        anima.utils instead of creating their own pools
+        """
+        from anima import utils
+        from anima.utils import parallel_gzip
+        self.assertIs(
+            utils.get_executor(max_workers=2),
+            base85.get_executor(max_workers=2)
+        )
+        self.assertIs(
+            utils.get_executor(max_workers=2),
+            parallel_gzip.get_executor(max_workers=2)
+        )
+
+
+class Base85SpecialValuesTestCase(unittest.TestCase):
+    """tests the special value ("z" and "y") compression of the arnold
+    encoding in both NumPy and pure Python engines
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.raw_values = [
+            0.0, 1.0, 0.0, 0.0, 2.0, 1.0, 1.0, 0.5, 0.0, -1.0, 1.0, 0.25, 0.0
+        ]
+        self.raw_data = struct.pack(
+            '<%sf' % len(self.raw_values), *self.raw_values
+        )
+        self.lut = base85.LUTS['arnold']
+        self.numpy = base85.numpy
+
+    def tearDown(self):
+        """clean up the test
+        """
+        base85.numpy = self.numpy
+
+    def round_trip(self):
+        """encodes and decodes the raw data and checks the result
+        """
+        encoded_data = base85.arnold_b85_encode(self.raw_data)
+        self.assertEqual(
+            len(self.raw_values) * 5 - 4 * (
+                self.raw_values.count(0.0) + self.raw_values.count(1.0)
+            ),
+            len(encoded_data)
+        )
+        self.assertEqual(self.raw_data, base85.arnold_b85_decode(encoded_data))
+
+    def test_round_trip_with_python_engine(self):
+        """testing if special values round trip with the pure Python engine
+        """
+        base85.numpy = None
+        self.round_trip()
+
+    def test_round_trip_with_numpy_engine(self):
+        """testing if special values round trip with the NumPy engine
+        """
+        if self.numpy is None:
+            self.skipTest('NumPy is not available')
+        self.round_trip()
+
+    def test_special_values_are_only_matched_per_group(self):
+        """testing if a "$$$$$" sequence spanning two groups is not replaced
+        """
+        # 0x24 ("$") is 0 in the arnold LUT, so these two words end and start
+        # with "$" characters, creating a "$$$$$" sequence between groups
+        raw_data = struct.pack('<II', 85 ** 4, 85)
+        for numpy_module in [None, self.numpy]:
+            base85.numpy = numpy_module
+            encoded_data = base85.arnold_b85_encode(raw_data)
+            self.assertIn('$$$$$', encoded_data)
+            self.assertNotIn('z', encoded_data)
+            self.assertEqual(raw_data, base85.arnold_b85_decode(encoded_data))
+
+    def test_engines_are_producing_the_same_output(self):
+        """testing if NumPy and pure Python engines are producing the same
+        output with special values
+        """
+        if self.numpy is None:
+            self.skipTest('NumPy is not available')
+        raw_data = self.raw_data * 100
+        base85.numpy = None
+        python_encoded_data = base85.arnold_b85_encode(raw_data)
+        base85.numpy = self.numpy
+        self.assertEqual(
+            python_encoded_data, base85.arnold_b85_encode(raw_data)
+        )
@@ -0,0 +1,839 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import os
+import json
+import array
+import shutil
+import struct
+import tempfile
+import threading
+import unittest
+from cStringIO import StringIO
+
+from anima import perf
+from anima.render.arnold import base85, h2a
+
+
+class ASSWriterTestCase(unittest.TestCase):
+    """tests the h2a.ASSWriter class
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.ass_file = StringIO()
+        self.writer = h2a.ASSWriter(self.ass_file)
+
+    def test_node_is_written_properly(self):
+        """testing if a node with parameters is written properly
+        """
+        self.writer.begin_node('polymesh')
+        self.writer.write_parameter('name', 'test')
+        self.writer.write_declare('colorSet1', 'varying', 'RGBA')
+        self.writer.write_array('nsides', 2, 1, 'UINT', ['4', ' ', '3'])
+        self.writer.end_node()
+        self.assertEqual(
+            '\npolymesh\n{\n'
+            ' name test\n'
+            ' declare colorSet1 varying RGBA\n'
+            ' nsides 2 1 UINT\n4 3\n'
+            '}\n',
+            self.ass_file.getvalue()
+        )
+
+    def test_write_b85_array_is_working_properly(self):
+        """testing if write_b85_array encodes and splits the given data
+        """
+        data = struct.pack('<300f', *[i * 0.5 for i in range(300)])
+        self.writer.write_b85_array('vlist', 100, 1, 'POINT', data, 100)
+        self.assertEqual(
+            ' vlist 100 1 b85POINT\n%s\n' % h2a.split_data(
+                base85.arnold_b85_encode(data), 100
+            ),
+            self.ass_file.getvalue()
+        )
+
+    def test_write_b85_array_with_motion_samples(self):
+        """testing if the motion samples are written as one array
+        """
+        p = struct.pack('<6f', *range(6))
+        pprime = struct.pack('<6f', *range(6, 12))
+        self.writer.write_b85_array('vlist', 2, 2, 'POINT', [p, pprime])
+        self.assertEqual(
+            ' vlist 2 2 b85POINT\n%s\n' % base85.arnold_b85_encode(
+                p + pprime
+            ),
+            self.ass_file.getvalue()
+        )
+
+
+class FakePoint(object):
+    """a stand-in for hou.Point
+    """
+
+    def __init__(self, number):
+        self._number = number
+
+    def number(self):
+        return self._number
+
+
+class FakeVertex(object):
+    """a stand-in for hou.Vertex
+    """
+
+    def __init__(self, point_number):
+        self._point = FakePoint(point_number)
+
+    def point(self):
+        return self._point
+
+
+class FakePrim(object):
+    """a stand-in for hou.Prim
+    """
+
+    def __init__(self, point_numbers):
+        self._vertices = [FakeVertex(n) for n in point_numbers]
+
+    def numVertices(self):
+        return len(self._vertices)
+
+    def vertices(self):
+        return self._vertices
+
+
+class FakeAttrib(object):
+    """a stand-in for hou.Attrib
+    """
+
+    def __init__(self, size):
+        self._size = size
+
+    def size(self):
+        return self._size
+
+
+class FakeGeometry(object):
+    """a stand-in for hou.Geometry
+
+    The attributes are given as dictionaries where the values are flat lists
+    of values, the size of float attributes is given with the attrib_sizes
+    dictionary.
+    """
+
+    def __init__(self, prims, prim_attribs=None, vertex_attribs=None,
+                 point_attribs=None, attrib_sizes=None):
+        self._prims = [FakePrim(point_numbers) for point_numbers in prims]
+        self.prim_attribs = prim_attribs or {}
+        self.vertex_attribs = vertex_attribs or {}
+        self.point_attribs = point_attribs or {}
+        self.attrib_sizes = attrib_sizes or {}
+
+    def intrinsicValueDict(self):
+        return {
+            'primitivecount': len(self._prims),
+            'pointcount': len(self.point_attribs['P']) // 3,
+            'vertexcount': sum(prim.numVertices() for prim in self._prims)
+        }
+
+    def intrinsicValue(self, name):
+        return self.intrinsicValueDict()[name]
+
+    def attribValue(self, name):
+        return {'bound_min': (0, 0, 0), 'bound_max': (1, 1, 1)}[name]
+
+    def iterPrims(self):
+        return iter(self._prims)
+
+    def findPrimAttrib(self, name):
+        return name in self.prim_attribs
+
+    def findVertexAttrib(self, name):
+        if name in self.vertex_attribs:
+            return FakeAttrib(self.attrib_sizes.get(name, 1))
+
+    def findPointAttrib(self, name):
+        if name in self.point_attribs:
+            return FakeAttrib(self.attrib_sizes.get(name, 1))
+
+    def vertexFloatAttribValuesAsString(self, name):
+        values = self.vertex_attribs[name]
+        return struct.pack('%sf' % len(values), *values)
+
+    def primFloatAttribValuesAsString(self, name):
+        values = self.prim_attribs[name]
+        return struct.pack('%sf' % len(values), *values)
+
+    def pointFloatAttribValuesAsString(self, name):
+        values = self.point_attribs[name]
+        return struct.pack('%sf' % len(values), *values)
+
+    def primIntAttribValuesAsString(self, name):
+        values = self.prim_attribs[name]
+        return struct.pack('%si' % len(values), *values)
+
+    def vertexIntAttribValuesAsString(self, name):
+        values = self.vertex_attribs[name]
+        return struct.pack('%si' % len(values), *values)
+
+
+class FakeNode(object):
+    """a stand-in for hou.SopNode
+    """
+
+    def __init__(self, geo, path='/obj/geo1/OUT'):
+        self._geo = geo
+        self._path = path
+
+    def geometry(self):
+        return self._geo
+
+    def path(self):
+        return self._path
+
+
+class FakeOperationFailed(Exception):
+    """a stand-in for hou.OperationFailed
+    """
+    pass
+
+
+class FakeWrangleVerb(object):
+    """a stand-in for the hou.SopVerb of the Attribute Wrangle SOP, which
+    creates the polygon index attributes
+    """
+
+    def __init__(self):
+        self.parms = {}
+        self.executed_snippets = []
+
+    def setParms(self, parms):
+        self.parms.update(parms)
+
+    def execute(self, output_geo, input_geos):
+        input_geo = input_geos[0]
+        output_geo._prims = input_geo._prims
+        output_geo.prim_attribs = dict(input_geo.prim_attribs)
+        output_geo.vertex_attribs = dict(input_geo.vertex_attribs)
+        self.executed_snippets.append(self.parms['snippet'])
+        if self.parms['class'] == 1:
+            output_geo.prim_attribs[h2a.nsides_attribute_name] = [
+                prim.numVertices() for prim in input_geo._prims
+            ]
+        elif self.parms['class'] == 3:
+            output_geo.vertex_attribs[h2a.vidxs_attribute_name] = [
+                vertex.point().number()
+                for prim in input_geo._prims
+                for vertex in prim.vertices()
+            ]
+
+
+class FakeSopCategory(object):
+    """a stand-in for hou.sopNodeTypeCategory()
+    """
+
+    def __init__(self, verb):
+        self.verb = verb
+
+    def nodeVerb(self, name):
+        if name == 'attribwrangle':
+            return self.verb
+
+
+class PolygonIndicesTestCase(unittest.TestCase):
+    """tests the h2a.get_polygon_indices and h2a.pack_indices functions
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.hou = h2a.hou
+
+    def tearDown(self):
+        """clean up the test
+        """
+        h2a.hou = self.hou
+
+    def test_get_polygon_indices_uses_the_wrangle_verb(self):
+        """testing if get_polygon_indices creates the index attributes with
+        the Attribute Wrangle SOP verb and reads them in bulk when they do
+        not exist
+        """
+        verb = FakeWrangleVerb()
+
+        class FakeVerbHou(object):
+            OperationFailed = FakeOperationFailed
+
+            @classmethod
+            def sopNodeTypeCategory(cls):
+                return FakeSopCategory(verb)
+
+            @classmethod
+            def Geometry(cls):
+                return FakeGeometry([])
+
+        h2a.hou = FakeVerbHou
+        geo = FakeGeometry([[0, 1, 2, 3], [1, 2, 4]])
+        nsides, vidxs = h2a.get_polygon_indices(geo)
+        self.assertEqual([4, 3], list(nsides))
+        self.assertEqual([0, 1, 2, 3, 1, 2, 4], list(vidxs))
+        self.assertEqual(
+            [snippet for run_over, snippet in h2a.polygon_index_snippets],
+            verb.executed_snippets
+        )
+        # the original geometry is not changed
+        self.assertEqual({}, geo.prim_attribs)
+        self.assertEqual({}, geo.vertex_attribs)
+
+    def test_get_polygon_indices_iterates_primitives(self):
+        """testing if get_polygon_indices collects the indices from the
+        primitives when there are no index attributes and no SOP verbs
+        """
+        h2a.hou = None
+        geo = FakeGeometry([[0, 1, 2, 3], [1, 2, 4]])
+        nsides, vidxs = h2a.get_polygon_indices(geo)
+        self.assertEqual([4, 3], list(nsides))
+        self.assertEqual([0, 1, 2, 3, 1, 2, 4], list(vidxs))
+
+    def test_get_polygon_indices_reads_attributes_in_bulk(self):
+        """testing if get_polygon_indices reads the index attributes
+        """
+        geo = FakeGeometry(
+            [],
+            prim_attribs={h2a.nsides_attribute_name: [4, 3]},
+            vertex_attribs={
+                h2a.vidxs_attribute_name: [0, 1, 2, 3, 1, 2, 4]
+            }
+        )
+        nsides, vidxs = h2a.get_polygon_indices(geo)
+        self.assertEqual([4, 3], list(nsides))
+        self.assertEqual([0, 1, 2, 3, 1, 2, 4], list(vidxs))
+
+    def test_pack_indices_uses_byte_for_small_values(self):
+        """testing if pack_indices packs values smaller than 256 as BYTE
+        """
+        self.assertEqual(
+            ('BYTE', struct.pack('<3B', 0, 4, 255)),
+            h2a.pack_indices([0, 4, 255])
+        )
+
+    def test_pack_indices_uses_uint_for_big_values(self):
+        """testing if pack_indices packs values bigger than 255 as UINT
+        """
+        self.assertEqual(
+            ('UINT', struct.pack('<3I', 0, 4, 256)),
+            h2a.pack_indices([0, 4, 256])
+        )
+
+    def test_pack_indices_with_empty_data(self):
+        """testing if pack_indices handles empty data
+        """
+        self.assertEqual(('BYTE', ''), h2a.pack_indices([]))
+
+
+class FloatAttribValuesTestCase(unittest.TestCase):
+    """tests the h2a.get_float_attrib_values function
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.numpy = h2a.numpy
+
+    def tearDown(self):
+        """clean up the test
+        """
+        h2a.numpy = self.numpy
+
+    def test_vertex_attributes_are_truncated(self):
+        """testing if vertex attributes are read and truncated to the given
+        component count
+        """
+        geo = FakeGeometry(
+            [[0, 1, 2]],
+            vertex_attribs={'uv': [0, 1, 2, 3, 4, 5, 6, 7, 8]},
+            point_attribs={'uv': [9, 9, 9]},
+            attrib_sizes={'uv': 3}
+        )
+        for numpy_module in [None, self.numpy]:
+            h2a.numpy = numpy_module
+            self.assertEqual(
+                ('vertex', struct.pack('6f', 0, 1, 3, 4, 6, 7)),
+                h2a.get_float_attrib_values(geo, 'uv', 2)
+            )
+
+    def test_point_attributes_are_read(self):
+        """testing if point attributes are read when there is no vertex
+        attribute with the same name
+        """
+        geo = FakeGeometry(
+            [[0, 1, 2]],
+            point_attribs={'N': [0, 1, 0, 0, 1, 0, 0, 1, 0]},
+            attrib_sizes={'N': 3}
+        )
+        self.assertEqual(
+            ('point', struct.pack('9f', 0, 1, 0, 0, 1, 0, 0, 1, 0)),
+            h2a.get_float_attrib_values(geo, 'N', 3)
+        )
+
+    def test_missing_attributes(self):
+        """testing if (None, '') is returned for missing attributes
+        """
+        geo = FakeGeometry([[0, 1, 2]])
+        self.assertEqual((None, ''), h2a.get_float_attrib_values(geo, 'N', 3))
+
+
+class Polygon2AssTestCase(unittest.TestCase):
+    """tests the h2a.polygon2ass function
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.geo = FakeGeometry(
+            [[0, 1, 2, 3], [1, 4, 2]],
+            vertex_attribs={'uv': [0.0, 0.25] * 7},
+            point_attribs={
+                'P': [float(i) for i in range(15)],
+                'N': [0.0, 1.0, 0.0] * 5,
+            },
+            attrib_sizes={'uv': 2, 'N': 3}
+        )
+
+    def test_uvs_and_normals_are_exported(self):
+        """testing if uvs and normals are exported with their indices
+        """
+        data = h2a.polygon2ass(
+            FakeNode(self.geo), 'test', export_uvs=True, export_normals=True
+        )
+        vidxs = base85.arnold_b85_encode(
+            struct.pack('<7B', 0, 1, 2, 3, 1, 4, 2)
+        )
+        uvidxs = base85.arnold_b85_encode(struct.pack('<7B', *range(7)))
+        self.assertIn(' vidxs 7 1 b85BYTE\n%s\n' % vidxs, data)
+        self.assertIn(
+            ' uvlist 7 1 b85POINT2\n%s\n' % base85.arnold_b85_encode(
+                struct.pack('<14f', *([0.0, 0.25] * 7))
+            ),
+            data
+        )
+        self.assertIn(' uvidxs 7 1 b85BYTE\n%s\n' % uvidxs, data)
+        self.assertIn(
+            ' nlist 5 1 b85VECTOR\n%s\n' % base85.arnold_b85_encode(
+                struct.pack('<15f', *([0.0, 1.0, 0.0] * 5))
+            ),
+            data
+        )
+        self.assertIn(' nidxs 7 1 b85BYTE\n%s\n' % vidxs, data)
+
+    def test_uvs_and_normals_are_not_exported_by_default(self):
+        """testing if uvs and normals are not exported by default
+        """
+        data = h2a.polygon2ass(FakeNode(self.geo), 'test')
+        self.assertNotIn('uvlist', data)
+        self.assertNotIn('nlist', data)
+
+    def test_point_normals_with_text_indices(self):
+        """testing if point normals are indexed with the vertex point indices
+        when the indices are written as text
+        """
+        data = h2a.polygon2ass(
+            FakeNode(self.geo), 'test', binary_indices=False,
+            export_normals=True
+        )
+        self.assertIn(' vidxs 7 1 UINT\n0 1 2 3 1 4 2\n', data)
+        self.assertIn(
+            ' nidxs 7 1 b85BYTE\n%s\n' % base85.arnold_b85_encode(
+                struct.pack('<7B', 0, 1, 2, 3, 1, 4, 2)
+            ),
+            data
+        )
+
+
+class DuplicateCurveEndPointsTestCase(unittest.TestCase):
+    """tests the h2a.duplicate_curve_end_points function
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.numpy = h2a.numpy
+
+    def tearDown(self):
+        """clean up the test
+        """
+        h2a.numpy = self.numpy
+
+    def pack_points(self, points):
+        """packs the given list of xyz tuples
+        """
+        return ''.join([struct.pack('3f', *point) for point in points])
+
+    def test_curves_with_the_same_number_of_points(self):
+        """testing if the end points are duplicated for curves having the same
+        number of points
+        """
+        points = [(i, i, i) for i in range(6)]
+        expected = self.pack_points([
+            points[0], points[0], points[1], points[2], points[2],
+            points[3], points[3], points[4], points[5], points[5],
+        ])
+        for numpy_module in [None, self.numpy]:
+            h2a.numpy = numpy_module
+            self.assertEqual(
+                expected,
+                h2a.duplicate_curve_end_points(
+                    self.pack_points(points), [3, 3]
+                )
+            )
+
+    def test_curves_with_different_number_of_points(self):
+        """testing if the end points are duplicated for curves having
+        different number of points
+        """
+        points = [(i, i * 2, i * 3) for i in range(9)]
+        expected = self.pack_points([
+            points[0], points[0], points[1], points[1],
+            points[2], points[2], points[3], points[4], points[5], points[5],
+            points[6], points[6], points[7], points[8], points[8],
+        ])
+        for numpy_module in [None, self.numpy]:
+            h2a.numpy = numpy_module
+            self.assertEqual(
+                expected,
+                h2a.duplicate_curve_end_points(
+                    self.pack_points(points), array.array('i', [2, 4, 3])
+                )
+            )
+
+    def test_no_curves(self):
+        """testing if an empty string is returned when there are no curves
+        """
+        self.assertEqual('', h2a.duplicate_curve_end_points('', []))
+
+
+class CurveRadiusTestCase(unittest.TestCase):
+    """tests the h2a.get_curve_radius function and its helpers
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.numpy = h2a.numpy
+        h2a.clear_topology_cache()
+        self.prims = [[0, 1, 2], [3, 4]]
+        self.point_attribs = {'P': [0.0] * 15}
+
+    def tearDown(self):
+        """clean up the test
+        """
+        h2a.numpy = self.numpy
+        h2a.clear_topology_cache()
+
+    def test_point_width(self):
+        """testing if the point width is used as it is
+        """
+        geo = FakeGeometry(
+            self.prims,
+            point_attribs=dict(self.point_attribs, width=[1, 2, 3, 4, 5])
+        )
+        self.assertEqual(
+            struct.pack('5f', 1, 2, 3, 4, 5),
+            h2a.get_curve_radius(geo, [3, 2])
+        )
+
+    def test_prim_width_is_expanded_to_points(self):
+        """testing if the primitive width is repeated for each point
+        """
+        geo = FakeGeometry(
+            self.prims, prim_attribs={'width': [0.5, 0.25]},
+            point_attribs=self.point_attribs
+        )
+        for numpy_module in [None, self.numpy]:
+            h2a.numpy = numpy_module
+            self.assertEqual(
+                struct.pack('5f', 0.5, 0.5, 0.5, 0.25, 0.25),
+                h2a.get_curve_radius(geo, [3, 2])
+            )
+
+    def test_vertex_width_is_promoted_to_points(self):
+        """testing if the vertex width is promoted to points
+        """
+        geo = FakeGeometry(
+            [[2, 1, 0], [4, 3]], vertex_attribs={'width': [1, 2, 3, 4, 5]},
+            point_attribs=self.point_attribs
+        )
+        for numpy_module in [None, self.numpy]:
+            h2a.numpy = numpy_module
+            self.assertEqual(
+                struct.pack('5f', 3, 2, 1, 5, 4),
+                h2a.get_curve_radius(geo, [3, 2])
+            )
+
+    def test_vertex_to_point_mapping_is_cached(self):
+        """testing if the vertex to point mapping is calculated once for the
+        same topology
+        """
+        geo = FakeGeometry(
+            self.prims, vertex_attribs={'width': [1, 2, 3, 4, 5]},
+            point_attribs=self.point_attribs
+        )
+        cache = h2a.get_topology_cache(geo, 'test')
+        h2a.get_curve_radius(geo, [3, 2], cache)
+        self.assertIn('vertex_points', cache)
+        # identical order needs no mapping
+        self.assertIsNone(cache['vertex_points'])
+
+        # the mapping should not be calculated again
+        geo.iterPrims = None
+        geo.vertex_attribs['width'] = [5, 4, 3, 2, 1]
+        self.assertEqual(
+            struct.pack('5f', 5, 4, 3, 2, 1),
+            h2a.get_curve_radius(geo, [3, 2], cache)
+        )
+
+    def test_vertex_to_point_mapping_is_not_reused_without_a_cache(self):
+        """testing if the vertex to point mapping is calculated every time
+        when no topology cache is given, even if there is a topology cache
+        of the same topology
+        """
+        geo = FakeGeometry(
+            self.prims, vertex_attribs={'width': [1, 2, 3, 4, 5]},
+            point_attribs=self.point_attribs
+        )
+        cache = h2a.get_topology_cache(geo, 'test')
+        h2a.get_curve_radius(geo, [3, 2], cache)
+
+        # same counts, different vertex order
+        geo = FakeGeometry(
+            [[2, 1, 0], [4, 3]], vertex_attribs={'width': [1, 2, 3, 4, 5]},
+            point_attribs=self.point_attribs
+        )
+        self.assertEqual(
+            struct.pack('5f', 3, 2, 1, 5, 4),
+            h2a.get_curve_radius(geo, [3, 2])
+        )
+        self.assertIsNone(cache['vertex_points'])
+
+    def test_topology_cache_is_reset_when_topology_changes(self):
+        """testing if a new topology cache is returned when the topology
+        changes
+        """
+        geo = FakeGeometry(self.prims, point_attribs=self.point_attribs)
+        cache = h2a.get_topology_cache(geo, 'test')
+        cache['data'] = 1
+        self.assertIs(cache, h2a.get_topology_cache(geo, 'test'))
+
+        geo = FakeGeometry(
+            [[0, 1, 2, 3, 4]], point_attribs=self.point_attribs
+        )
+        self.assertEqual({}, h2a.get_topology_cache(geo, 'test'))
+
+    def test_no_width(self):
+        """testing if an empty string is returned when there is no width
+        """
+        geo = FakeGeometry(self.prims, point_attribs=self.point_attribs)
+        self.assertEqual('', h2a.get_curve_radius(geo, [3, 2]))
+
+
+class TopologyCacheTestCase(unittest.TestCase):
+    """tests the topology cache usage of h2a.polygon2ass and h2a.curves2ass
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        h2a.clear_topology_cache()
+
+    def tearDown(self):
+        """clean up the test
+        """
+        h2a.clear_topology_cache()
+
+    def test_polygon2ass_reuses_the_indices_and_uvs(self):
+        """testing if polygon2ass doesn't calculate the indices and uvs again
+        for the same topology
+        """
+        geo = FakeGeometry(
+            [[0, 1, 2, 3], [1, 4, 2]],
+            vertex_attribs={'uv': [0.0, 0.25] * 7},
+            point_attribs={'P': [float(i) for i in range(15)]},
+            attrib_sizes={'uv': 2}
+        )
+        node = FakeNode(geo)
+        expected = h2a.polygon2ass(node, 'test', export_uvs=True)
+        self.assertEqual(
+            expected,
+            h2a.polygon2ass(
+                node, 'test', export_uvs=True, use_topology_cache=True
+            )
+        )
+
+        # only the positions should be read for the next frame
+        geo.iterPrims = None
+        geo.vertexFloatAttribValuesAsString = None
+        self.assertEqual(
+            expected,
+            h2a.polygon2ass(
+                node, 'test', export_uvs=True, use_topology_cache=True
+            )
+        )
+
+    def test_curves2ass_reuses_the_topology_data(self):
+        """testing if curves2ass doesn't calculate the point counts and
+        paramcoords again for the same topology
+        """
+        geo = FakeGeometry(
+            [[0, 1, 2], [3, 4]],
+            prim_attribs={'uv_u': [0.0, 0.5], 'uv_v': [0.25, 0.75]},
+            point_attribs={'P': [float(i) for i in range(15)]}
+        )
+        node = FakeNode(geo)
+        expected = h2a.curves2ass(node, 'test')
+        self.assertEqual(
+            expected, h2a.curves2ass(node, 'test', use_topology_cache=True)
+        )
+
+        # only the positions should be read for the next frame
+        geo.iterPrims = None
+        geo.primFloatAttribValuesAsString = None
+        geo.point_attribs['P'] = [float(i) * 2 for i in range(15)]
+        data = h2a.curves2ass(node, 'test', use_topology_cache=True)
+        self.assertNotEqual(expected, data)
+        h2a.clear_topology_cache()
+        del geo.iterPrims
+        del geo.primFloatAttribValuesAsString
+        self.assertEqual(data, h2a.curves2ass(node, 'test'))
+
+
+class FakeHou(object):
+    """a stand-in for the hou module
+    """
+
+    def __init__(self, node):
+        self.node = node
+
+    def pwd(self):
+        return self.node
+
+
+class ExportStatsTestCase(unittest.TestCase):
+    """tests the export stats of h2a
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.hou = h2a.hou
+        self.temp_dir = tempfile.mkdtemp()
+        self.geo = FakeGeometry(
+            [[0, 1, 2, 3], [1, 4, 2]],
+            point_attribs={'P': [float(i) for i in range(15)]}
+        )
+        self.node = FakeNode(self.geo)
+
+    def tearDown(self):
+        """clean up the test
+        """
+        h2a.hou = self.hou
+        shutil.rmtree(self.temp_dir)
+
+    def test_stats_are_disabled_by_default(self):
+        """testing if nothing is recorded if no recorder is given
+        """
+        writer = h2a.ASSWriter(StringIO())
+        self.assertFalse(writer.stats.enabled)
+        self.assertTrue(h2a.polygon2ass(self.node, 'test'))
+        self.assertFalse(hasattr(h2a, 'stats'))
+
+    def test_polygon2ass_stages(self):
+        """testing if the stages of polygon2ass are recorded
+        """
+        ass_file = StringIO()
+        stats = perf.StageRecorder(
+            'test', byte_counter=lambda: len(ass_file.getvalue())
+        )
+        h2a.polygon2ass(self.node, 'test', ass_file=ass_file, stats=stats)
+        stages = dict(
+            (stage.name, stage) for stage in stats.root.children
+        )
+        self.assertEqual(
+            ['Getting Indices', 'Writing Number of Points',
+             'Writing Vertex Ids', 'Getting Point Position',
+             'Writing Point Position'],
+            [stage.name for stage in stats.root.children]
+        )
+        self.assertEqual(60, stages['Getting Point Position'].bytes_in)
+        self.assertEqual(0, stages['Getting Point Position'].bytes_out)
+        self.assertEqual(
+            len(' vlist 5 1 b85POINT\n%s\n' % base85.arnold_b85_encode(
+                struct.pack('<15f', *range(15))
+            )),
+            stages['Writing Point Position'].bytes_out
+        )
+
+    def test_geometry2ass_returns_and_writes_the_stats(self):
+        """testing if geometry2ass returns the stats and writes them next to
+        the asstoc file
+        """
+        h2a.hou = FakeHou(self.node)
+        path = os.path.join(self.temp_dir, 'test.ass.gz')
+        stats = h2a.geometry2ass(
+            path, 'test', 0.5, 'ribbon', 1, False, False, 0, write_stats=True
+        )
+        self.assertEqual(path, stats['path'])
+        self.assertEqual('/obj/geo1/OUT', stats['name'])
+        self.assertEqual(
+            ['polygon2ass', 'Closing File', 'Writing asstoc'],
+            [stage['name'] for stage in stats['children']]
+        )
+        self.assertTrue(stats['bytes_out'] > 0)
+        self.assertEqual(
+            stats['bytes_out'],
+            sum(stage['bytes_out'] for stage in stats['children'])
+        )
+        self.assertTrue(
+            os.path.exists(os.path.join(self.temp_dir, 'test.asstoc'))
+        )
+        with open(os.path.join(self.temp_dir, 'test.stats.json')) as f:
+            written_stats = json.load(f)
+        self.assertEqual(
+            stats['children'][0]['bytes_out'],
+            written_stats['children'][0]['bytes_out']
+        )
+
+    def test_geometry2ass_is_reentrant(self):
+        """testing if the exports running at the same time record their own
+        stats
+        """
+        h2a.hou = FakeHou(self.node)
+        results = {}
+
+        def export(i):
+            path = os.path.join(self.temp_dir, 'test%s.ass' % i)
+            results[i] = h2a.geometry2ass(
+                path, 'test', 0.5, 'ribbon', 1, False, False, 0
+            )
+
+        threads = [
+            threading.Thread(target=export, args=(i,)) for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for i in range(4):
+            self.assertEqual(
+                os.path.join(self.temp_dir, 'test%s.ass' % i),
+                results[i]['path']
+            )
+            self.assertEqual(
+                ['polygon2ass', 'Closing File', 'Writing asstoc'],
+                [stage['name'] for stage in results[i]['children']]
+            )
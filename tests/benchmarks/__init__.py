@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+"""Benchmarks for the pure Python hot paths of anima.
+
+The benchmarks are run with fixed synthetic data sizes, so the results of
+different builds can be compared. Run them with::
+
+  python -m tests.benchmarks --output results.json
+  python -m tests.benchmarks --baseline results.json --output new.json
+
+The results are written as JSON and the comparison with the baseline is
+printed, the exit code is 1 if any of the benchmarks is slower than the
+baseline more than the given threshold.
+
+A benchmark is a function decorated with :func:`.benchmark`, it is called
+with the data returned by the setup function for the given size and only the
+call of the benchmark function is timed.
+"""
+
+import sys
+import json
+import platform
+
+from anima import perf
+
+
+# the data sizes (number of elements) used by the benchmarks
+SIZES = (1000, 10000, 100000, 1000000, 10000000)
+
+benchmarks = []
+
+benchmark_modules = [
+    'tests.benchmarks.bench_base85',
+    'tests.benchmarks.bench_h2a',
+    'tests.benchmarks.bench_edit',
+    'tests.benchmarks.bench_recent',
+]
+
+
+class SkipBenchmark(Exception):
+    """Raised by the setup functions if the benchmark can not be run in the
+    current environment (ex: a missing optional dependency)
+    """
+    pass
+
+
+class Benchmark(object):
+    """A benchmark
+
+    :param str name: The name of the benchmark
+    :param function: The function to benchmark, it is called with the data
+      returned by the setup function.
+    :param setup: A callable which is called with the size and returns the
+      data for the benchmark function.
+    :param sizes: The data sizes of the benchmark
+    :param bool setup_every_repeat: If True the setup is called before every
+      repeat, it should be used for the benchmark functions which modify
+      their data.
+    """
+
+    def __init__(self, name, function, setup, sizes=SIZES,
+                 setup_every_repeat=False):
+        self.name = name
+        self.function = function
+        self.setup = setup
+        self.sizes = sizes
+        self.setup_every_repeat = setup_every_repeat
+
+    def run(self, size, repeat=3):
+        """runs the benchmark with the given size
+
+        :param int size: The size of the data
+        :param int repeat: The number of repeats
+        :returns: A dictionary with the name, size, repeat count, the best and
+          the mean durations in seconds
+        """
+        durations = []
+        data = None
+        for i in range(repeat):
+            if i == 0 or self.setup_every_repeat:
+                data = self.setup(size)
+            start = perf.perf_counter()
+            self.function(data)
+            durations.append(perf.perf_counter() - start)
+        del data
+
+        return {
+            'name': self.name,
+            'size': size,
+            'repeat': repeat,
+            'best': min(durations),
+            'mean': sum(durations) / len(durations)
+        }
+
+
+def benchmark(name, setup, sizes=SIZES, setup_every_repeat=False):
+    """A decorator which registers the decorated function as a benchmark
+
+    :param str name: The name of the benchmark
+    :param setup: A callable which is called with the size and returns the
+      data for the benchmark function.
+    :param sizes: The data sizes of the benchmark
+    :param bool setup_every_repeat: If True the setup is called before every
+      repeat.
+    """
+
+    def wrapper(f):
+        benchmarks.append(
+            Benchmark(name, f, setup, sizes, setup_every_repeat)
+        )
+        return f
+    return wrapper
+
+
+def load_benchmarks():
+    """imports the benchmark modules which registers the benchmarks
+    """
+    import importlib
+    for module_name in benchmark_modules:
+        importlib.import_module(module_name)
+
+
+def run(name_filter=None, max_size=None, repeat=3, stream=sys.stdout):
+    """runs the registered benchmarks
+
+    :param str name_filter: Only the benchmarks containing this string in
+      their names are run.
+    :param int max_size: The maximum data size to run the benchmarks with.
+    :param int repeat: The number of repeats.
+    :param stream: The progress is written to this file like object.
+    :returns: A list of result dictionaries, see :meth:`.Benchmark.run`
+    """
+    results = []
+    for benchmark_ in benchmarks:
+        if name_filter and name_filter not in benchmark_.name:
+            continue
+        for size in benchmark_.sizes:
+            if max_size is not None and size > max_size:
+                continue
+            try:
+                result = benchmark_.run(size, repeat)
+            except SkipBenchmark as e:
+                stream.write(
+                    '%-40s %10s skipped: %s\n' % (benchmark_.name, size, e)
+                )
+                break
+            stream.write(
+                '%-40s %10s %12.6f sec\n' %
+                (result['name'], result['size'], result['best'])
+            )
+            results.append(result)
+    return results
+
+
+def compare(results, baseline, threshold=0.1):
+    """compares the given results with the baseline results
+
+    :param list results: The results of :func:`.run`
+    :param list baseline: The baseline results
+    :param float threshold: The ratio of the allowed difference
+    :returns: A list of dictionaries with the name, size, best durations, the
+      ratio of the durations and the status which is one of "slower",
+      "faster", "same" or "new".
+    """
+    baseline_results = dict(
+        ((result['name'], result['size']), result) for result in baseline
+    )
+    comparison = []
+    for result in results:
+        key = (result['name'], result['size'])
+        baseline_result = baseline_results.get(key)
+        data = {
+            'name': result['name'],
+            'size': result['size'],
+            'best': result['best'],
+            'baseline': None,
+            'ratio': None,
+            'status': 'new'
+        }
+        if baseline_result is not None:
+            data['baseline'] = baseline_result['best']
+            if baseline_result['best']:
+                ratio = result['best'] / baseline_result['best']
+            else:
+                ratio = 1.0
+            data['ratio'] = ratio
+            if ratio > 1 + threshold:
+                data['status'] = 'slower'
+            elif ratio < 1 - threshold:
+                data['status'] = 'faster'
+            else:
+                data['status'] = 'same'
+        comparison.append(data)
+    return comparison
+
+
+def save_results(path, results):
+    """writes the given results to the given path as JSON
+
+    :param str path: The path of the JSON file
+    :param list results: The results of :func:`.run`
+    """
+    data = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    """reads the results from the given JSON file
+
+    :param str path: The path of the JSON file
+    :returns: list
+    """
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def main(argv=None):
+    """the command line interface
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '-o', '--output', help='the path of the results JSON file'
+    )
+    parser.add_argument(
+        '-b', '--baseline', help='the path of the baseline JSON file'
+    )
+    parser.add_argument(
+        '-f', '--filter', help='run the benchmarks containing this string'
+    )
+    parser.add_argument(
+        '-m', '--max-size', type=int, default=1000000,
+        help='the maximum data size (default: %(default)s)'
+    )
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=3,
+        help='the number of repeats (default: %(default)s)'
+    )
+    parser.add_argument(
+        '-t', '--threshold', type=float, default=0.1,
+        help='the allowed ratio of difference with the baseline '
+             '(default: %(default)s)'
+    )
+    args = parser.parse_args(argv)
+
+    load_benchmarks()
+    results = run(args.filter, args.max_size, args.repeat)
+
+    if args.output:
+        save_results(args.output, results)
+
+    if not args.baseline:
+        return 0
+
+    slower = False
+    for data in compare(results, load_results(args.baseline),
+                        args.threshold):
+        ratio = '-'
+        if data['ratio'] is not None:
+            ratio = '%.2fx' % data['ratio']
+        sys.stdout.write(
+            '%-40s %10s %8s %s\n' %
+            (data['name'], data['size'], ratio, data['status'])
+        )
+        if data['status'] == 'slower':
+            slower = True
+    return 1 if slower else 0
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+"""base85 benchmarks, the size is the number of 32 bit values
+"""
+import array
+import sys
+
+from anima.render.arnold import base85
+from tests.benchmarks import benchmark
+
+
+def generate_data(size):
+    """generates size float32 values
+    """
+    data = array.array('f', xrange(size))
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tostring()
+
+
+def generate_encoded_data(size):
+    """generates the encoded size float32 values
+    """
+    return base85.arnold_b85_encode(generate_data(size))
+
+
+@benchmark('base85.arnold_b85_encode', generate_data)
+def arnold_b85_encode(data):
+    base85.arnold_b85_encode(data)
+
+
+@benchmark('base85.arnold_b85_decode', generate_encoded_data)
+def arnold_b85_decode(data):
+    base85.arnold_b85_decode(data)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+"""anima.edit benchmarks, the size is the number of clips
+"""
+import os
+import atexit
+import tempfile
+from xml.etree import ElementTree
+
+from anima.edit import Sequence, Media, Video, Track, Clip, File, Rate
+from tests.benchmarks import benchmark, SkipBenchmark
+
+
+EDIT_SIZES = (1000, 10000, 100000)
+
+
+def generate_sequence(size, unique_files=None):
+    """generates a Sequence with size clips in one track
+
+    :param int size: The number of clips
+    :param int unique_files: The number of different files used by the
+      clips, defaults to size.
+    """
+    if unique_files is None:
+        unique_files = size
+
+    sequence = Sequence(name='SEQ001', duration=size * 10,
+                        rate=Rate(timebase='24'))
+    sequence.media = Media()
+    video = Video()
+    video.width = 1920
+    video.height = 1080
+    sequence.media.video = video
+
+    track = Track()
+    video.tracks.append(track)
+    for i in xrange(size):
+        file_number = i % unique_files
+        name = 'SEQ001_%06i_v001' % file_number
+        clip = Clip(id=name, name=name, start=i * 10, end=i * 10 + 10,
+                    duration=20, in_=5, out=15)
+        clip.file = File(
+            duration=20, name=name, pathurl='file://localhost/tmp/%s.mov' % name
+        )
+        track.clips.append(clip)
+    return sequence
+
+
+def reset_exported_files(sequence):
+    """resets the File.exported_once flags, so to_xml renders every file
+    """
+    for track in sequence.media.video.tracks:
+        for clip in track.clips:
+            clip.file.exported_once = False
+
+
+def generate_sequence_node(size):
+    """generates the xml sequence node of a Sequence with size clips
+    """
+    sequence = generate_sequence(size)
+    return ElementTree.fromstring(sequence.to_xml()).find('sequence')
+
+
+def generate_sequence_file(size):
+    """generates an xml file of a Sequence with size clips where every file is
+    used by 10 clips
+    """
+    sequence = generate_sequence(size, unique_files=max(size // 10, 1))
+    sequence.media.video.tracks[0].optimize_clips()
+    fd, path = tempfile.mkstemp(suffix='.xml')
+    atexit.register(os.remove, path)
+    with os.fdopen(fd, 'w') as f:
+        f.write(sequence.to_xml())
+    return path
+
+
+def generate_sequence_for_edl(size):
+    """generates a Sequence for to_edl
+    """
+    try:
+        import edl
+        import timecode
+    except ImportError as e:
+        raise SkipBenchmark(e)
+    return generate_sequence(size)
+
+
+def generate_track(size):
+    """generates a Track where every file is used by 10 clips
+    """
+    return generate_sequence(
+        size, unique_files=max(size // 10, 1)
+    ).media.video.tracks[0]
+
+
+@benchmark('edit.Sequence.from_xml', generate_sequence_node, EDIT_SIZES)
+def from_xml(sequence_node):
+    Sequence().from_xml(sequence_node)
+
+
+@benchmark('edit.Sequence.from_xml_file', generate_sequence_file, EDIT_SIZES)
+def from_xml_file(path):
+    Sequence().from_xml_file(path)
+
+
+@benchmark('edit.Sequence.to_xml', generate_sequence, EDIT_SIZES)
+def to_xml(sequence):
+    reset_exported_files(sequence)
+    sequence.to_xml()
+
+
+@benchmark('edit.Sequence.to_edl', generate_sequence_for_edl,
+           (1000, 10000))
+def to_edl(sequence):
+    sequence.to_edl()
+
+
+@benchmark('edit.Track.optimize_clips', generate_track, (1000, 10000),
+           setup_every_repeat=True)
+def optimize_clips(track):
+    track.optimize_clips()
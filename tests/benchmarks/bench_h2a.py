@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+"""h2a benchmarks, the size is the number of elements or points
+"""
+import array
+import sys
+
+from anima.render.arnold import h2a
+from tests.benchmarks import benchmark
+
+
+# the number of points of every generated curve
+points_per_curve = 10
+
+
+def pack(values, type_code):
+    """packs the given values as little endian
+    """
+    data = array.array(type_code, values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tostring()
+
+
+class CurveGeometry(object):
+    """a stand-in for hou.Geometry with curves having points_per_curve points
+    and the attributes used by h2a.curves2ass
+
+    :param int point_count: The number of points
+    """
+
+    def __init__(self, point_count):
+        curve_count = point_count // points_per_curve
+        self.intrinsic_values = {
+            'primitivecount': curve_count,
+            'pointcount': curve_count * points_per_curve,
+            'vertexcount': curve_count * points_per_curve,
+        }
+        self.prim_attribs = {
+            h2a.nsides_attribute_name: pack(
+                [points_per_curve] * curve_count, 'i'
+            ),
+            'uv_u': pack(xrange(curve_count), 'f'),
+            'uv_v': pack(xrange(curve_count), 'f'),
+        }
+        self.point_attribs = {
+            'P': pack(xrange(curve_count * points_per_curve * 3), 'f'),
+            'width': pack([0.1] * curve_count * points_per_curve, 'f'),
+        }
+
+    def intrinsicValueDict(self):
+        return self.intrinsic_values
+
+    def intrinsicValue(self, name):
+        return self.intrinsic_values[name]
+
+    def findPrimAttrib(self, name):
+        return name in self.prim_attribs
+
+    def findPointAttrib(self, name):
+        return name in self.point_attribs
+
+    def findVertexAttrib(self, name):
+        return False
+
+    def primIntAttribValuesAsString(self, name):
+        return self.prim_attribs[name]
+
+    def primFloatAttribValuesAsString(self, name):
+        return self.prim_attribs[name]
+
+    def pointFloatAttribValuesAsString(self, name):
+        return self.point_attribs[name]
+
+
+class CurveNode(object):
+    """a stand-in for hou.SopNode
+    """
+
+    def __init__(self, geo):
+        self.geo = geo
+
+    def geometry(self):
+        return self.geo
+
+    def path(self):
+        return '/obj/hair/OUT'
+
+
+def generate_text(size):
+    """generates a text of size characters
+    """
+    return 'abcdefghij' * (size // 10)
+
+
+def generate_curve_points(size):
+    """generates the positions of size points and the point counts of the
+    curves
+    """
+    geo = CurveGeometry(size)
+    return (
+        geo.pointFloatAttribValuesAsString('P'),
+        h2a.get_curve_point_counts(geo)
+    )
+
+
+def generate_curve_node(size):
+    """generates a node with a curve geometry with size points
+    """
+    return CurveNode(CurveGeometry(size))
+
+
+@benchmark('h2a.split_data', generate_text)
+def split_data(data):
+    h2a.split_data(data, 500)
+
+
+@benchmark('h2a.duplicate_curve_end_points', generate_curve_points)
+def duplicate_curve_end_points(data):
+    h2a.duplicate_curve_end_points(*data)
+
+
+@benchmark('h2a.curves2ass', generate_curve_node,
+           sizes=(1000, 10000, 100000, 1000000))
+def curves2ass(node):
+    h2a.curves2ass(node, 'hair')
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+"""RecentFileManager benchmarks, the size is the number of added files
+"""
+import atexit
+import shutil
+import tempfile
+
+import anima
+from anima.recent import RecentFileManager
+from tests.benchmarks import benchmark
+
+
+def generate_paths(size):
+    """returns a RecentFileManager saving to a temp folder, the temp folder
+    and size paths, where every path is repeated 5 times
+    """
+    cache_folder = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, cache_folder, True)
+    local_cache_folder = anima.local_cache_folder
+    anima.local_cache_folder = cache_folder
+    try:
+        rfm = RecentFileManager()
+    finally:
+        anima.local_cache_folder = local_cache_folder
+    paths = ['/mnt/projects/test/shot%s_v001.ma' % (i % (size // 5))
+             for i in xrange(size)]
+    return rfm, cache_folder, paths
+
+
+@benchmark('recent.RecentFileManager.add', generate_paths,
+           sizes=(1000, 10000))
+def add(data):
+    rfm, cache_folder, paths = data
+    # the cache file path is read on every save
+    local_cache_folder = anima.local_cache_folder
+    anima.local_cache_folder = cache_folder
+    try:
+        for path in paths:
+            rfm.add('Maya', path)
+    finally:
+        anima.local_cache_folder = local_cache_folder
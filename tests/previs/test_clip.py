@@ -291,6 +291,40 @@ class ClipTestCase(unittest.TestCase):
             c.to_xml()
         )
 
+    def test_clip_instances_do_not_have_an_instance_dictionary(self):
+        """testing if Clip instances are using __slots__ and new attributes
+        can not be added
+        """
+        c = Clip(id='shot1')
+        self.assertFalse(hasattr(c, '__dict__'))
+        with self.assertRaises(AttributeError):
+            c.some_attribute = 'some value'
+
+    def test_create_is_working_properly(self):
+        """testing if the _create() class method will create a Clip instance
+        with the given values
+        """
+        f = File(duration=34, name='shot2', pathurl='/tmp/shot2.mov')
+        r = Rate(timebase='24')
+        c = Clip._create(id='shot2', name='shot2', start=1, end=35,
+                         duration=34, enabled=False, in_=0, out=34,
+                         type_='Video', rate=r, file=f)
+        self.assertIsInstance(c, Clip)
+        self.assertEqual('shot2', c.id)
+        self.assertEqual('shot2', c.name)
+        self.assertEqual(1, c.start)
+        self.assertEqual(35, c.end)
+        self.assertEqual(34, c.duration)
+        self.assertFalse(c.enabled)
+        self.assertEqual(0, c.in_)
+        self.assertEqual(34, c.out)
+        self.assertEqual('Video', c.type)
+        self.assertIs(r, c.rate)
+        self.assertIs(f, c.file)
+
+        # the attributes are still validated after the creation
+        with self.assertRaises(TypeError):
+            c.name = 123
 
         # def test_in_is_bigger_than_out_will_be_converted_to_negative_values(self):
     #     """testing if setting the in smaller than out will convert the in to
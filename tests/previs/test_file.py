@@ -179,3 +179,44 @@ class FileTestCase(unittest.TestCase):
             call2,
             '<file id="%s"/>' % f.id
         )
+
+    def test_to_xml_stream_method_is_working_properly(self):
+        """testing if the to_xml_stream method will write the xml data to the
+        given file like object
+        """
+        from StringIO import StringIO
+        f = File(
+            duration=34,
+            name='shot2',
+            pathurl='file://localhost/home/eoyilmaz/maya/projects/default/'
+                    'data/shot2.mov'
+        )
+        stream = StringIO()
+        f.to_xml_stream(stream, indentation=2, pre_indent=2)
+        f.to_xml_stream(stream, indentation=2, pre_indent=2)
+
+        expected_xml = \
+            """  <file id="shot2.mov">
+    <duration>34</duration>
+    <name>shot2</name>
+    <pathurl>file://localhost/home/eoyilmaz/maya/projects/default/data/shot2.mov</pathurl>
+  </file>  <file id="shot2.mov"/>"""
+
+        self.assertEqual(expected_xml, stream.getvalue())
+
+    def test_create_is_working_properly(self):
+        """testing if the _create() class method will create a File instance
+        without an instance dictionary and will set the id from the pathurl
+        """
+        f = File._create(
+            duration=34,
+            name='shot2',
+            pathurl='file://localhost/tmp/shot%5B001-034%5D.exr'
+        )
+        self.assertFalse(hasattr(f, '__dict__'))
+        self.assertEqual(34, f.duration)
+        self.assertEqual('shot2', f.name)
+        self.assertEqual('file://localhost/tmp/shot%5B001-034%5D.exr',
+                         f.pathurl)
+        self.assertEqual('shot[001-034].exr', f.id)
+        self.assertFalse(f.exported_once)
@@ -164,3 +164,11 @@ class RateTestCase(unittest.TestCase):
 
         self.assertEqual(r.timebase, '25')
         self.assertEqual(r.ntsc, True)
+
+    def test_rate_instances_do_not_have_an_instance_dictionary(self):
+        """testing if Rate instances are using __slots__
+        """
+        r = Rate(timebase='24', ntsc=False)
+        self.assertFalse(hasattr(r, '__dict__'))
+        with self.assertRaises(AttributeError):
+            r.some_attribute = 'some value'
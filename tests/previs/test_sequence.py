@@ -382,6 +382,156 @@ class SequenceTestCase(unittest.TestCase):
             f.pathurl
         )
 
+    def test_from_xml_file_method_is_working_properly(self):
+        """testing if the from_xml_file method will fill object attributes in
+        the same way with the from_xml method
+        """
+        from xml.etree import ElementTree
+        xml_path = os.path.join(
+            os.path.dirname(__file__), 'test_data', 'test_v001.xml'
+        )
+        s1 = Sequence()
+        s1.from_xml(ElementTree.parse(xml_path).getroot().getchildren()[0])
+
+        s2 = Sequence()
+        s2.from_xml_file(xml_path)
+
+        self.assertEqual(s1.name, s2.name)
+        self.assertEqual(s1.duration, s2.duration)
+        self.assertEqual(s1.timecode, s2.timecode)
+        self.assertEqual(s1.rate.timebase, s2.rate.timebase)
+        self.assertEqual(s1.rate.ntsc, s2.rate.ntsc)
+        self.assertEqual(s1.media.video.width, s2.media.video.width)
+        self.assertEqual(s1.media.video.height, s2.media.video.height)
+        self.assertEqual(
+            len(s1.media.video.tracks), len(s2.media.video.tracks)
+        )
+        for t1, t2 in zip(s1.media.video.tracks, s2.media.video.tracks):
+            self.assertEqual(t1.locked, t2.locked)
+            self.assertEqual(t1.enabled, t2.enabled)
+            self.assertEqual(len(t1.clips), len(t2.clips))
+            for c1, c2 in zip(t1.clips, t2.clips):
+                self.assertEqual(c1.to_xml(), c2.to_xml())
+
+    def test_from_xml_file_method_reuses_file_instances(self):
+        """testing if the from_xml_file method will use the same File instance
+        for the file references
+        """
+        import tempfile
+        s = Sequence(name='SEQ001', rate=Rate(timebase='24'))
+        s.media = Media()
+        s.media.video = Video()
+        t = Track()
+        s.media.video.tracks.append(t)
+        for i in range(3):
+            c = Clip(id='shot%s' % i, name='shot%s' % i, start=i * 10,
+                     end=i * 10 + 10, duration=10, out=10)
+            c.file = File(duration=10, name='shot', pathurl='/tmp/shot.mov')
+            t.clips.append(c)
+        t.optimize_clips()
+
+        fd, xml_path = tempfile.mkstemp(suffix='.xml')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(s.to_xml())
+
+            s2 = Sequence()
+            s2.from_xml_file(xml_path)
+        finally:
+            os.remove(xml_path)
+
+        clips = s2.media.video.tracks[0].clips
+        self.assertEqual(
+            ['shot0', 'shot1', 'shot2'], [c.id for c in clips]
+        )
+        self.assertEqual(
+            'file://localhost/tmp/shot.mov', clips[0].file.pathurl
+        )
+        self.assertIs(clips[0].file, clips[1].file)
+        self.assertIs(clips[0].file, clips[2].file)
+
+    def test_to_xml_stream_method_is_working_properly(self):
+        """testing if the to_xml_stream method will write the same data with
+        the to_xml method to the given file like object
+        """
+        from StringIO import StringIO
+        xml_path = os.path.join(
+            os.path.dirname(__file__), 'test_data', 'test_v003.xml'
+        )
+        # File.exported_once is changed by the export, so use two sequences
+        s1 = Sequence()
+        s1.from_xml_file(xml_path)
+        s2 = Sequence()
+        s2.from_xml_file(xml_path)
+        for track in s1.media.video.tracks + s2.media.video.tracks:
+            track.optimize_clips()
+
+        stream = StringIO()
+        s2.to_xml_stream(stream, indentation=4, pre_indent=2)
+        self.assertEqual(
+            s1.to_xml(indentation=4, pre_indent=2),
+            stream.getvalue()
+        )
+
+    def test_from_xml_and_from_xml_file_resolve_file_references_same(self):
+        """testing if the from_xml and from_xml_file methods will resolve the
+        file references in the same way and skip the audio clips
+        """
+        import tempfile
+        from xml.etree import ElementTree
+        s = Sequence(name='SEQ001', rate=Rate(timebase='24'))
+        s.media = Media()
+        s.media.video = Video()
+        f = File(duration=10, name='shot', pathurl='/tmp/shot.mov')
+        for i in range(2):
+            t = Track()
+            s.media.video.tracks.append(t)
+            for j in range(2):
+                c = Clip(id='shot%s%s' % (i, j), name='shot%s%s' % (i, j),
+                         start=j * 10, end=j * 10 + 10, duration=10, out=10)
+                c.file = f
+                t.clips.append(c)
+
+        audio_clip = Clip(id='audio', name='audio', end=10, duration=10,
+                          out=10)
+        audio_clip.file = File(duration=10, name='audio',
+                               pathurl='/tmp/audio.wav')
+        audio_track = Track()
+        audio_track.clips.append(audio_clip)
+        xml = s.to_xml().replace(
+            '</media>',
+            '<audio>%s</audio></media>' % audio_track.to_xml()
+        )
+
+        fd, xml_path = tempfile.mkstemp(suffix='.xml')
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                fp.write(xml)
+
+            s1 = Sequence()
+            s1.from_xml(ElementTree.parse(xml_path).getroot()[0])
+
+            s2 = Sequence()
+            s2.from_xml_file(xml_path)
+        finally:
+            os.remove(xml_path)
+
+        for seq in (s1, s2):
+            clips = [c for t in seq.media.video.tracks for c in t.clips]
+            self.assertEqual(
+                ['shot00', 'shot01', 'shot10', 'shot11'],
+                [c.id for c in clips]
+            )
+            self.assertEqual(
+                'file://localhost/tmp/shot.mov', clips[0].file.pathurl
+            )
+            for c in clips[1:]:
+                self.assertIs(clips[0].file, c.file)
+
+        for t1, t2 in zip(s1.media.video.tracks, s2.media.video.tracks):
+            for c1, c2 in zip(t1.clips, t2.clips):
+                self.assertEqual(c1.to_xml(), c2.to_xml())
+
     def test_to_edl_will_raise_RuntimeError_if_no_Media_instance_presents(self):
         """testing if a RuntimeError will be raised when there is no Media
         instance present in Sequence
@@ -959,3 +1109,45 @@ class SequenceTestCase(unittest.TestCase):
             expected_xmls[2],
             result[2]
         )
+
+    def test_to_metafuze_xml_files_is_working_properly(self):
+        """testing if to_metafuze_xml_files method will write one MetaFuze XML
+        file per media file to the given folder
+        """
+        import shutil
+        import tempfile
+        s = Sequence(name='SEQ001_HSNI_003', rate=Rate(timebase='24'))
+        s.media = Media()
+        s.media.video = Video()
+        s.media.video.width = 1024
+        s.media.video.height = 778
+        t = Track()
+        s.media.video.tracks.append(t)
+
+        for i, name in enumerate(['0010', '0020', '0010']):
+            c = Clip(id=name, name='SEQ001_HSNI_003_%s_v001' % name,
+                     duration=30 + i)
+            c.file = File(
+                duration=30,
+                name='SEQ001_HSNI_003_%s_v001' % name,
+                pathurl='file://localhost/tmp/SEQ001_HSNI_003_%s_v001.mov'
+                        % name
+            )
+            t.clips.append(c)
+
+        output_path = tempfile.mkdtemp()
+        try:
+            xml_paths = s.to_metafuze_xml_files(output_path, probe=False)
+
+            # the third clip uses the same file with the first one
+            self.assertEqual(
+                [os.path.join(output_path, 'SEQ001_HSNI_003_0010_v001.xml'),
+                 os.path.join(output_path, 'SEQ001_HSNI_003_0020_v001.xml')],
+                xml_paths
+            )
+            expected_xmls = s.to_metafuze_xml()
+            for xml_path, expected_xml in zip(xml_paths, expected_xmls):
+                with open(xml_path) as f:
+                    self.assertEqual(expected_xml, f.read())
+        finally:
+            shutil.rmtree(output_path)
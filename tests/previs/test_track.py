@@ -362,6 +362,37 @@ class TrackTestCase(unittest.TestCase):
         self.assertNotEqual(t.clips[0].file, t.clips[2].file)
         self.assertNotEqual(t.clips[1].file, t.clips[2].file)
 
+    def test_optimize_clips_renames_the_clips_with_the_same_id(self):
+        """testing if the optimize_clips method will rename the clips having
+        the same id with an earlier clip
+        """
+        t = Track()
+        for id_ in ['shot1', 'shot1', 'shot2', 'shot1', 'shot 010',
+                    'shot 010']:
+            c = Clip(id=id_)
+            c.file = File(pathurl='/tmp/%s.mov' % id_)
+            t.clips.append(c)
+
+        t.optimize_clips()
+        self.assertEqual(
+            ['shot1', 'shot1 2', 'shot2', 'shot1 3', 'shot 010', 'shot 11'],
+            [c.id for c in t.clips]
+        )
+
+    def test_optimize_clips_handles_collisions_created_by_renaming(self):
+        """testing if the optimize_clips method will not create an id which
+        is already used by an earlier clip
+        """
+        t = Track()
+        for id_ in ['shot1 2', 'shot1', 'shot1', 'shot1 2', 'shot1']:
+            t.clips.append(Clip(id=id_))
+
+        t.optimize_clips()
+        self.assertEqual(
+            ['shot1 2', 'shot1', 'shot1 3', 'shot1 4', 'shot1 5'],
+            [c.id for c in t.clips]
+        )
+
     def test_to_xml_method_with_optimized_clips_is_working_properly(self):
         """testing if the to xml method is working properly with the clips are
         optimized
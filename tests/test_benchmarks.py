@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import unittest
+
+from tests import benchmarks
+
+
+class BenchmarksTestCase(unittest.TestCase):
+    """tests the tests.benchmarks module
+    """
+
+    def test_benchmark_run(self):
+        """testing if the benchmark is run with the data of the setup function
+        """
+        calls = []
+
+        def setup(size):
+            calls.append(('setup', size))
+            return range(size)
+
+        def function(data):
+            calls.append(('function', len(data)))
+
+        benchmark = benchmarks.Benchmark('test', function, setup, (10,))
+        result = benchmark.run(10, repeat=2)
+        self.assertEqual(
+            [('setup', 10), ('function', 10), ('function', 10)], calls
+        )
+        self.assertEqual('test', result['name'])
+        self.assertEqual(10, result['size'])
+        self.assertEqual(2, result['repeat'])
+        self.assertTrue(result['best'] <= result['mean'])
+
+    def test_setup_every_repeat(self):
+        """testing if the setup is called before every repeat if
+        setup_every_repeat is True
+        """
+        calls = []
+        benchmark = benchmarks.Benchmark(
+            'test', lambda data: None, calls.append, (10,),
+            setup_every_repeat=True
+        )
+        benchmark.run(10, repeat=3)
+        self.assertEqual([10, 10, 10], calls)
+
+    def test_compare(self):
+        """testing if the results are compared with the baseline
+        """
+        baseline = [
+            {'name': 'a', 'size': 1000, 'best': 1.0},
+            {'name': 'b', 'size': 1000, 'best': 1.0},
+            {'name': 'c', 'size': 1000, 'best': 1.0},
+        ]
+        results = [
+            {'name': 'a', 'size': 1000, 'best': 1.5},
+            {'name': 'b', 'size': 1000, 'best': 0.5},
+            {'name': 'c', 'size': 1000, 'best': 1.05},
+            {'name': 'c', 'size': 10000, 'best': 1.0},
+        ]
+        comparison = benchmarks.compare(results, baseline, threshold=0.1)
+        self.assertEqual(
+            ['slower', 'faster', 'same', 'new'],
+            [data['status'] for data in comparison]
+        )
+        self.assertEqual(1.5, comparison[0]['ratio'])
+        self.assertIsNone(comparison[3]['baseline'])
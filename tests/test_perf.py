@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import os
+import csv
+import json
+import pstats
+import shutil
+import logging
+import tempfile
+import unittest
+
+from anima import perf
+
+
+class ListHandler(logging.Handler):
+    """collects the log messages in a list
+    """
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class StageRecorderTestCase(unittest.TestCase):
+    """tests the anima.perf.StageRecorder class
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.written = []
+        self.recorder = perf.StageRecorder(
+            'export', byte_counter=lambda: sum(map(len, self.written))
+        )
+
+    def test_nested_stages(self):
+        """testing if the stages are recorded as a tree
+        """
+        with self.recorder.stage('first', bytes_in=10):
+            with self.recorder.stage('nested') as stage:
+                stage.bytes_in += 5
+                self.written.append('12345')
+            self.written.append('123')
+        with self.recorder.stage('second'):
+            pass
+        self.recorder.finish()
+
+        data = self.recorder.to_dict()
+        self.assertEqual('export', data['name'])
+        self.assertEqual(
+            ['first', 'second'], [child['name'] for child in data['children']]
+        )
+        first = data['children'][0]
+        self.assertEqual(10, first['bytes_in'])
+        self.assertEqual(8, first['bytes_out'])
+        self.assertEqual('nested', first['children'][0]['name'])
+        self.assertEqual(5, first['children'][0]['bytes_in'])
+        self.assertEqual(5, first['children'][0]['bytes_out'])
+        self.assertEqual(10, data['bytes_in'])
+        self.assertEqual(8, data['bytes_out'])
+        self.assertTrue(first['wall_time'] >= 0)
+        self.assertTrue(first['cpu_time'] >= 0)
+        self.assertEqual(data, json.loads(self.recorder.to_json()))
+
+    def test_stage_is_recorded_on_exceptions(self):
+        """testing if the stage is recorded even if the code raises an
+        exception
+        """
+        with self.assertRaises(RuntimeError):
+            with self.recorder.stage('failing'):
+                raise RuntimeError()
+        self.assertEqual(
+            ['failing'], [child.name for child in self.recorder.root.children]
+        )
+        with self.recorder.stage('next'):
+            pass
+        self.assertEqual([], self.recorder.root.children[0].children)
+
+    def test_disabled_recorder(self):
+        """testing if a disabled recorder does not record anything
+        """
+        recorder = perf.StageRecorder('export', enabled=False)
+        with recorder.stage('first') as stage:
+            stage.bytes_in += 10
+        recorder.finish()
+        self.assertEqual([], recorder.root.children)
+        self.assertEqual(0, recorder.root.bytes_in)
+
+    def test_log(self):
+        """testing if the stages are logged as an indented tree
+        """
+        with self.recorder.stage('first'):
+            with self.recorder.stage('nested'):
+                pass
+        self.recorder.finish()
+
+        logger = logging.getLogger('test_perf')
+        handler = ListHandler()
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        try:
+            self.recorder.log(logger)
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(3, len(handler.messages))
+        self.assertTrue(handler.messages[0].startswith('export '))
+        self.assertTrue(handler.messages[1].startswith('  first '))
+        self.assertTrue(handler.messages[2].startswith('    nested '))
+
+
+class ProfileTestCase(unittest.TestCase):
+    """tests the anima.perf.profile decorator, spans and the registry
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.enabled = perf.enabled
+        perf.enable()
+        perf.registry.clear()
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """clean up the test
+        """
+        perf.enabled = self.enabled
+        perf.registry.clear()
+        perf.cprofile_captures.clear()
+        shutil.rmtree(self.temp_dir)
+
+    def test_timing(self):
+        """testing if the Timing class aggregates the durations
+        """
+        timing = perf.Timing('test')
+        for duration in range(1, 101):
+            timing.add(float(duration))
+        self.assertEqual(100, timing.count)
+        self.assertEqual(5050.0, timing.total)
+        self.assertEqual(1.0, timing.min)
+        self.assertEqual(100.0, timing.max)
+        self.assertEqual(50.5, timing.mean)
+        self.assertEqual(95.0, timing.percentile(95))
+
+    def test_timing_keeps_the_latest_samples(self):
+        """testing if only the latest sample_size durations are used for the
+        percentiles
+        """
+        timing = perf.Timing('test')
+        for duration in range(perf.sample_size + 10):
+            timing.add(float(duration))
+        self.assertEqual(perf.sample_size, len(timing.samples))
+        self.assertEqual(10.0, min(timing.samples))
+        self.assertEqual(0.0, timing.min)
+
+    def test_profile_decorator(self):
+        """testing if the profile decorator adds the durations to the registry
+        """
+        @perf.profile('test.function')
+        def function(a, b=1):
+            return a + b
+
+        self.assertEqual(3, function(1, b=2))
+        self.assertEqual(2, function(1))
+        self.assertEqual('function', function.__name__)
+        self.assertEqual(2, perf.registry.get('test.function').count)
+
+    def test_profile_decorator_default_name(self):
+        """testing if the module and the name of the function is used as the
+        default name
+        """
+        @perf.profile()
+        def function():
+            pass
+
+        function()
+        self.assertIsNotNone(perf.registry.get('%s.function' % __name__))
+
+    def test_profile_decorator_with_exceptions(self):
+        """testing if the duration is recorded if the function raises an
+        exception
+        """
+        @perf.profile('test.function')
+        def function():
+            raise RuntimeError()
+
+        self.assertRaises(RuntimeError, function)
+        self.assertEqual(1, perf.registry.get('test.function').count)
+
+    def test_disabled(self):
+        """testing if nothing is recorded when profiling is disabled
+        """
+        @perf.profile('test.function')
+        def function():
+            return 1
+
+        perf.disable()
+        self.assertEqual(1, function())
+        self.assertIs(perf.null_span, perf.span('test.span'))
+        with perf.span('test.span'):
+            pass
+        self.assertEqual({}, perf.registry.timings)
+
+    def test_span(self):
+        """testing if spans add the durations to the registry
+        """
+        for i in range(3):
+            with perf.span('test.span'):
+                pass
+        self.assertEqual(3, perf.registry.get('test.span').count)
+
+    def test_dump_json_and_csv(self):
+        """testing if the registry can be dumped as JSON and CSV
+        """
+        perf.registry.add('a', 1.0)
+        perf.registry.add('a', 3.0)
+        perf.registry.add('b', 5.0)
+
+        json_path = os.path.join(self.temp_dir, 'perf.json')
+        perf.registry.dump_json(json_path)
+        with open(json_path) as f:
+            data = json.load(f)
+        self.assertEqual(['b', 'a'], [timing['name'] for timing in data])
+        self.assertEqual(2, data[1]['count'])
+        self.assertEqual(4.0, data[1]['total'])
+        self.assertEqual(2.0, data[1]['mean'])
+        self.assertEqual(3.0, data[1]['p95'])
+
+        csv_path = os.path.join(self.temp_dir, 'perf.csv')
+        perf.registry.dump_csv(csv_path)
+        with open(csv_path, 'rb') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(['b', 'a'], [row['name'] for row in rows])
+        self.assertEqual('2', rows[1]['count'])
+
+    def test_capture_cprofile(self):
+        """testing if the profiled function is run under cProfile
+        """
+        @perf.profile('test.function')
+        def function():
+            return sum(range(100))
+
+        perf.capture_cprofile('test.function', self.temp_dir)
+        self.assertEqual(4950, function())
+        stats_files = os.listdir(self.temp_dir)
+        self.assertEqual(1, len(stats_files))
+        self.assertTrue(stats_files[0].startswith('test.function_'))
+        pstats.Stats(os.path.join(self.temp_dir, stats_files[0]))
+
+        perf.stop_cprofile_capture('test.function')
+        function()
+        self.assertEqual(1, len(os.listdir(self.temp_dir)))
+        self.assertEqual(2, perf.registry.get('test.function').count)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import os
+import sys
+import stat
+import time
+import shutil
+import tempfile
+import threading
+import traceback
+import unittest
+
+from anima.utils import ffmpeg_runner, get_executor
+
+
+# a fake ffmpeg, the arguments are:
+#   number of frames, exit code, seconds to sleep per frame
+fake_ffmpeg_source = '''#!%(python)s
+import sys
+import time
+
+args = sys.argv[sys.argv.index('pipe:1') + 1:]
+frame_count, exit_code, sleep = int(args[0]), int(args[1]), float(args[2])
+for i in range(1, frame_count + 1):
+    time.sleep(sleep)
+    sys.stderr.write('frame %%s\\n' %% i)
+    sys.stderr.flush()
+    sys.stdout.write(
+        'frame=%%s\\nfps=25.00\\nout_time_ms=%%s\\nspeed=2.5x\\n'
+        'progress=%%s\\n' %% (
+            i, i * 40000, 'end' if i == frame_count else 'continue'
+        )
+    )
+    sys.stdout.flush()
+sys.exit(exit_code)
+'''
+
+
+class FFmpegRunnerTestCase(unittest.TestCase):
+    """tests the anima.utils.ffmpeg_runner module
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.command_path = os.path.join(self.temp_dir, 'ffmpeg')
+        with open(self.command_path, 'w') as f:
+            f.write(fake_ffmpeg_source % {'python': sys.executable})
+        os.chmod(self.command_path, stat.S_IRWXU)
+
+    def tearDown(self):
+        """clean up the test
+        """
+        shutil.rmtree(self.temp_dir)
+
+    def create_process(self, frame_count=3, exit_code=0, sleep=0, **kwargs):
+        """creates an FFmpegProcess running the fake ffmpeg
+        """
+        return ffmpeg_runner.FFmpegProcess(
+            [str(frame_count), str(exit_code), str(sleep)],
+            command_path=self.command_path,
+            **kwargs
+        )
+
+    def test_progress_callback_is_working_properly(self):
+        """testing if the progress callback will be called with the parsed
+        progress blocks
+        """
+        progresses = []
+        process = self.create_process(progress_callback=progresses.append)
+        stderr = process.run()
+
+        self.assertEqual(['frame 1\n', 'frame 2\n', 'frame 3\n'], stderr)
+        self.assertEqual([1, 2, 3], [p.frame for p in progresses])
+        self.assertEqual([25.0] * 3, [p.fps for p in progresses])
+        self.assertEqual([0.04, 0.08, 0.12], [p.out_time for p in progresses])
+        self.assertEqual([2.5] * 3, [p.speed for p in progresses])
+        self.assertEqual([False, False, True], [p.done for p in progresses])
+        self.assertEqual(0, process.returncode)
+        self.assertTrue(process.done())
+
+    def test_stderr_buffer_is_bounded(self):
+        """testing if only the last lines of stderr will be kept
+        """
+        process = self.create_process(frame_count=20, stderr_buffer_size=5)
+        self.assertEqual(
+            ['frame %s\n' % i for i in range(16, 21)],
+            process.run()
+        )
+
+    def test_non_zero_exit_code_raises_ffmpeg_error(self):
+        """testing if an FFmpegError will be raised if ffmpeg exits with a
+        non-zero code
+        """
+        process = self.create_process(exit_code=1)
+        with self.assertRaises(ffmpeg_runner.FFmpegError) as cm:
+            process.run()
+
+        self.assertTrue(isinstance(cm.exception, RuntimeError))
+        self.assertEqual(1, cm.exception.returncode)
+        self.assertEqual('frame 3\n', cm.exception.stderr[-1])
+        self.assertEqual(process.command, cm.exception.command)
+
+    def test_errors_are_raised_with_the_original_traceback(self):
+        """testing if the run() and wait() methods will raise the error with
+        the traceback of the place it is raised at
+        """
+        process = self.create_process(exit_code=1)
+        get_executor(1).submit(process.run)
+
+        for method in [process.wait, process.run]:
+            try:
+                method()
+            except ffmpeg_runner.FFmpegError:
+                tb = traceback.extract_tb(sys.exc_info()[2])
+            else:
+                self.fail('FFmpegError is not raised')
+            self.assertIn('_run', [frame[2] for frame in tb])
+
+    def test_missing_command_raises_ffmpeg_error(self):
+        """testing if an FFmpegError will be raised if there is no ffmpeg
+        """
+        process = ffmpeg_runner.FFmpegProcess(
+            [], command_path=os.path.join(self.temp_dir, 'no_ffmpeg')
+        )
+        with self.assertRaises(ffmpeg_runner.FFmpegError):
+            process.run()
+
+    def test_timeout_is_working_properly(self):
+        """testing if the process will be killed and an FFmpegTimeoutError
+        will be raised when the timeout is reached
+        """
+        process = self.create_process(frame_count=100, sleep=0.1, timeout=0.3)
+        start = time.time()
+        with self.assertRaises(ffmpeg_runner.FFmpegTimeoutError):
+            process.run()
+        self.assertLess(time.time() - start, 2)
+
+    def test_cancel_is_working_properly(self):
+        """testing if the cancel() method will kill the process and an
+        FFmpegCancelledError will be raised
+        """
+        process = self.create_process(frame_count=100, sleep=0.1)
+        threading.Timer(0.3, process.cancel).start()
+        with self.assertRaises(ffmpeg_runner.FFmpegCancelledError):
+            process.run()
+        self.assertTrue(process.cancelled)
+
+    def test_cancel_before_run(self):
+        """testing if a process cancelled before it is run will not be
+        started
+        """
+        process = self.create_process()
+        process.cancel()
+        with self.assertRaises(ffmpeg_runner.FFmpegCancelledError):
+            process.run()
+        self.assertIsNone(process.returncode)
+
+    def test_processes_run_on_the_executor_at_the_same_time(self):
+        """testing if the processes submitted to an executor will run at the
+        same time and the errors will be raised by the wait() method
+        """
+        executor = get_executor(4)
+        processes = []
+        start = time.time()
+        for exit_code in [0, 0, 0, 1]:
+            process = self.create_process(exit_code=exit_code, sleep=0.1)
+            executor.submit(process.run)
+            processes.append(process)
+
+        for process in processes[:3]:
+            self.assertEqual(3, len(process.wait()))
+
+        with self.assertRaises(ffmpeg_runner.FFmpegError):
+            processes[3].wait()
+
+        self.assertLess(time.time() - start, 1.0)
+
+    def test_wait_timeout(self):
+        """testing if the wait() method will raise an FFmpegTimeoutError if
+        the process is not finished in the given time
+        """
+        process = self.create_process()
+        with self.assertRaises(ffmpeg_runner.FFmpegTimeoutError):
+            process.wait(0.01)
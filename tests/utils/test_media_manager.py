@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import os
+import sys
+import json
+import stat
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from anima import utils
+from anima.utils import MediaManager, VideoInfoCache
+
+
+# a fake ffmpeg writing its arguments next to itself
+fake_ffmpeg_source = '''#!%(python)s
+import sys
+import json
+
+with open(sys.argv[0] + '.args', 'w') as f:
+    json.dump(sys.argv[1:], f)
+'''
+
+
+class FakeMediaManager(MediaManager):
+    """A MediaManager which returns a fake ffprobe output instead of calling
+    ffprobe
+    """
+
+    def __init__(self):
+        super(FakeMediaManager, self).__init__()
+        self.ffprobe_calls = []
+        self.ffmpeg_calls = []
+        self.lock = threading.Lock()
+
+    def ffprobe(self, **kwargs):
+        """returns a fake ffprobe JSON output
+        """
+        with self.lock:
+            self.ffprobe_calls.append(kwargs)
+
+        full_path = kwargs['i']
+        if 'missing' in full_path:
+            # ffprobe returns nothing for missing files
+            return []
+
+        width, height = (1920, 1080) if 'hd' in full_path else (1024, 778)
+        data = {
+            'streams': [
+                {
+                    'index': 0,
+                    'codec_type': 'video',
+                    'width': width,
+                    'height': height,
+                    'r_frame_rate': '25/1',
+                    'duration': '2.000000',
+                    'tags': {'language': 'und'}
+                }
+            ],
+            'format': {
+                'filename': full_path,
+                'duration': '2.000000',
+                'tags': {'encoder': 'Lavf'}
+            }
+        }
+        return json.dumps(data, indent=2).splitlines(True)
+
+    def ffmpeg(self, **kwargs):
+        """records the call and creates the output file instead of calling
+        ffmpeg
+        """
+        with self.lock:
+            self.ffmpeg_calls.append(kwargs)
+
+        with open(kwargs['o'], 'w') as f:
+            f.write('thumbnail')
+
+
+class SlowMediaManager(MediaManager):
+    """A MediaManager which creates fake web versions and thumbnails slowly
+    """
+
+    def __init__(self, fail_web=False, fail_thumbnail=False):
+        super(SlowMediaManager, self).__init__()
+        self.fail_web = fail_web
+        self.fail_thumbnail = fail_thumbnail
+        self.temp_paths = []
+
+    def create_temp_file(self, suffix):
+        """creates a temp file after waiting a little
+        """
+        time.sleep(0.2)
+        path = tempfile.mktemp(suffix=suffix)
+        with open(path, 'w') as f:
+            f.write(suffix)
+        self.temp_paths.append(path)
+        return path
+
+    def generate_media_for_web(self, file_full_path):
+        """creates a fake web version
+        """
+        if self.fail_web:
+            raise RuntimeError('not a media file')
+        return self.create_temp_file(self.web_video_format)
+
+    def generate_thumbnail(self, file_full_path):
+        """creates a fake thumbnail
+        """
+        if self.fail_thumbnail:
+            raise RuntimeError('not a media file')
+        return self.create_temp_file(self.thumbnail_format)
+
+
+class MediaManagerTestCase(unittest.TestCase):
+    """tests the anima.utils.MediaManager class
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_video_info_cache = utils.video_info_cache
+        utils.video_info_cache = VideoInfoCache(
+            os.path.join(self.temp_dir, 'cache', 'video_info_cache')
+        )
+
+    def tearDown(self):
+        """clean up the test
+        """
+        utils.video_info_cache = self.original_video_info_cache
+        shutil.rmtree(self.temp_dir)
+
+    def create_file(self, file_name):
+        """creates an empty file in the temp dir
+        """
+        path = os.path.join(self.temp_dir, file_name)
+        with open(path, 'w') as f:
+            f.write(file_name)
+        return path
+
+    def test_get_video_info_is_working_properly(self):
+        """testing if the get_video_info() method will return the ffprobe
+        output in the ffprobe default output format
+        """
+        path = self.create_file('shot_hd.mov')
+        mm = FakeMediaManager()
+        media_info = mm.get_video_info(path)
+
+        self.assertEqual(
+            {
+                'video_info': {
+                    'filename': path,
+                    'duration': '2.000000',
+                    'TAG:encoder': 'Lavf'
+                },
+                'stream_info': [
+                    {
+                        'index': '0',
+                        'codec_type': 'video',
+                        'width': '1920',
+                        'height': '1080',
+                        'r_frame_rate': '25/1',
+                        'duration': '2.000000',
+                        'TAG:language': 'und'
+                    }
+                ]
+            },
+            media_info
+        )
+
+        # ffprobe is called only once
+        self.assertEqual(1, len(mm.ffprobe_calls))
+        self.assertEqual(
+            {
+                'print_format': 'json',
+                'show_streams': None,
+                'show_format': None,
+                'i': path
+            },
+            mm.ffprobe_calls[0]
+        )
+
+    def test_get_video_info_uses_the_cache(self):
+        """testing if the get_video_info() method will not call ffprobe again
+        for the same file, even with a new MediaManager, until the file is
+        changed
+        """
+        path = self.create_file('shot.mov')
+        mm1 = FakeMediaManager()
+        media_info = mm1.get_video_info(path)
+        self.assertEqual(1, len(mm1.ffprobe_calls))
+
+        # restore the cache from the cache file
+        utils.video_info_cache = VideoInfoCache(utils.video_info_cache.path)
+        mm2 = FakeMediaManager()
+        self.assertEqual(media_info, mm2.get_video_info(path))
+        self.assertEqual(0, len(mm2.ffprobe_calls))
+
+        # change the file
+        with open(path, 'a') as f:
+            f.write('some more data')
+        mm2.get_video_info(path)
+        self.assertEqual(1, len(mm2.ffprobe_calls))
+
+    def test_video_info_cache_removes_the_least_recently_used_values(self):
+        """testing if the VideoInfoCache will remove the least recently used
+        values when the max_size is exceeded
+        """
+        cache = VideoInfoCache(
+            os.path.join(self.temp_dir, 'lru_cache'), max_size=2
+        )
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.set('c', 3)
+
+        cache = VideoInfoCache(cache.path, max_size=2)
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
+    def test_video_info_cache_keeps_the_values_of_other_processes(self):
+        """testing if the VideoInfoCache will not remove the values written
+        to the cache file by the other processes
+        """
+        path = os.path.join(self.temp_dir, 'shared_cache')
+        cache1 = VideoInfoCache(path)
+        cache2 = VideoInfoCache(path)
+        cache1.set('a', 1)
+        cache2.set('b', 2)
+        cache1.set('c', 3)
+
+        cache = VideoInfoCache(path)
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(2, cache.get('b'))
+        self.assertEqual(3, cache.get('c'))
+
+        # no temp files are left behind
+        self.assertEqual(
+            ['shared_cache'],
+            [file_name for file_name in os.listdir(self.temp_dir)
+             if file_name.startswith('shared_cache')]
+        )
+
+    def test_video_info_cache_batch_writes_the_file_once(self):
+        """testing if the VideoInfoCache will write the cache file only at
+        the end of a batch block
+        """
+        path = os.path.join(self.temp_dir, 'batch_cache')
+        cache = VideoInfoCache(path)
+        with cache.batch():
+            cache.set('a', 1)
+            cache.set('b', 2)
+            self.assertFalse(os.path.exists(path))
+
+        self.assertEqual(2, len(VideoInfoCache(path)))
+
+    def test_get_video_stream_info_is_working_properly(self):
+        """testing if the get_video_stream_info() method will return the size
+        and the frame count of the video stream
+        """
+        media_info = {
+            'video_info': {'duration': '2.000000'},
+            'stream_info': [
+                {'codec_type': 'audio'},
+                {
+                    'codec_type': 'video',
+                    'width': '1920',
+                    'height': '1080',
+                    'nb_frames': '48'
+                }
+            ]
+        }
+        self.assertEqual(
+            {'width': 1920, 'height': 1080, 'nb_frames': 48,
+             'frame_rate': 23.976, 'duration': 2.0},
+            MediaManager.get_video_stream_info(media_info)
+        )
+
+    def test_get_video_stream_info_calculates_nb_frames(self):
+        """testing if the get_video_stream_info() method will calculate the
+        frame count from the frame rate and the duration if there is no
+        nb_frames
+        """
+        path = self.create_file('shot_hd.mov')
+        media_info = FakeMediaManager().get_video_info(path)
+        self.assertEqual(
+            {'width': 1920, 'height': 1080, 'nb_frames': 50,
+             'frame_rate': 25.0, 'duration': 2.0},
+            MediaManager.get_video_stream_info(media_info)
+        )
+
+    def test_get_video_stream_info_with_no_video_stream(self):
+        """testing if the get_video_stream_info() method will return None if
+        there is no video stream
+        """
+        media_info = {
+            'video_info': {},
+            'stream_info': [{'codec_type': 'audio'}]
+        }
+        self.assertIsNone(MediaManager.get_video_stream_info(media_info))
+
+    def test_probe_videos_is_working_properly(self):
+        """testing if the probe_videos() method will probe each file only
+        once and will return None for the files that can not be probed
+        """
+        shot1_path = self.create_file('shot1_hd.mov')
+        shot2_path = self.create_file('shot2.mov')
+        missing_path = os.path.join(self.temp_dir, 'missing.mov')
+
+        # count the cache file writes
+        cache = utils.video_info_cache
+        self.cache_save_count = [0]
+        original_save = cache._save
+
+        def counting_save(*args, **kwargs):
+            self.cache_save_count[0] += 1
+            return original_save(*args, **kwargs)
+        cache._save = counting_save
+
+        mm = FakeMediaManager()
+        paths = [shot1_path, shot2_path, shot1_path, missing_path]
+        result = mm.probe_videos(paths, max_workers=2)
+
+        self.assertEqual(
+            {
+                shot1_path: {'width': 1920, 'height': 1080, 'nb_frames': 50,
+                             'frame_rate': 25.0, 'duration': 2.0},
+                shot2_path: {'width': 1024, 'height': 778, 'nb_frames': 50,
+                             'frame_rate': 25.0, 'duration': 2.0},
+                missing_path: None
+            },
+            result
+        )
+        self.assertEqual(
+            sorted(set(paths)),
+            sorted(kwargs['i'] for kwargs in mm.ffprobe_calls)
+        )
+
+        # the cache file is written once
+        self.assertEqual(1, self.cache_save_count[0])
+
+        # the results are cached
+        mm.ffprobe_calls = []
+        mm.probe_videos(paths[:2])
+        self.assertEqual([], mm.ffprobe_calls)
+
+    def test_generate_video_thumbnail_calls_ffmpeg_only_once(self):
+        """testing if the generate_video_thumbnail() method will seek to the
+        start, middle and end of the video and will create the thumbnail
+        with a single ffmpeg call
+        """
+        path = self.create_file('shot_hd.mov')
+        mm = FakeMediaManager()
+        thumbnail_path = mm.generate_video_thumbnail(path)
+        self.assertTrue(os.path.exists(thumbnail_path))
+        os.remove(thumbnail_path)
+
+        self.assertEqual(1, len(mm.ffmpeg_calls))
+        kwargs = mm.ffmpeg_calls[0]
+        self.assertEqual(
+            [
+                {'ss': '0.200', 'i': path},
+                {'ss': '1.000', 'i': path},
+                {'ss': '1.760', 'i': path}
+            ],
+            kwargs['inputs']
+        )
+        self.assertEqual(1, kwargs['vframes'])
+        self.assertEqual(thumbnail_path, kwargs['o'])
+
+    def test_generate_media_for_web_and_thumbnail_is_working_properly(self):
+        """testing if the generate_media_for_web_and_thumbnail() method will
+        generate the web version and the thumbnail in parallel
+        """
+        mm = SlowMediaManager()
+        start = time.time()
+        web_version_path, thumbnail_path = \
+            mm.generate_media_for_web_and_thumbnail('shot.mov', max_workers=2)
+        duration = time.time() - start
+
+        self.assertEqual(
+            sorted(mm.temp_paths),
+            sorted([web_version_path, thumbnail_path])
+        )
+        self.assertTrue(web_version_path.endswith(mm.web_video_format))
+        self.assertTrue(thumbnail_path.endswith(mm.thumbnail_format))
+        self.assertLess(duration, 0.35)
+
+        for path in mm.temp_paths:
+            os.remove(path)
+
+    def test_generate_media_for_web_and_thumbnail_keeps_the_web_version(self):
+        """testing if the generate_media_for_web_and_thumbnail() method will
+        keep the web version if the thumbnail can not be generated
+        """
+        mm = SlowMediaManager(fail_thumbnail=True)
+        web_version_path, thumbnail_path = \
+            mm.generate_media_for_web_and_thumbnail('shot.mov', max_workers=2)
+
+        self.assertEqual(mm.temp_paths, [web_version_path])
+        self.assertTrue(os.path.exists(web_version_path))
+        self.assertIsNone(thumbnail_path)
+        os.remove(web_version_path)
+
+    def test_generate_media_for_web_and_thumbnail_keeps_the_thumbnail(self):
+        """testing if the generate_media_for_web_and_thumbnail() method will
+        keep the thumbnail if the web version can not be generated
+        """
+        mm = SlowMediaManager(fail_web=True)
+        web_version_path, thumbnail_path = \
+            mm.generate_media_for_web_and_thumbnail('shot.mov', max_workers=1)
+
+        self.assertIsNone(web_version_path)
+        self.assertEqual(mm.temp_paths, [thumbnail_path])
+        self.assertTrue(os.path.exists(thumbnail_path))
+        os.remove(thumbnail_path)
+
+    def test_generate_media_for_web_and_thumbnail_both_failing(self):
+        """testing if the generate_media_for_web_and_thumbnail() method will
+        raise the error if neither of them can be generated
+        """
+        mm = SlowMediaManager(fail_web=True, fail_thumbnail=True)
+        with self.assertRaises(RuntimeError):
+            mm.generate_media_for_web_and_thumbnail('shot.mov', max_workers=2)
+        self.assertEqual([], mm.temp_paths)
+
+    def test_media_upload_links_the_media_in_the_calling_thread(self):
+        """testing if the MediaUpload.finish() method will link the media
+        generated by submit_media_for_web_and_thumbnail() in the calling
+        thread
+        """
+        mm = SlowMediaManager()
+        future = mm.submit_media_for_web_and_thumbnail(
+            'shot.mov', max_workers=2
+        )
+        self.assertFalse(future.done())
+
+        calls = []
+
+        def link_media(f):
+            calls.append((f.result(), threading.current_thread()))
+
+        link = object()
+        upload = utils.MediaUpload(link, future, link_media)
+        self.assertIs(link, upload.finish())
+        self.assertTrue(upload.done())
+        # it is linked only once
+        self.assertIs(link, upload.finish())
+
+        self.assertEqual(1, len(calls))
+        paths, thread = calls[0]
+        self.assertEqual(sorted(mm.temp_paths), sorted(paths))
+        self.assertIs(threading.current_thread(), thread)
+
+        for path in mm.temp_paths:
+            os.remove(path)
+
+    def test_get_thread_count_is_working_properly(self):
+        """testing if the get_thread_count() function will divide the CPUs
+        between the workers of a pool
+        """
+        import multiprocessing
+        cpu_count = multiprocessing.cpu_count()
+
+        self.assertEqual(cpu_count, utils.get_thread_count())
+        self.assertEqual(
+            cpu_count,
+            utils.run_as_pool_worker(1, utils.get_thread_count)
+        )
+        self.assertEqual(
+            1,
+            utils.run_as_pool_worker(cpu_count * 2, utils.get_thread_count)
+        )
+        # the thread is not a pool worker anymore
+        self.assertEqual(cpu_count, utils.get_thread_count())
+
+    def test_ffmpeg_threads_in_pool_workers(self):
+        """testing if the ffmpeg() method will pass the share of the worker
+        from the CPUs as the -threads flag when it is run in a pool worker
+        """
+        import multiprocessing
+        cpu_count = multiprocessing.cpu_count()
+
+        command_path = os.path.join(self.temp_dir, 'ffmpeg')
+        with open(command_path, 'w') as f:
+            f.write(fake_ffmpeg_source % {'python': sys.executable})
+        os.chmod(command_path, stat.S_IRWXU)
+
+        mm = MediaManager()
+        mm.ffmpeg_command_path = command_path
+
+        def get_threads():
+            with open(command_path + '.args') as f:
+                args = json.load(f)
+            return int(args[args.index('-threads') + 1])
+
+        mm.ffmpeg(i='shot.mov', o='shot.webm')
+        self.assertEqual(cpu_count, get_threads())
+
+        utils.run_as_pool_worker(
+            cpu_count * 2, mm.ffmpeg, i='shot.mov', o='shot.webm'
+        )
+        self.assertEqual(1, get_threads())
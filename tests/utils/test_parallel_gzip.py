@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+from cStringIO import StringIO
+
+from anima.utils import parallel_gzip
+from anima.utils.executors import get_executor
+
+
+class ParallelGzipFileTestCase(unittest.TestCase):
+    """tests the anima.utils.parallel_gzip module
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'test.gz')
+        self.data = ''.join(
+            '%s some test data\n' % i for i in range(10000)
+        )
+
+    def tearDown(self):
+        """clean up the test
+        """
+        shutil.rmtree(self.temp_dir)
+
+    def read(self):
+        """returns the uncompressed data in the test file
+        """
+        gzip_file = gzip.open(self.path, 'rb')
+        try:
+            return gzip_file.read()
+        finally:
+            gzip_file.close()
+
+    def test_data_is_written_as_multiple_gzip_members(self):
+        """testing if the data is split in to blocks which can be read back
+        with the gzip module
+        """
+        with parallel_gzip.open(self.path, 'wb', block_size=1000) as f:
+            for i in range(0, len(self.data), 333):
+                f.write(self.data[i:i + 333])
+        self.assertEqual(self.data, self.read())
+
+        # there should be more than one member
+        with open(self.path, 'rb') as f:
+            compressed = f.read()
+        self.assertTrue(compressed.count('\x1f\x8b\x08') > 1)
+
+    def test_single_worker(self):
+        """testing if the blocks are compressed in the calling thread when
+        max_workers is 1
+        """
+        f = parallel_gzip.open(self.path, block_size=1000, max_workers=1)
+        self.assertIsNone(f._executor)
+        f.write(self.data)
+        f.close()
+        self.assertEqual(self.data, self.read())
+
+    def test_blocks_are_compressed_in_the_pool_worker(self):
+        """testing if the blocks are compressed in the calling thread when
+        the file is written in a job of the shared pool
+        """
+        executor = get_executor(max_workers=2)
+        if executor is None:
+            self.skipTest('concurrent.futures is not available')
+
+        def write():
+            f = parallel_gzip.open(self.path, block_size=1000, max_workers=2)
+            executor_in_worker = f._executor
+            f.write(self.data)
+            f.close()
+            return executor_in_worker
+
+        self.assertIsNone(executor.submit(write).result(timeout=10))
+        self.assertEqual(self.data, self.read())
+
+    def test_compresslevel(self):
+        """testing if the compresslevel is used
+        """
+        sizes = []
+        for level in [0, 9]:
+            with parallel_gzip.open(self.path, compresslevel=level) as f:
+                f.write(self.data)
+            self.assertEqual(self.data, self.read())
+            sizes.append(os.path.getsize(self.path))
+        self.assertTrue(sizes[0] > sizes[1])
+
+    def test_compresslevel_is_out_of_range(self):
+        """testing if a ValueError will be raised if the compresslevel is not
+        between 0 and 9
+        """
+        with self.assertRaises(ValueError) as cm:
+            parallel_gzip.open(self.path, compresslevel=10)
+        self.assertEqual(
+            'compresslevel should be between 0 and 9, not 10',
+            str(cm.exception)
+        )
+
+    def test_read_mode_is_not_supported(self):
+        """testing if a ValueError will be raised for the read mode
+        """
+        with self.assertRaises(ValueError) as cm:
+            parallel_gzip.open(self.path, 'rb')
+        self.assertEqual(
+            'ParallelGzipFile only supports "w" and "a" modes, not "rb"',
+            str(cm.exception)
+        )
+
+    def test_fileobj_is_not_closed(self):
+        """testing if the given file object is not closed
+        """
+        fileobj = StringIO()
+        f = parallel_gzip.ParallelGzipFile(fileobj=fileobj, block_size=1000)
+        f.write(self.data)
+        f.close()
+        self.assertTrue(f.closed)
+        self.assertFalse(fileobj.closed)
+        gzip_file = gzip.GzipFile(fileobj=StringIO(fileobj.getvalue()))
+        self.assertEqual(self.data, gzip_file.read())
+
+    def test_writing_to_a_closed_file(self):
+        """testing if a ValueError will be raised when writing to a closed
+        file
+        """
+        f = parallel_gzip.open(self.path)
+        f.close()
+        self.assertRaises(ValueError, f.write, 'data')
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2015, Anima Istanbul
+#
+# This module is part of anima-tools and is released under the BSD 2
+# License: http://www.opensource.org/licenses/BSD-2-Clause
+
+import unittest
+
+from timecode import Timecode
+
+from anima.utils import timecodes
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    """tests the anima.utils.timecodes.LRUCache class
+    """
+
+    def test_least_recently_used_items_are_removed(self):
+        """testing if the least recently used items will be removed when the
+        max_size is exceeded
+        """
+        cache = timecodes.LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        # use "a", so "b" is the least recently used one
+        self.assertEqual(1, cache.get('a'))
+        cache.set('c', 3)
+
+        self.assertEqual(2, len(cache))
+        self.assertEqual(1, cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(3, cache.get('c'))
+
+    def test_clear_is_working_properly(self):
+        """testing if the clear() method will remove all the items
+        """
+        cache = timecodes.LRUCache()
+        cache.set('a', 1)
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual('default', cache.get('a', 'default'))
+
+
+class TimecodesTestCase(unittest.TestCase):
+    """tests the anima.utils.timecodes module
+    """
+
+    def setUp(self):
+        """setup the test
+        """
+        timecodes.clear_cache()
+
+    def test_get_frame_rate_is_working_properly(self):
+        """testing if the get_frame_rate() function will return the same
+        FrameRate instance with the precomputed values for the same rate
+        """
+        frame_rate = timecodes.get_frame_rate('25')
+        self.assertIs(frame_rate, timecodes.get_frame_rate('25'))
+        self.assertEqual(25, frame_rate.fps)
+        self.assertEqual(1500, frame_rate.frames_per_minute)
+        self.assertEqual(90000, frame_rate.frames_per_hour)
+        self.assertEqual(2160000, frame_rate.frames_per_day)
+
+    def test_get_frame_rate_with_drop_frame_rates(self):
+        """testing if the fps of the drop frame or fractional rates will be
+        None
+        """
+        self.assertIsNone(timecodes.get_frame_rate('29.97').fps)
+        self.assertIsNone(timecodes.get_frame_rate('23.98').fps)
+
+    def test_frames_to_timecode_is_working_properly(self):
+        """testing if the frames_to_timecode() function will return the same
+        value with the timecode.Timecode class
+        """
+        for rate in ['24', '25', '30', '23.98', '29.97', '59.94']:
+            for frames in [-10, 0, 1, 2, 25, 1441, 86401, 2160000, 2160001,
+                           5184000, 5184001, 6000000]:
+                self.assertEqual(
+                    str(Timecode(rate, frames=frames)),
+                    timecodes.frames_to_timecode(rate, frames)
+                )
+
+    def test_timecode_to_frames_is_working_properly(self):
+        """testing if the timecode_to_frames() function will return the same
+        value with the timecode.Timecode class
+        """
+        for rate in ['24', '25', '30', '29.97']:
+            for timecode_str in ['00:00:00:00', '00:00:01:00', '01:00:00:00',
+                                 '10:09:08:07', '23:59:59:%s' % rate]:
+                self.assertEqual(
+                    Timecode(rate, timecode_str).frames,
+                    timecodes.timecode_to_frames(rate, timecode_str)
+                )